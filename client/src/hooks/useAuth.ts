@@ -1,6 +1,6 @@
 import { create } from 'zustand';
 import { persist } from 'zustand/middleware';
-import { User, login as apiLogin, signup as apiSignup, logout as apiLogout } from '@/services/api';
+import { User, login as apiLogin, signup as apiSignup, logout as apiLogout, onUnauthorized } from '@/services/api';
 
 interface AuthState {
   user: User | null;
@@ -65,3 +65,10 @@ export const useAuth = create<AuthState>()(
     }
   )
 );
+
+// Tokens expire (ACCESS_TOKEN_EXPIRE_MINUTES): once the server turns ours down, sign out so pages send the user
+// back to log in instead of failing every request
+onUnauthorized(() => {
+  localStorage.removeItem('devinterview_token');
+  useAuth.setState({ user: null, token: null, isAuthenticated: false });
+});
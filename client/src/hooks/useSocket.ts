@@ -24,13 +24,15 @@ interface UseSocketProps {
   onWhiteboardUpdate?: (data: any) => void;
   onCustomQuestion?: (data: any) => void;
   onExecutionResult?: (data: any) => void;
+  onExecutionStarted?: (data: { runId: string; language: string }) => void;
+  onExecutionOutput?: (data: { runId: string; seq: number; stream: 'stdout' | 'stderr'; data: string }) => void;
   onSessionUpdated?: (session: any) => void;
 }
 
 // Initialize socket outside component to prevent multiple connections
 let socket: Socket | null = null;
 
-export function useSocket({ sessionId, userId, userName, role, onCodeChange, onWhiteboardUpdate, onCustomQuestion, onExecutionResult, onSessionUpdated }: UseSocketProps) {
+export function useSocket({ sessionId, userId, userName, role, onCodeChange, onWhiteboardUpdate, onCustomQuestion, onExecutionResult, onExecutionStarted, onExecutionOutput, onSessionUpdated }: UseSocketProps) {
   const [isConnected, setIsConnected] = useState(false);
   const [connectedUsers, setConnectedUsers] = useState<any[]>([]);
 
@@ -39,6 +41,8 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
   const onWhiteboardUpdateRef = useRef(onWhiteboardUpdate);
   const onCustomQuestionRef = useRef(onCustomQuestion);
   const onExecutionResultRef = useRef(onExecutionResult);
+  const onExecutionStartedRef = useRef(onExecutionStarted);
+  const onExecutionOutputRef = useRef(onExecutionOutput);
   const onSessionUpdatedRef = useRef(onSessionUpdated);
 
   useEffect(() => {
@@ -46,8 +50,10 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
     onWhiteboardUpdateRef.current = onWhiteboardUpdate;
     onCustomQuestionRef.current = onCustomQuestion;
     onExecutionResultRef.current = onExecutionResult;
+    onExecutionStartedRef.current = onExecutionStarted;
+    onExecutionOutputRef.current = onExecutionOutput;
     onSessionUpdatedRef.current = onSessionUpdated;
-  }, [onCodeChange, onWhiteboardUpdate, onCustomQuestion, onExecutionResult, onSessionUpdated]);
+  }, [onCodeChange, onWhiteboardUpdate, onCustomQuestion, onExecutionResult, onExecutionStarted, onExecutionOutput, onSessionUpdated]);
 
   useEffect(() => {
     if (!sessionId) return;
@@ -62,6 +68,9 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
       });
     }
 
+    // Lets a proxy route every connection of a room to the same server process
+    socket.io.opts.query = { roomId: sessionId };
+
     function onConnect() {
       setIsConnected(true);
       console.log('[Socket] Connected');
@@ -102,6 +111,24 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
       if (onExecutionResultRef.current) onExecutionResultRef.current(data);
     }
 
+    // Server-side runs stream their output while running, then end with execution_result
+    function onExecutionStartedEvent(data: any) {
+      if (onExecutionStartedRef.current) onExecutionStartedRef.current(data);
+    }
+
+    function onExecutionOutputEvent(data: any) {
+      if (onExecutionOutputRef.current) onExecutionOutputRef.current(data);
+    }
+
+    // Server-side batching (BROADCAST_TICK_MS) sends one event per tick with the sender in `from`
+    function onBatch(data: { events: { event: string; data: any; from?: string }[] }) {
+      for (const item of data.events) {
+        if (item.from && item.from === socket?.id) continue;
+        if (item.event === 'code_change') onCodeUpdate(item.data);
+        else if (item.event === 'whiteboard_update') onWhiteboardUpdateEvent(item.data);
+      }
+    }
+
     const onSessionUpdatedEvent = (data: any) => {
       if (onSessionUpdatedRef.current) {
         onSessionUpdatedRef.current(data);
@@ -117,7 +144,10 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
     socket.on('whiteboard_update', onWhiteboardUpdateEvent);
     socket.on('custom_question', onCustomQuestionEvent);
     socket.on('execution_result', onExecutionResultEvent);
+    socket.on('execution_started', onExecutionStartedEvent);
+    socket.on('execution_output', onExecutionOutputEvent);
     socket.on('session_updated', onSessionUpdatedEvent);
+    socket.on('batch', onBatch);
 
     // Initial join if already connected
     if (socket.connected) {
@@ -136,7 +166,10 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
       socket?.off('whiteboard_update', onWhiteboardUpdateEvent);
       socket?.off('custom_question', onCustomQuestionEvent);
       socket?.off('execution_result', onExecutionResultEvent);
+      socket?.off('execution_started', onExecutionStartedEvent);
+      socket?.off('execution_output', onExecutionOutputEvent);
       socket?.off('session_updated', onSessionUpdatedEvent);
+      socket?.off('batch', onBatch);
 
       // Only leave room, don't disconnect socket to keep it alive for other components if needed
       // But for this app, we can disconnect to be safe and clean
@@ -172,9 +205,13 @@ export function useSocket({ sessionId, userId, userName, role, onCodeChange, onW
     emit('execution_result', result);
   }, [emit]);
 
+  // Sent along with REST calls that only room members may make
+  const getSocketId = useCallback(() => socket?.id, []);
+
   return {
     isConnected,
     connectedUsers,
+    getSocketId,
     emitCodeChange,
     emitCursorMove,
     emitWhiteboardUpdate,
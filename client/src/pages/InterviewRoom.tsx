@@ -47,6 +47,7 @@ import {
   saveCode,
   getQuestions,
   getCodeSuggestions,
+  executeCode,
   Session,
   Question,
   CodeSuggestion
@@ -124,6 +125,9 @@ func main() {
 `,
 };
 
+// Streamed output beyond this is dropped from the top of the console
+const MAX_CONSOLE_CHARS = 200_000;
+
 export default function InterviewRoom() {
   const { sessionId } = useParams<{ sessionId: string }>();
   const [searchParams] = useSearchParams();
@@ -243,7 +247,32 @@ export default function InterviewRoom() {
     }
   }, []);
 
+  // Server-side run whose output is currently streaming into the console
+  const streamingRunRef = useRef<string | null>(null);
+
+  const handleExecutionStarted = useCallback((data: { runId: string }) => {
+    streamingRunRef.current = data.runId;
+    setOutput('');
+    setRightTab('console');
+  }, []);
+
+  const handleExecutionOutput = useCallback((data: { runId: string; data: string }) => {
+    if (data.runId !== streamingRunRef.current) return;
+    setOutput(prev => (prev + data.data).slice(-MAX_CONSOLE_CHARS));
+  }, []);
+
   const handleExecutionResult = useCallback((data: any) => {
+    if (data.runId && data.runId === streamingRunRef.current) {
+      streamingRunRef.current = null;
+      // The output has already been streamed; only say why the run stopped, if it was stopped
+      const reason = data.timedOut ? 'Execution timed out'
+        : data.cpuLimitExceeded ? 'CPU time limit exceeded'
+        : data.outputLimitExceeded ? 'Output limit exceeded'
+        : data.stdout === undefined ? data.error
+        : null;
+      if (reason) setOutput(prev => `${prev}\nError: ${reason}`);
+      return;
+    }
     if (data.output || data.error) {
       setOutput(data.error ? `Error:\n${data.error}` : data.output);
       setRightTab('console');
@@ -279,7 +308,7 @@ export default function InterviewRoom() {
     }
   }, [whiteboardStore]);
 
-  const { isConnected, connectedUsers, emitCodeChange, emitCustomQuestion, emitExecutionResult, emitWhiteboardUpdate } = useSocket({
+  const { isConnected, connectedUsers, getSocketId, emitCodeChange, emitCustomQuestion, emitExecutionResult, emitWhiteboardUpdate } = useSocket({
     sessionId: sessionId || '',
     userId,
     userName,
@@ -287,6 +316,8 @@ export default function InterviewRoom() {
     onCodeChange: handleCodeChange,
     onCustomQuestion: handleCustomQuestion,
     onExecutionResult: handleExecutionResult,
+    onExecutionStarted: handleExecutionStarted,
+    onExecutionOutput: handleExecutionOutput,
     onSessionUpdated: handleSessionUpdated,
     onWhiteboardUpdate: handleWhiteboardUpdate
   });
@@ -356,12 +387,12 @@ export default function InterviewRoom() {
     const timeout = setTimeout(() => {
       emitCodeChange(code, language);
       if (sessionId) {
-        saveCode(sessionId, code, language);
+        saveCode(sessionId, code, language, getSocketId());
       }
     }, 1000);
 
     return () => clearTimeout(timeout);
-  }, [code, language, sessionId, emitCodeChange]);
+  }, [code, language, sessionId, emitCodeChange, getSocketId]);
 
   // AI suggestions (interviewer only)
   useEffect(() => {
@@ -408,6 +439,18 @@ export default function InterviewRoom() {
     setRightTab('console'); // Ensure console tab is active
 
     try {
+      if (sessionId) {
+        try {
+          // Server-side run: output streams in over the socket; the response is only the tail
+          const result = await executeCode(sessionId, code, language, '', getSocketId());
+          if (!isConnected) setOutput(result.stdout + (result.stderr ? `\nError: ${result.stderr}` : ''));
+          return;
+        } catch (error: any) {
+          // Fall back to running in the browser when the server can't run it (disabled, busy, unsupported)
+          if (!error.response) throw error;
+        }
+      }
+
       const result = await codeExecutionService.execute(code, language);
       const outputText = result.output + (result.error ? `\nError: ${result.error}` : '');
       setOutput(outputText);
@@ -37,6 +37,20 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Called when the server rejects the stored token (expired or revoked); useAuth signs the user out
+let unauthorizedHandler: (() => void) | null = null;
+export function onUnauthorized(handler: () => void) {
+  unauthorizedHandler = handler;
+}
+
+api.interceptors.response.use(undefined, (error) => {
+  // Only a request that carried a token says anything about the stored session
+  if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+    unauthorizedHandler?.();
+  }
+  return Promise.reject(error);
+});
+
 // Types
 export interface User {
   id: string;
@@ -47,6 +61,7 @@ export interface User {
 
 export interface Session {
   id: string;
+  interviewerId?: string; // the interviewer who created (and owns) it
   candidateName: string;
   candidateEmail: string;
   date: string;
@@ -61,6 +76,7 @@ export interface Session {
   question?: Question;
   serverTime?: string;
   whiteboard?: Record<string, any>;
+  revision?: number;
 }
 
 export interface Question {
@@ -100,15 +116,44 @@ export async function getCurrentUser(): Promise<User | null> {
 }
 
 // Session APIs
+// Largest page GET /sessions serves
+const SESSIONS_PAGE_SIZE = 200;
+
 export async function getSessions(): Promise<Session[]> {
-  const response = await api.get('/sessions');
-  return response.data;
+  // The dashboard only needs listing columns; full sessions come from getSession.
+  // The server pages its results, so follow X-Next-Cursor until the last page.
+  const sessions: Session[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await api.get('/sessions', {
+      params: { summary: true, limit: SESSIONS_PAGE_SIZE, cursor },
+    });
+    sessions.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return sessions;
 }
 
+// Last copy of each session we fetched; refetches only transfer what changed since its revision
+const sessionCache = new Map<string, { session: Session; etag?: string }>();
+
 export async function getSession(id: string): Promise<Session | null> {
+  const cached = sessionCache.get(id);
   try {
-    const response = await api.get(`/sessions/${id}`);
-    return response.data;
+    const response = await api.get(`/sessions/${id}`, {
+      params: cached?.session.revision !== undefined ? { since: cached.session.revision } : undefined,
+      headers: cached?.etag ? { 'If-None-Match': cached.etag } : undefined,
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+    // Sent on 304s too, so the timer offset stays fresh
+    const serverTime: string | undefined = response.headers['x-server-time'];
+    if (response.status === 304 && cached) {
+      return { ...cached.session, serverTime: serverTime ?? cached.session.serverTime };
+    }
+    // With `since` the body only has the changed fields
+    const session: Session = cached ? { ...cached.session, ...response.data } : response.data;
+    sessionCache.set(id, { session, etag: response.headers['etag'] });
+    return session;
   } catch (e) {
     return null;
   }
@@ -124,17 +169,21 @@ export async function updateSession(id: string, data: Partial<Session>): Promise
   return response.data;
 }
 
+// Only the session's interviewer can end it
 export async function terminateSession(id: string): Promise<void> {
   await api.post(`/sessions/${id}/terminate`);
 }
 
 export async function deleteSession(id: string): Promise<void> {
   await api.delete(`/sessions/${id}`);
+  sessionCache.delete(id);
 }
 
 // Code APIs
-export async function saveCode(sessionId: string, code: string, language: string): Promise<void> {
-  await api.post(`/sessions/${sessionId}/save_code`, { code, language });
+// socketId (the room connection) is what lets a candidate without a token save
+export async function saveCode(sessionId: string, code: string, language: string, socketId?: string): Promise<void> {
+  const headers = socketId ? { 'X-Socket-Id': socketId } : undefined;
+  await api.post(`/sessions/${sessionId}/save_code`, { code, language }, { headers });
 }
 
 export async function getCodeSuggestions(code: string, language: string): Promise<CodeSuggestion[]> {
@@ -188,21 +237,54 @@ export async function getQuestions(language: string, level: string): Promise<Que
 }
 
 // Execution APIs
-export async function executeCode(code: string, language: string): Promise<{ output: string; error?: string }> {
-  const response = await api.post('/execute', { code, language });
+export interface ExecutionResult {
+  stdout: string;
+  stderr: string;
+  exitCode: number;
+  timedOut: boolean;
+  cpuLimitExceeded: boolean;
+  truncated: boolean;
+  durationMs: number;
+  language: string;
+}
+
+// Runs on the server's sandbox pool; the result is also broadcast to the room as `execution_result`.
+// socketId (the room connection) is what lets a candidate without a token run code
+export async function executeCode(sessionId: string, code: string, language: string, stdin = '', socketId?: string): Promise<ExecutionResult> {
+  const headers = socketId ? { 'X-Socket-Id': socketId } : undefined;
+  const response = await api.post(`/sessions/${sessionId}/execute`, { code, language, stdin }, { headers });
   return response.data;
 }
 
 // Stats
+export interface StatsGroup {
+  sessions: number;
+  scored: number;
+  avgScore: number | null;
+  timed: number;
+  avgDuration: number | null;
+  durationHistogram: Record<string, number>;
+}
+
+export interface SessionStats {
+  total: StatsGroup;
+  byStatus: Record<string, StatsGroup>;
+  byLanguage: Record<string, StatsGroup>;
+  byDay: Record<string, StatsGroup>;
+}
+
+// Aggregates are maintained by the server, so this doesn't pull every session
 export async function getStats(): Promise<{ totalInterviews: number; avgScore: number; thisMonth: number }> {
-  const sessions = await getSessions();
-  const completed = sessions.filter(s => s.status === 'completed');
-  const scores = completed.filter(s => s.score !== null && s.score !== undefined).map(s => s.score as number);
+  const now = new Date();
+  const monthStart = new Date(Date.UTC(now.getUTCFullYear(), now.getUTCMonth(), 1)).toISOString().slice(0, 10);
+  const response = await api.get('/sessions/stats', { params: { from: monthStart } });
+  const stats: SessionStats = response.data;
+  const completed = stats.byStatus.completed;
 
   return {
-    totalInterviews: completed.length,
-    avgScore: scores.length ? Math.round(scores.reduce((a, b) => a + b, 0) / scores.length) : 0,
-    thisMonth: sessions.filter(s => new Date(s.date).getMonth() === new Date().getMonth()).length,
+    totalInterviews: completed ? completed.sessions : 0,
+    avgScore: completed && completed.avgScore !== null ? Math.round(completed.avgScore) : 0,
+    thisMonth: Object.values(stats.byDay).reduce((total, day) => total + day.sessions, 0),
   };
 }
 
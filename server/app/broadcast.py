@@ -0,0 +1,144 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Per-room outgoing batches are flushed every tick; 0 sends every event immediately (milliseconds)
+BROADCAST_TICK_MS = float(os.getenv("BROADCAST_TICK_MS", "0"))
+# A room's batch is flushed early once it holds this many events
+BROADCAST_MAX_BATCH = int(os.getenv("BROADCAST_MAX_BATCH", "100"))
+
+# Events where a newer payload from the same sender replaces the older one
+SUPERSEDED_EVENTS = {'cursor_move', 'code_change'}
+
+
+def merge_whiteboard_changes(base: dict, newer: dict) -> dict:
+    """Fold a later tldraw diff into an earlier one so each record appears once."""
+    added = dict(base.get('added', {}))
+    updated = dict(base.get('updated', {}))
+    removed = dict(base.get('removed', {}))
+
+    for k, v in newer.get('added', {}).items():
+        removed.pop(k, None)
+        updated.pop(k, None)
+        added[k] = v
+    for k, v in newer.get('updated', {}).items():
+        after = v[1] if isinstance(v, list) and len(v) == 2 else v
+        if k in added:
+            added[k] = after
+        elif k in updated and isinstance(updated[k], list) and len(updated[k]) == 2:
+            updated[k] = [updated[k][0], after]
+        else:
+            updated[k] = v
+    for k, v in newer.get('removed', {}).items():
+        updated.pop(k, None)
+        # Added and removed inside one batch: peers never need to hear about it
+        if added.pop(k, None) is None:
+            removed[k] = v
+
+    return {'added': added, 'updated': updated, 'removed': removed}
+
+
+class RoomBatch:
+    def __init__(self):
+        self.items: List[dict] = []
+        # (event, sender) -> item, for events that can be merged or replaced
+        self._mergeable: Dict[tuple, dict] = {}
+        # Newest whiteboard_update item from anyone
+        self._last_whiteboard: Optional[dict] = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def _move_to_end(self, item: dict):
+        # A replaced item goes out after everything added before it, so peers end on the newest state
+        for i, other in enumerate(self.items):
+            if other is item:
+                del self.items[i]
+                break
+        self.items.append(item)
+
+    def add(self, event: str, data: dict, sender: Optional[str]):
+        key = (event, sender)
+        existing = self._mergeable.get(key)
+        # Only merged while no one else's diff came after it: folding across one would reorder them
+        if existing is not None and event == 'whiteboard_update' and existing is self._last_whiteboard:
+            merged = dict(data)
+            merged['changes'] = merge_whiteboard_changes(existing['data'].get('changes', {}),
+                                                         data.get('changes', {}))
+            existing['data'] = merged
+            self._move_to_end(existing)
+            return
+        if existing is not None and event in SUPERSEDED_EVENTS:
+            existing['data'] = data
+            self._move_to_end(existing)
+            return
+
+        item = {'event': event, 'data': data, 'from': sender}
+        self.items.append(item)
+        if event == 'whiteboard_update' or event in SUPERSEDED_EVENTS:
+            self._mergeable[key] = item
+        if event == 'whiteboard_update':
+            self._last_whiteboard = item
+
+
+class RoomBroadcaster:
+    """Optional scheduler that turns per-event room broadcasts into one `batch` event per tick.
+
+    Items keep the sender's sid in `from` instead of using skip_sid, since one
+    batch goes to everyone in the room; clients drop their own items.
+    """
+
+    def __init__(self, emit: Callable[..., Awaitable], tick_ms: float = BROADCAST_TICK_MS,
+                 max_batch: int = BROADCAST_MAX_BATCH):
+        self._emit = emit
+        self.tick = tick_ms / 1000
+        self.max_batch = max_batch
+        self._batches: Dict[str, RoomBatch] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.tick > 0
+
+    async def send(self, room: str, event: str, data: dict, skip_sid: Optional[str] = None):
+        if not self.enabled:
+            await self._emit(event, data, room=room, skip_sid=skip_sid)
+            return
+        batch = self._batches.get(room)
+        if batch is None:
+            batch = self._batches[room] = RoomBatch()
+        batch.add(event, data, skip_sid)
+        if len(batch) >= self.max_batch:
+            await self._flush_room(room)
+
+    async def _flush_room(self, room: str):
+        batch = self._batches.pop(room, None)
+        if batch:
+            await self._emit('batch', {'events': batch.items}, room=room)
+
+    async def flush(self):
+        rooms = list(self._batches)
+        if rooms:
+            await asyncio.gather(*(self._flush_room(room) for room in rooms), return_exceptions=True)
+
+    def clear(self):
+        self._batches.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
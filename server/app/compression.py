@@ -0,0 +1,226 @@
+"""Compression for REST responses and Socket.IO websocket frames.
+
+REST bodies are compressed by `CompressionMiddleware` when the client accepts
+an encoding and the body is at least COMPRESSION_MIN_SIZE bytes; streamed
+responses (NDJSON replays) are compressed chunk by chunk. Brotli needs the
+`brotli` package (`pip install .[brotli]`); without it only gzip is offered.
+
+Websocket frames are deflated by uvicorn's `--ws app.ws_protocol:WSProtocol`
+with the same kind of threshold (see ws_protocol.py). Both report into the
+compression_* metrics so the thresholds can be tuned against real traffic.
+"""
+import os
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import metrics
+
+# Encodings offered to clients, in order of preference; empty disables REST compression
+COMPRESSION_ENCODINGS = [e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",") if e.strip()]
+# Bodies smaller than this are sent as they are (bytes)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# zlib level for gzip responses (1 fastest .. 9 smallest)
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli quality (0 fastest .. 11 smallest); above 5 gets expensive for per-request bodies
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Socket.IO messages smaller than this are not compressed (bytes); applies to polling and websocket
+SOCKETIO_COMPRESSION_MIN_SIZE = int(os.getenv("SOCKETIO_COMPRESSION_MIN_SIZE", "1024"))
+
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+_CPU_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+RESPONSE_BYTES = metrics.REGISTRY.histogram(
+    "http_response_size_bytes", "REST response bodies before compression, by encoding sent",
+    ["encoding"], buckets=_SIZE_BUCKETS)
+COMPRESSION_INPUT_BYTES = metrics.REGISTRY.counter(
+    "compression_input_bytes_total", "Bytes handed to a compressor", ["transport", "encoding"])
+COMPRESSION_OUTPUT_BYTES = metrics.REGISTRY.counter(
+    "compression_output_bytes_total", "Bytes a compressor produced", ["transport", "encoding"])
+COMPRESSION_CPU_SECONDS = metrics.REGISTRY.histogram(
+    "compression_cpu_seconds", "CPU time spent compressing one response or websocket frame",
+    ["transport", "encoding"], buckets=_CPU_BUCKETS)
+COMPRESSION_SKIPPED = metrics.REGISTRY.counter(
+    "compression_skipped_total", "Responses or frames sent uncompressed, by reason", ["transport", "reason"])
+
+# Media types worth compressing; images, archives and the like already are
+_COMPRESSIBLE = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                 "application/xml", "application/problem+json")
+
+
+def _load_brotli():
+    for name in ("brotli", "brotlicffi"):
+        try:
+            return __import__(name)
+        except ImportError:
+            continue
+    return None
+
+
+brotli = _load_brotli() if "br" in COMPRESSION_ENCODINGS else None
+
+
+def observe(transport: str, encoding: str, size_in: int, size_out: int, cpu_seconds: float):
+    COMPRESSION_INPUT_BYTES.inc(transport, encoding, amount=size_in)
+    COMPRESSION_OUTPUT_BYTES.inc(transport, encoding, amount=size_out)
+    COMPRESSION_CPU_SECONDS.observe(cpu_seconds, transport, encoding)
+
+
+def choose_encoding(accept_encoding: str, offered=None) -> Optional[str]:
+    """The first offered encoding the Accept-Encoding header allows, or None."""
+    offered = COMPRESSION_ENCODINGS if offered is None else offered
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in offered:
+        if encoding == "br" and brotli is None:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+class _Encoder:
+    """Incremental gzip or brotli; each chunk is flushed so streamed bodies arrive as they're produced."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        self.size_in = 0
+        self.size_out = 0
+        self.cpu_seconds = 0.0
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        start = time.thread_time()
+        if self.encoding == "br":
+            out = self._br.process(data) if data else b""
+            out += self._br.finish() if final else self._br.flush()
+        else:
+            out = self._gzip.compress(data)
+            out += self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        self.cpu_seconds += time.thread_time() - start
+        self.size_in += len(data)
+        self.size_out += len(out)
+        return out
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing REST response bodies (gzip, or brotli when installed)."""
+
+    def __init__(self, app, minimum_size: int = None, gzip_level: int = None, brotli_quality: int = None,
+                 encodings=None):
+        self.app = app
+        self.minimum_size = COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.gzip_level = COMPRESSION_GZIP_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = COMPRESSION_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+        self.encodings = COMPRESSION_ENCODINGS if encodings is None else encodings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+
+class _Responder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start = None
+        self.encoder: Optional[_Encoder] = None
+        self.size = 0
+        # Body chunks held with the start message until there's enough to decide
+        self.pending = []
+        self.pending_size = 0
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            # Held back until the first body chunk decides whether the headers change
+            self.start = message
+            return
+        if kind != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        self.size += len(body)
+        if self.start is not None:
+            # Routes behind BaseHTTPMiddleware stream even small bodies in pieces; wait for the
+            # threshold or the end before choosing
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more and self.pending_size < self.middleware.minimum_size:
+                return
+            body = b"".join(self.pending)
+            self.pending = []
+            message = {"type": "http.response.body", "body": body, "more_body": more}
+            await self._begin(body, more)
+        if self.encoder is not None:
+            message = {"type": "http.response.body", "body": self.encoder.encode(body, not more),
+                       "more_body": more}
+        if not more:
+            self._finish()
+        await self._send(message)
+
+    async def _begin(self, body: bytes, more: bool):
+        start, self.start = self.start, None
+        start["headers"] = list(start.get("headers", []))
+        headers = MutableHeaders(raw=start["headers"])
+        reason = self._skip_reason(start["status"], headers, body, more)
+        if reason is None:
+            self.encoder = _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # Length is unknown until the last chunk is compressed; send it chunked
+            if "content-length" in headers:
+                del headers["Content-Length"]
+        else:
+            if reason != "encoded":
+                COMPRESSION_SKIPPED.inc("http", reason)
+            if reason in ("small", "not_accepted"):
+                # The same URL may be compressed for other clients or bigger bodies
+                headers.add_vary_header("Accept-Encoding")
+        await self._send(start)
+
+    def _skip_reason(self, status: int, headers: MutableHeaders, body: bytes, more: bool) -> Optional[str]:
+        if "content-encoding" in headers:
+            return "encoded"
+        if status < 200 or status in (204, 304) or (not body and not more):
+            return "empty"
+        content_type = headers.get("content-type", "")
+        if not content_type.startswith(_COMPRESSIBLE) and not content_type.split(";")[0].endswith("+json"):
+            return "content_type"
+        if "no-transform" in headers.get("cache-control", ""):
+            return "no_transform"
+        if not more and len(body) < self.middleware.minimum_size:
+            return "small"
+        if self.encoding is None:
+            return "not_accepted"
+        return None
+
+    def _finish(self):
+        if self.encoder is not None:
+            observe("http", self.encoding, self.encoder.size_in, self.encoder.size_out, self.encoder.cpu_seconds)
+            RESPONSE_BYTES.observe(self.size, self.encoding)
+        else:
+            RESPONSE_BYTES.observe(self.size, "identity")
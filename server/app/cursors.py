@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+# Cursor positions are fanned out once per tick; 0 disables coalescing (milliseconds)
+CURSOR_TICK_MS = float(os.getenv("CURSOR_TICK_MS", "40"))
+# Max cursor broadcasts per connection per second; superseded positions are dropped beyond this
+CURSOR_EVENT_BUDGET = float(os.getenv("CURSOR_EVENT_BUDGET", "20"))
+
+
+class CursorCoalescer:
+    """Keeps only the latest cursor position per sid and broadcasts it on a fixed tick.
+
+    Each connection has a token bucket of `budget` broadcasts per second. When a
+    sid is out of tokens its position simply stays pending and is overwritten by
+    the next one, so nothing queues up behind a busy loop or a chatty client.
+    """
+
+    def __init__(self, emit: Callable[[str, dict], Awaitable], tick_ms: float = CURSOR_TICK_MS,
+                 budget: float = CURSOR_EVENT_BUDGET):
+        self._emit = emit
+        self.tick = tick_ms / 1000
+        self.budget = budget
+        self._latest: Dict[str, dict] = {}
+        self._tokens: Dict[str, float] = {}
+        self._refilled: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.sent = 0
+        self.superseded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.tick > 0
+
+    async def push(self, sid: str, data: dict):
+        self.received += 1
+        if not self.enabled:
+            self.sent += 1
+            await self._emit(sid, data)
+            return
+        if sid in self._latest:
+            self.superseded += 1
+        self._latest[sid] = data
+
+    def forget(self, sid: str):
+        self._latest.pop(sid, None)
+        self._tokens.pop(sid, None)
+        self._refilled.pop(sid, None)
+
+    def clear(self):
+        self._latest.clear()
+        self._tokens.clear()
+        self._refilled.clear()
+
+    def _take_token(self, sid: str, now: float) -> bool:
+        tokens = self._tokens.get(sid, self.budget)
+        last = self._refilled.get(sid, now)
+        tokens = min(self.budget, tokens + (now - last) * self.budget)
+        self._refilled[sid] = now
+        if tokens < 1:
+            self._tokens[sid] = tokens
+            return False
+        self._tokens[sid] = tokens - 1
+        return True
+
+    async def flush(self):
+        if not self._latest:
+            return
+        now = time.monotonic()
+        ready = []
+        for sid in list(self._latest):
+            if self._take_token(sid, now):
+                ready.append((sid, self._latest.pop(sid)))
+        if ready:
+            self.sent += len(ready)
+            await asyncio.gather(*(self._emit(sid, data) for sid, data in ready), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.clear()
@@ -1,4 +1,6 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
@@ -11,11 +13,127 @@ if DATABASE_URL.startswith("postgres://"):
 elif DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    future=True
-)
+# Engine settings profile (dev, test or prod); the DB_* variables below override single values
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+
+PROFILES = {
+    # Logs every statement; small pool
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_cache_size": 100,
+        "sqlite_journal_mode": "WAL",
+        "sqlite_synchronous": "NORMAL",
+        "sqlite_busy_timeout": 5000,
+    },
+    # Quiet, and durability traded for speed: test databases are thrown away
+    "test": {
+        "echo": False,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_cache_size": 100,
+        "sqlite_journal_mode": "WAL",
+        "sqlite_synchronous": "OFF",
+        "sqlite_busy_timeout": 5000,
+    },
+    # No statement logging; connections checked before use and recycled before the
+    # server or a proxy drops them; fail fast when the pool is exhausted
+    "prod": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 10.0,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_cache_size": 500,
+        "sqlite_journal_mode": "WAL",
+        "sqlite_synchronous": "NORMAL",
+        "sqlite_busy_timeout": 5000,
+    },
+}
+
+# Setting -> environment variable overriding it
+ENV_OVERRIDES = {
+    "echo": "DB_ECHO",
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+    "pool_pre_ping": "DB_POOL_PRE_PING",
+    # asyncpg prepared statements kept per connection; 0 behind pgbouncer in transaction mode
+    "statement_cache_size": "DB_STATEMENT_CACHE_SIZE",
+    "sqlite_journal_mode": "SQLITE_JOURNAL_MODE",
+    "sqlite_synchronous": "SQLITE_SYNCHRONOUS",
+    # How long a SQLite writer waits for the lock before "database is locked" (ms)
+    "sqlite_busy_timeout": "SQLITE_BUSY_TIMEOUT",
+}
+
+
+def engine_settings(profile: str = None, environ=None) -> dict:
+    """The named profile with any DB_* environment overrides applied."""
+    profile = profile or DB_PROFILE
+    environ = os.environ if environ is None else environ
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {', '.join(PROFILES)}")
+    settings = dict(PROFILES[profile])
+    for key, var in ENV_OVERRIDES.items():
+        raw = environ.get(var)
+        if raw is None or raw == "":
+            continue
+        default = settings[key]
+        if isinstance(default, bool):
+            settings[key] = raw.lower() in ("1", "true", "yes", "on")
+        else:
+            settings[key] = type(default)(raw)
+    return settings
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def _sqlite_pragmas(settings: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # WAL lets readers carry on while a socket handler writes; busy_timeout makes
+            # concurrent writers wait for the lock instead of failing immediately
+            cursor.execute(f"PRAGMA journal_mode={settings['sqlite_journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={settings['sqlite_synchronous']}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings['sqlite_busy_timeout'])}")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def make_engine(url: str = None, settings: dict = None) -> AsyncEngine:
+    """Create the async engine for `url` from engine settings (default: DB_PROFILE plus overrides)."""
+    url = make_url(url or DATABASE_URL)
+    settings = settings or engine_settings()
+    options = {"echo": settings["echo"], "pool_pre_ping": settings["pool_pre_ping"]}
+    backend = url.get_backend_name()
+    if not (backend == "sqlite" and _is_memory_sqlite(url)):
+        # In-memory SQLite is a single shared connection; pool sizing doesn't apply
+        options.update(pool_size=settings["pool_size"], max_overflow=settings["max_overflow"],
+                       pool_timeout=settings["pool_timeout"], pool_recycle=settings["pool_recycle"])
+    if url.drivername == "postgresql+asyncpg":
+        cache_size = settings["statement_cache_size"]
+        options["connect_args"] = {"statement_cache_size": cache_size, "prepared_statement_cache_size": cache_size}
+
+    engine = create_async_engine(url, **options)
+    if backend == "sqlite":
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas(settings))
+    return engine
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(
     bind=engine,
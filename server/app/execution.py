@@ -0,0 +1,375 @@
+import asyncio
+import json
+import os
+import pwd
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from . import metrics, sandbox
+from .execution_cache import ExecutionCache, cache_key, cacheable
+
+# Warm sandbox workers kept per language; 0 (the default) disables server-side execution
+EXECUTION_WORKERS = int(os.getenv("EXECUTION_WORKERS", "0"))
+# Unprivileged account runs execute as, each in its own network namespace (the server must start as root)
+EXECUTION_USER = os.getenv("EXECUTION_USER", "")
+# Without EXECUTION_USER the pool stays off unless this is set: runs then share the server's uid (development only)
+EXECUTION_ALLOW_UNISOLATED = os.getenv("EXECUTION_ALLOW_UNISOLATED", "0") == "1"
+# Comma-separated languages to serve (default: every language whose toolchain is installed)
+EXECUTION_LANGUAGES = [l.strip() for l in os.getenv("EXECUTION_LANGUAGES", "").split(",") if l.strip()]
+# Runs allowed at once across all languages (defaults to the number of cores)
+EXECUTION_MAX_CONCURRENCY = int(os.getenv("EXECUTION_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+# Runs a single room may have waiting before new ones are rejected
+EXECUTION_QUEUE_PER_ROOM = int(os.getenv("EXECUTION_QUEUE_PER_ROOM", "3"))
+# Per-run limits
+EXECUTION_CPU_SECONDS = int(os.getenv("EXECUTION_CPU_SECONDS", "5"))
+EXECUTION_WALL_SECONDS = float(os.getenv("EXECUTION_WALL_SECONDS", "10"))
+EXECUTION_COMPILE_SECONDS = float(os.getenv("EXECUTION_COMPILE_SECONDS", "30"))
+EXECUTION_MEMORY_MB = int(os.getenv("EXECUTION_MEMORY_MB", "256"))
+# Processes and threads EXECUTION_USER may have at once, shared by all concurrent runs
+# (a JVM or a Go build alone starts dozens of threads)
+EXECUTION_MAX_PROCESSES = int(os.getenv("EXECUTION_MAX_PROCESSES", str(256 * EXECUTION_MAX_CONCURRENCY)))
+# Tail of stdout/stderr kept per run for the final result and for Session.output
+EXECUTION_OUTPUT_BYTES = int(os.getenv("EXECUTION_OUTPUT_BYTES", "65536"))
+# Total output after which a run is stopped (everything up to here is streamed)
+EXECUTION_MAX_OUTPUT_BYTES = int(os.getenv("EXECUTION_MAX_OUTPUT_BYTES", str(1024 * 1024)))
+# Streamed output is coalesced into at most one chunk per stream per interval (milliseconds)
+EXECUTION_STREAM_INTERVAL_MS = float(os.getenv("EXECUTION_STREAM_INTERVAL_MS", "50"))
+EXECUTION_MAX_CODE_BYTES = int(os.getenv("EXECUTION_MAX_CODE_BYTES", "65536"))
+# Scratch space for run directories and compiler caches
+EXECUTION_ROOT = os.getenv("EXECUTION_ROOT", os.path.join(tempfile.gettempdir(), "devinterview-exec"))
+
+SANDBOX_SCRIPT = sandbox.__file__
+
+EXECUTION_SECONDS = metrics.REGISTRY.histogram(
+    "execution_duration_seconds", "Server-side code run time, queueing excluded", ["language"])
+EXECUTION_QUEUE_SECONDS = metrics.REGISTRY.histogram(
+    "execution_queue_seconds", "Time a run waited for a free worker", ["language"])
+EXECUTION_RUNS = metrics.REGISTRY.counter(
+    "execution_runs_total", "Server-side code runs by outcome", ["language", "outcome"])
+
+
+def tail(text: Optional[str], limit: int = EXECUTION_OUTPUT_BYTES) -> Optional[str]:
+    """The last `limit` characters of text, for output that gets stored or re-broadcast."""
+    if text is None or len(text) <= limit:
+        return text
+    return text[-limit:]
+
+
+class ExecutionError(Exception):
+    """The run request itself is invalid (unknown language, code too large)."""
+
+
+class ExecutionUnavailable(Exception):
+    """Server-side execution is disabled, shutting down, or a worker failed."""
+
+
+class ExecutionQueueFull(Exception):
+    """The room already has EXECUTION_QUEUE_PER_ROOM runs waiting."""
+
+
+# on_output(stream, text) for output streamed while a run is in progress
+OutputCallback = Callable[[str, str], Awaitable]
+
+
+class Job:
+    __slots__ = ("room_id", "language", "code", "stdin", "on_output", "future", "queued_at")
+
+    def __init__(self, room_id: str, language: str, code: str, stdin: str,
+                 on_output: Optional[OutputCallback] = None):
+        self.room_id = room_id
+        self.language = language
+        self.code = code
+        self.stdin = stdin
+        self.on_output = on_output
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+
+class SandboxWorker:
+    """One long-lived sandbox process that forks a limited child per run."""
+
+    def __init__(self, language: str, root: str, output_bytes: int, user: str = ""):
+        self.language = language
+        self.root = root
+        self.user = user
+        # A reply carries up to output_bytes of stdout+stderr (or one streamed chunk), JSON-escaped
+        self._line_limit = max(output_bytes, 131072) * 8 + 65536
+        self.proc: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self):
+        # Nothing of the server's environment (secrets included) is passed on to the worker or its runs
+        env = {"PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"), "LANG": "C.UTF-8"}
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, SANDBOX_SCRIPT, self.language, self.root, *([self.user] if self.user else []),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=self._line_limit, env=env,
+        )
+        ready = await asyncio.wait_for(self.proc.stdout.readline(), timeout=30)
+        if not ready:
+            raise RuntimeError(f"{self.language} sandbox exited during start-up")
+
+    async def run(self, job: dict, timeout: float, on_output: Optional[OutputCallback] = None) -> dict:
+        if self.proc is None or self.proc.returncode is not None:
+            await self.start()
+        job = dict(job, stream=on_output is not None)
+        self.proc.stdin.write(json.dumps(job).encode() + b"\n")
+        await self.proc.stdin.drain()
+        deadline = time.monotonic() + timeout
+        while True:
+            line = await asyncio.wait_for(self.proc.stdout.readline(), timeout=max(0, deadline - time.monotonic()))
+            if not line:
+                raise RuntimeError(f"{self.language} sandbox exited")
+            message = json.loads(line)
+            if "chunk" in message:
+                # Awaiting here pushes back on the sandbox if the room can't keep up
+                try:
+                    await on_output(*message["chunk"])
+                except Exception as e:
+                    print(f"Error streaming execution output: {e}")
+                continue
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            return message
+
+    async def stop(self):
+        if self.proc is not None and self.proc.returncode is None:
+            # SIGTERM lets the worker kill the run it is supervising first
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), timeout=2)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        self.proc = None
+
+
+class ExecutionPool:
+    """Warm sandbox workers per language behind a fair-share queue.
+
+    Each room has its own FIFO; the dispatcher takes one job per room in
+    round-robin order, so a room spamming Run can't starve the others.
+    """
+
+    def __init__(self, workers_per_language: int = EXECUTION_WORKERS,
+                 max_concurrency: int = EXECUTION_MAX_CONCURRENCY,
+                 queue_per_room: int = EXECUTION_QUEUE_PER_ROOM,
+                 limits: Optional[dict] = None, root: str = EXECUTION_ROOT,
+                 languages: Optional[List[str]] = None, cache: Optional[ExecutionCache] = None,
+                 user: str = EXECUTION_USER, allow_unisolated: bool = EXECUTION_ALLOW_UNISOLATED):
+        self.workers_per_language = workers_per_language
+        self.user = user
+        self.allow_unisolated = allow_unisolated
+        self.enabled_languages = languages or EXECUTION_LANGUAGES or list(sandbox.RUNTIMES)
+        self.max_concurrency = max_concurrency
+        self.queue_per_room = queue_per_room
+        self.root = root
+        self.limits = {
+            "cpu_seconds": EXECUTION_CPU_SECONDS,
+            "wall_seconds": EXECUTION_WALL_SECONDS,
+            "compile_seconds": EXECUTION_COMPILE_SECONDS,
+            "memory_mb": EXECUTION_MEMORY_MB,
+            "processes": EXECUTION_MAX_PROCESSES,
+            "output_bytes": EXECUTION_OUTPUT_BYTES,
+            "max_output_bytes": EXECUTION_MAX_OUTPUT_BYTES,
+            "stream_interval": EXECUTION_STREAM_INTERVAL_MS / 1000,
+            "file_bytes": 16 * 1024 * 1024,
+            **(limits or {}),
+        }
+        self.cache = cache
+        # language -> toolchain version, part of every cache key
+        self.versions: Dict[str, str] = {}
+        # cache key -> future of an identical run already queued or running
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._workers: List[SandboxWorker] = []
+        self._idle: Dict[str, List[SandboxWorker]] = {}
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._rooms: Deque[str] = deque()
+        self._running = 0
+        self._tasks: set = set()
+        self._started = False
+
+    @property
+    def languages(self) -> List[str]:
+        return sorted(self._idle)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def isolation_problem(self) -> Optional[str]:
+        """Why runs can't be isolated as configured, or None."""
+        if not self.user:
+            if self.allow_unisolated:
+                return None
+            return "no EXECUTION_USER to run code as (EXECUTION_ALLOW_UNISOLATED=1 allows it for development)"
+        try:
+            pwd.getpwnam(self.user)
+        except KeyError:
+            return f"EXECUTION_USER {self.user} doesn't exist"
+        if os.geteuid() != 0:
+            return f"switching to EXECUTION_USER {self.user} needs the server to start as root"
+        return None
+
+    async def start(self):
+        if self._started or self.workers_per_language <= 0:
+            return
+        problem = self.isolation_problem()
+        if problem:
+            print(f"Server-side execution disabled: {problem}")
+            return
+        os.makedirs(self.root, exist_ok=True)
+        workers = [SandboxWorker(language, self.root, self.limits["output_bytes"], self.user)
+                   for language in self.enabled_languages if sandbox.available(language)
+                   for _ in range(self.workers_per_language)]
+        results = await asyncio.gather(*(w.start() for w in workers), return_exceptions=True)
+        for worker, result in zip(workers, results):
+            if isinstance(result, Exception):
+                print(f"Error starting {worker.language} sandbox: {result}")
+                continue
+            self._workers.append(worker)
+            self._idle.setdefault(worker.language, []).append(worker)
+        for language in self._idle:
+            self.versions[language] = await asyncio.to_thread(sandbox.runtime_version, language)
+        self._started = True
+
+    def _cache_key(self, language: str, code: str, stdin: str) -> str:
+        limits = {k: v for k, v in self.limits.items() if k != "stream_interval"}
+        return cache_key(language, self.versions.get(language, ""), code, stdin, limits)
+
+    async def run(self, room_id: str, language: str, code: str, stdin: str = "",
+                  on_output: Optional[OutputCallback] = None, use_cache: bool = True) -> dict:
+        if not self._started:
+            raise ExecutionUnavailable("Server-side execution is disabled")
+        if language not in self._idle:
+            raise ExecutionError(f"Language {language} is not supported for server-side execution")
+        if len(code.encode()) > EXECUTION_MAX_CODE_BYTES:
+            raise ExecutionError("Code is too large to execute")
+        stdin = stdin or ""
+
+        key = None
+        if use_cache and self.cache is not None and self.cache.enabled:
+            key = self._cache_key(language, code, stdin)
+            result = self.cache.get(key)
+            if result is not None:
+                await self._replay_output(result, on_output)
+                return dict(result, cached=True)
+            shared = self._inflight.get(key)
+            if shared is not None:
+                # Same run already on its way; wait for it instead of taking another worker.
+                # A run that failed, timed out or was cancelled says nothing about ours, so that one runs itself.
+                await asyncio.wait([shared])
+                if not shared.cancelled() and shared.exception() is None and cacheable(shared.result()):
+                    await self._replay_output(shared.result(), on_output)
+                    return dict(shared.result(), cached=False)
+
+        result = await self._enqueue(room_id, language, code, stdin, on_output, key)
+        if key is not None:
+            self.cache.put(key, result)
+        return dict(result, cached=False)
+
+    @staticmethod
+    async def _replay_output(result: dict, on_output: Optional[OutputCallback]):
+        # Listeners see a result we didn't stream as if it had been
+        if on_output is not None:
+            for stream in ("stdout", "stderr"):
+                if result.get(stream):
+                    await on_output(stream, result[stream])
+
+    async def _enqueue(self, room_id: str, language: str, code: str, stdin: str,
+                       on_output: Optional[OutputCallback], key: Optional[str]) -> dict:
+        queue = self._queues.get(room_id)
+        if queue is not None and len(queue) >= self.queue_per_room:
+            raise ExecutionQueueFull("Too many runs queued for this session")
+
+        job = Job(room_id, language, code, stdin, on_output)
+        if queue is None:
+            queue = self._queues[room_id] = deque()
+            self._rooms.append(room_id)
+        queue.append(job)
+        if key is not None:
+            self._inflight[key] = job.future
+        self._dispatch()
+        try:
+            return await job.future
+        finally:
+            if key is not None and self._inflight.get(key) is job.future:
+                del self._inflight[key]
+
+    def _next_job(self) -> Optional[tuple]:
+        for _ in range(len(self._rooms)):
+            room_id = self._rooms[0]
+            self._rooms.rotate(-1)
+            queue = self._queues[room_id]
+            while queue and queue[0].future.done():
+                queue.popleft()
+            idle = self._idle.get(queue[0].language) if queue else None
+            if idle:
+                job = queue.popleft()
+                if not queue:
+                    del self._queues[room_id]
+                    self._rooms.remove(room_id)
+                return job, idle.pop()
+            if not queue:
+                del self._queues[room_id]
+                self._rooms.remove(room_id)
+        return None
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            picked = self._next_job()
+            if picked is None:
+                return
+            job, worker = picked
+            self._running += 1
+            task = asyncio.create_task(self._execute(job, worker))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: Job, worker: SandboxWorker):
+        EXECUTION_QUEUE_SECONDS.observe(time.monotonic() - job.queued_at, job.language)
+        started = time.monotonic()
+        payload = {"code": job.code, "stdin": job.stdin, "limits": self.limits}
+        # The sandbox enforces the deadline itself; this only catches a wedged worker
+        timeout = self.limits["wall_seconds"] + self.limits["compile_seconds"] + 5
+        try:
+            result = await worker.run(payload, timeout, job.on_output)
+            result["language"] = job.language
+            outcome = "timeout" if result["timedOut"] else "ok" if result["exitCode"] == 0 else "error"
+            EXECUTION_RUNS.inc(job.language, outcome)
+            if not job.future.done():
+                job.future.set_result(result)
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.set_exception(ExecutionUnavailable("Server is shutting down"))
+            raise
+        except Exception as e:
+            print(f"Error in {job.language} sandbox: {e}")
+            EXECUTION_RUNS.inc(job.language, "worker_failed")
+            await worker.stop()
+            if not job.future.done():
+                job.future.set_exception(ExecutionUnavailable("Execution worker failed"))
+        finally:
+            EXECUTION_SECONDS.observe(time.monotonic() - started, job.language)
+            self._running -= 1
+            if self._started:
+                self._idle[job.language].append(worker)
+                self._dispatch()
+
+    async def stop(self):
+        self._started = False
+        for queue in self._queues.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.set_exception(ExecutionUnavailable("Server is shutting down"))
+        self._queues.clear()
+        self._rooms.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(w.stop() for w in self._workers), return_exceptions=True)
+        self._workers.clear()
+        self._idle.clear()
+        self._running = 0
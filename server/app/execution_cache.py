@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import metrics
+
+# Results kept; 0 disables the cache
+EXECUTION_CACHE_ENTRIES = int(os.getenv("EXECUTION_CACHE_ENTRIES", "1000"))
+# How long a result may be served again (seconds)
+EXECUTION_CACHE_TTL = float(os.getenv("EXECUTION_CACHE_TTL", "600"))
+# Total stdout+stderr held across all entries (bytes)
+EXECUTION_CACHE_BYTES = int(os.getenv("EXECUTION_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    "execution_cache_lookups_total", "Execution cache lookups by result", ["result"])
+
+
+def cache_key(language: str, runtime_version: str, code: str, stdin: str, limits: dict) -> str:
+    """Content address of a run: anything that can change its output is part of the hash."""
+    # Limits decide where a run gets cut off, so results under different limits aren't interchangeable
+    payload = json.dumps([language, runtime_version, code, stdin, sorted(limits.items())], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cacheable(result: dict) -> bool:
+    # Runs stopped by the clock, the CPU limit or any other signal depend on machine load, not just on the code
+    return not result.get("timedOut") and not result.get("cpuLimitExceeded") and result.get("exitCode", 0) >= 0
+
+
+class _Entry:
+    __slots__ = ("result", "size", "expires")
+
+    def __init__(self, result: dict, size: int, expires: float):
+        self.result = result
+        self.size = size
+        self.expires = expires
+
+
+class ExecutionCache:
+    """LRU of finished run results with a TTL and a total output budget."""
+
+    def __init__(self, max_entries: int = EXECUTION_CACHE_ENTRIES, ttl: float = EXECUTION_CACHE_TTL,
+                 max_bytes: int = EXECUTION_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self._evict(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc("miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        CACHE_LOOKUPS.inc("hit")
+        return dict(entry.result)
+
+    def put(self, key: str, result: dict):
+        if not self.enabled or not cacheable(result):
+            return
+        size = len(result.get("stdout", "")) + len(result.get("stderr", ""))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = _Entry(dict(result), size, time.monotonic() + self.ttl)
+        self.bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
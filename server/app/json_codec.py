@@ -0,0 +1,100 @@
+"""JSON encoding for REST responses and Socket.IO packets.
+
+The stdlib encoder and FastAPI's own response serialization are the default.
+With FAST_JSON=1 and orjson installed (`pip install .[fast]`):
+
+- routes that return through `wire()` skip response-model serialization and
+  hand their (already plain) fields straight to orjson;
+- Socket.IO packets are encoded with orjson, without python-socketio's
+  recursive scan for binary attachments. Only enable it while no handler
+  emits bytes.
+"""
+import json
+import os
+from typing import Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from socketio import packet
+
+# Opt in to orjson for responses and Socket.IO packets (ignored if orjson isn't installed)
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+
+def _load_orjson():
+    try:
+        import orjson
+    except ImportError:
+        print("FAST_JSON is set but orjson is not installed; using the default encoders")
+        return None
+    return orjson
+
+
+orjson = _load_orjson() if FAST_JSON else None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class WireJSONResponse(JSONResponse):
+    """JSONResponse for content that is already plain JSON types.
+
+    Returning one from a route skips FastAPI's jsonable_encoder walk over the
+    content, which is most of the cost for large whiteboards.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _plain(content):
+    if isinstance(content, BaseModel):
+        # Wire models hold JSON types only, so their attributes can be encoded as they are
+        return content.__dict__
+    if isinstance(content, list):
+        return [_plain(item) for item in content]
+    return content
+
+
+def wire(content, status_code: int = 200, response: Optional[Response] = None):
+    """Return a route's result, encoded by orjson directly when FAST_JSON is on.
+
+    Otherwise the content is returned unchanged for FastAPI to serialize
+    through the route's response_model. Pass the route's injected `response`
+    to keep headers set on it.
+    """
+    if orjson is None:
+        return content
+    result = WireJSONResponse(_plain(content), status_code=status_code)
+    if response is not None:
+        result.raw_headers.extend(response.raw_headers)
+    return result
+
+
+class _SocketJSON:
+    """The json module interface python-socketio encodes packets with."""
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        # Always compact; separators and friends don't apply
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    @staticmethod
+    def loads(data, **kwargs):
+        # orjson refuses integers beyond 64 bits, the same guard engineio.json adds to the stdlib
+        return orjson.loads(data)
+
+
+class FastPacket(packet.Packet):
+    # Every payload here is plain JSON; don't walk it looking for bytes on each emit
+    uses_binary_events = False
+    json = _SocketJSON
+
+
+def socketio_serializer():
+    """Value for AsyncServer(serializer=...)."""
+    return FastPacket if orjson is not None else "default"
@@ -4,18 +4,34 @@ import datetime
 import subprocess
 import sys
 import asyncio
-from typing import List, Optional, Dict
-from fastapi import FastAPI, HTTPException, Depends, status
+import base64
+import json
+import hmac
+from typing import Annotated, List, Optional, Dict, Union
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 import socketio
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update
+from sqlalchemy import update, and_, or_
 
-from .database import engine, Base, get_db, SessionLocal
-from . import models
+from .database import engine, get_db, SessionLocal
+from . import models, whiteboard_store, migrations, metrics, replay, json_codec, revisions, search, stats, export
+from .write_behind import WriteBehindBuffer
+from .rooms import RoomRegistry, ResyncRequired, check_room_affinity
+from .presence import PRESENCE_URL, SOCKETIO_MESSAGE_QUEUE, create_client_manager, create_presence_store
+from .cursors import CursorCoalescer
+from .broadcast import RoomBroadcaster
+from .execution import ExecutionPool, ExecutionError, ExecutionQueueFull, ExecutionUnavailable, tail
+from .execution_cache import ExecutionCache
+from .replay import ReplayRecorder
+from .compression import CompressionMiddleware, SOCKETIO_COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL
+from .session_cache import SessionCache
+from .profiler import profiler, ProfilerMiddleware, PROFILER_ENABLED, DEBUG_TOKEN
+from .questions import QuestionStore, QuestionBankError, QUESTIONS_PAGE_SIZE, QUESTIONS_MAX_PAGE_SIZE
 
 # --- Configuration ---
 SECRET_KEY = "supersecretkey"  # Change in production
@@ -48,6 +64,13 @@ class SessionCreate(BaseModel):
     candidateEmail: str
     language: str
 
+class ExecuteRequest(BaseModel):
+    code: str
+    language: str
+    stdin: Optional[str] = ""
+    # Set to false for programs whose output isn't a pure function of code + stdin (randomness, clocks)
+    cache: bool = True
+
 # Default code templates
 DEFAULT_CODE = {
     "python": """# Welcome to DevInterview.io
@@ -122,29 +145,176 @@ class Session(BaseModel):
     question: Optional[dict] = None
     serverTime: Optional[str] = None
     whiteboard: Optional[dict] = None
+    # Pass back as ?since= (or the ETag as If-None-Match) to only fetch what changed
+    revision: Optional[int] = None
+    interviewerId: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class SessionSummary(BaseModel):
+    # Listing view: no code, output, question or whiteboard
+    id: str
+    candidateName: str
+    candidateEmail: str
+    date: str
+    duration: int
+    score: Optional[int] = None
+    status: str
+    language: str
+
+class SessionSearchHit(SessionSummary):
+    relevance: float
+    # Best matching passage, matches wrapped in ** (plain text, not HTML)
+    snippet: Optional[str] = None
+
+SUMMARY_COLUMNS = (
+    models.Session.id,
+    models.Session.candidate_name,
+    models.Session.candidate_email,
+    models.Session.date,
+    models.Session.duration,
+    models.Session.score,
+    models.Session.status,
+    models.Session.language,
+)
+# GET /sessions page size when ?limit= isn't given; no request reads more than MAX_PAGE_SIZE rows
+SESSIONS_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Wire field -> models.Session column
+SESSION_WIRE = {
+    "id": "id",
+    "candidateName": "candidate_name",
+    "candidateEmail": "candidate_email",
+    "date": "date",
+    "duration": "duration",
+    "score": "score",
+    "status": "status",
+    "language": "language",
+    "notes": "notes",
+    "startTime": "start_time",
+    "code": "code",
+    "output": "output",
+    "question": "question",
+    "serverTime": "server_time",
+    "whiteboard": "whiteboard",
+    "revision": "revision",
+    "interviewerId": "interviewer_id",
+}
+
+def session_out(row, **overrides) -> Session:
+    """Map a models.Session row (or any object with its columns) to the wire model.
+
+    Every value comes from our own columns, so the model is built without
+    validation; FastAPI passes the instance through and serializes it once.
+    `overrides` replace fields by their wire name (e.g. pending edits).
+    """
+    fields = {wire: getattr(row, column) for wire, column in SESSION_WIRE.items()}
+    fields.update(overrides)
+    return Session.model_construct(**fields)
+
+def summary_out(row) -> SessionSummary:
+    return SessionSummary.model_construct(
+        id=row.id,
+        candidateName=row.candidate_name,
+        candidateEmail=row.candidate_email,
+        date=row.date,
+        duration=row.duration,
+        score=row.score,
+        status=row.status,
+        language=row.language,
+    )
+
 
 # --- Mock Database ---
 # users_db and sessions_db removed in favor of SQLAlchemy
 
 
 # --- Socket.IO Setup ---
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# With SOCKETIO_MESSAGE_QUEUE set, emits are fanned out to every worker through the queue.
+# Polling payloads are compressed by Engine.IO; websocket frames by app.ws_protocol under uvicorn.
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=create_client_manager(),
+                           serializer=json_codec.socketio_serializer(),
+                           compression_threshold=SOCKETIO_COMPRESSION_MIN_SIZE)
 sio_app = socketio.ASGIApp(sio)
 
 fastapi_app = FastAPI()
 
+# Session rows by id for read paths (LRU + TTL); every write to a row invalidates it
+session_cache = SessionCache()
+# Pending room edits (code, question, output, whiteboard records), flushed to the DB in the
+# background instead of per event. The factory is looked up lazily so tests can swap out SessionLocal.
+write_buffer = WriteBehindBuffer(lambda: SessionLocal(), on_flush=session_cache.invalidate,
+                                 on_write=stats.record_writes)
+# Append-only log of room changes with periodic keyframes, for replaying a session afterwards
+recorder = ReplayRecorder(lambda: SessionLocal(), write_buffer)
+# One actor per active room; socket handlers apply their state changes through it in order
+rooms = RoomRegistry(lambda: SessionLocal(), write_buffer, on_load=recorder.begin, cache=session_cache)
+
+# Optionally batches whiteboard/cursor/code broadcasts per room into one event per tick
+broadcaster = RoomBroadcaster(lambda *args, **kwargs: sio.emit(*args, **kwargs))
+
+async def _broadcast_cursor(sid, data):
+    await broadcaster.send(data['roomId'], 'cursor_move', data, skip_sid=sid)
+
+# Cursor moves are coalesced per connection and fanned out on a fixed tick
+cursors = CursorCoalescer(_broadcast_cursor)
+
+# Warm, resource-limited sandbox workers per language, shared fairly between rooms.
+# Identical reruns (same language, runtime, code and stdin) are answered from the cache.
+execution = ExecutionPool(cache=ExecutionCache())
+
+loop_lag = metrics.LoopLagMonitor()
+metrics.instrument_engine(engine)
+# Inside the metrics middleware, so it runs in the task that runs the route
+fastapi_app.add_middleware(ProfilerMiddleware)
+fastapi_app.middleware("http")(metrics.http_middleware)
+
 @fastapi_app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@fastapi_app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(await metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    thresholdMs: Optional[float] = None
+    clear: bool = False
+
+def _check_debug_token(token: Optional[str]):
+    # The /debug endpoints don't exist until DEBUG_TOKEN is set, and stay hidden from a wrong token
+    if not DEBUG_TOKEN or not hmac.compare_digest(token or "", DEBUG_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@fastapi_app.get("/debug/profiler", include_in_schema=False)
+async def get_profiler(x_debug_token: Annotated[Optional[str], Header()] = None):
+    # Slow handlers and loop stalls on this worker, newest first
+    _check_debug_token(x_debug_token)
+    return profiler.snapshot()
+
+@fastapi_app.put("/debug/profiler", include_in_schema=False)
+async def update_profiler(settings: ProfilerSettings, x_debug_token: Annotated[Optional[str], Header()] = None):
+    _check_debug_token(x_debug_token)
+    if settings.thresholdMs is not None:
+        if settings.thresholdMs <= 0:
+            raise HTTPException(status_code=400, detail="thresholdMs must be positive")
+        profiler.threshold = settings.thresholdMs / 1000
+    if settings.enabled is True:
+        profiler.enable()
+    elif settings.enabled is False:
+        profiler.disable()
+    if settings.clear:
+        profiler.clear()
+    return profiler.snapshot()
+
 @fastapi_app.on_event("startup")
 async def startup():
+    check_room_affinity(shared=bool(SOCKETIO_MESSAGE_QUEUE or PRESENCE_URL))
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await migrations.upgrade(conn)
     
     # Seed mock users if database is empty
     async with SessionLocal() as db:
@@ -161,19 +331,45 @@ async def startup():
             await db.commit()
             print("Seeding complete.")
 
+    write_buffer.start()
+    recorder.start()
+    cursors.start()
+    broadcaster.start()
+    loop_lag.start()
+    if PROFILER_ENABLED:
+        profiler.enable()
+    await execution.start()
+
+@fastapi_app.on_event("shutdown")
+async def shutdown():
+    await execution.stop()
+    await loop_lag.stop()
+    profiler.disable()
+    await cursors.stop()
+    await rooms.stop()
+    await recorder.stop()
+    await broadcaster.stop()
+    await write_buffer.stop()
+    await presence.close()
+
 # Mount Socket.IO at /ws
 # fastapi_app.mount("/ws", sio_app)
 
+# gzip/brotli for REST bodies above COMPRESSION_MIN_SIZE
+fastapi_app.add_middleware(CompressionMiddleware)
+
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "X-Server-Time"],
 )
 
 # --- Auth Utils ---
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Not enforced by the scheme itself: candidates open their session by link, without a token
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -182,6 +378,51 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def _token_user(token: str, db: AsyncSession) -> Optional[models.User]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    result = await db.execute(select(models.User).where(models.User.email == payload.get("sub")))
+    return result.scalars().first()
+
+async def current_user(token: Optional[str] = Depends(oauth2_scheme),
+                       db: AsyncSession = Depends(get_db)) -> Optional[models.User]:
+    """The user the bearer token was issued to, or None without a token."""
+    if not token:
+        return None
+    user = await _token_user(token, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+async def optional_user(token: Optional[str] = Depends(oauth2_scheme),
+                        db: AsyncSession = Depends(get_db)) -> Optional[models.User]:
+    """Like current_user, but an expired or invalid token counts as none, for routes candidates use too."""
+    return await _token_user(token, db) if token else None
+
+async def require_interviewer(user: Optional[models.User] = Depends(current_user)) -> models.User:
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if user.role != "interviewer":
+        raise HTTPException(status_code=403, detail="Only interviewers can manage sessions")
+    return user
+
+def check_owner(session, user: models.User):
+    # Someone else's session looks like a missing one, so ids can't be probed
+    if session.interviewer_id != user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+def check_member(session, user: Optional[models.User], socket_id: Optional[str]):
+    """The session's own interviewer, or a Socket.IO connection (sent as X-Socket-Id) that joined its room."""
+    if user is not None and user.role == "interviewer":
+        check_owner(session, user)
+        return
+    # Candidates have no token: being in the room is what lets them act on the session
+    if not socket_id or sid_map.get(socket_id, (None,))[0] != session.id:
+        raise HTTPException(status_code=403, detail="Join the session's room first")
+
 # --- Routes ---
 
 @fastapi_app.post("/auth/signup", response_model=Dict)
@@ -233,35 +474,70 @@ async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
         "token": token
     }
 
-@fastapi_app.get("/sessions", response_model=List[Session])
-async def get_sessions(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.Session))
-    sessions = result.scalars().all()
-    return [
-        Session(
-            id=s.id,
-            candidateName=s.candidate_name,
-            candidateEmail=s.candidate_email,
-            date=s.date,
-            duration=s.duration,
-            score=s.score,
-            status=s.status,
-            language=s.language,
-            notes=s.notes,
-            startTime=s.start_time,
-            code=s.code,
-            output=s.output,
-            question=s.question,
-            serverTime=s.server_time,
-            whiteboard=s.whiteboard
-        ) for s in sessions
-    ]
+def encode_cursor(date: str, session_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([date, session_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        date, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(date), str(session_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def sessions_query(interviewer_id: str, summary: bool = False, status_filter: Optional[str] = None,
+                   language: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None):
+    # Newest first; (date, id) is unique so it doubles as the keyset for paging.
+    # ix_sessions_interviewer_date serves both the filter and the order.
+    query = select(*SUMMARY_COLUMNS) if summary else select(models.Session)
+    query = query.where(models.Session.interviewer_id == interviewer_id)
+    if status_filter:
+        query = query.where(models.Session.status == status_filter)
+    if language:
+        query = query.where(models.Session.language == language)
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            models.Session.date < cursor_date,
+            and_(models.Session.date == cursor_date, models.Session.id < cursor_id)
+        ))
+    query = query.order_by(models.Session.date.desc(), models.Session.id.desc())
+    if limit:
+        # Fetch one extra row to know whether there is a next page
+        query = query.limit(limit + 1)
+    return query
+
+@fastapi_app.get("/sessions", response_model=List[Union[Session, SessionSummary]])
+async def get_sessions(
+    response: Response,
+    summary: bool = False,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    language: Optional[str] = None,
+    limit: int = Query(SESSIONS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: models.User = Depends(require_interviewer),
+    db: AsyncSession = Depends(get_db)
+):
+    # The caller's own sessions only
+    query = sessions_query(user.id, summary, status_filter, language, cursor, limit)
+    result = await db.execute(query)
+    rows = result.all() if summary else result.scalars().all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.date, last.id)
+
+    if summary:
+        return json_codec.wire([summary_out(s) for s in rows], response=response)
+    return json_codec.wire([session_out(s) for s in rows], response=response)
 
 @fastapi_app.post("/sessions", response_model=Session, status_code=201)
-async def create_session(session_data: SessionCreate, db: AsyncSession = Depends(get_db)):
+async def create_session(session_data: SessionCreate, user: models.User = Depends(require_interviewer),
+                         db: AsyncSession = Depends(get_db)):
     session_id = str(uuid.uuid4())[:8] # Short ID for easier sharing
     new_session = models.Session(
         id=session_id,
+        interviewer_id=user.id,
         candidate_name=session_data.candidateName,
         candidate_email=session_data.candidateEmail,
         date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
@@ -272,72 +548,158 @@ async def create_session(session_data: SessionCreate, db: AsyncSession = Depends
         output=""
     )
     db.add(new_session)
+    await stats.record(db, None, stats.facts(new_session))
     await db.commit()
     await db.refresh(new_session)
     
-    # Map back to Pydantic model (fields match mostly, but snake_case vs camelCase needs handling if not using aliases)
-    # Our Pydantic model uses camelCase for some fields (candidateName), but DB uses snake_case (candidate_name).
-    # We should probably update Pydantic model to use aliases or map manually.
-    # For now, manual mapping or constructing the response.
-    # Actually, FastAPI/Pydantic can handle ORM objects if `from_attributes = True` (v2) or `orm_mode = True` (v1).
-    # Let's update the Pydantic model to support ORM mode.
-    return Session(
-        id=new_session.id,
-        candidateName=new_session.candidate_name,
-        candidateEmail=new_session.candidate_email,
-        date=new_session.date,
-        duration=new_session.duration,
-        score=new_session.score,
-        status=new_session.status,
-        language=new_session.language,
-        notes=new_session.notes,
-        startTime=new_session.start_time,
-        code=new_session.code,
-        output=new_session.output,
-        question=new_session.question,
-        serverTime=new_session.server_time,
-        whiteboard=new_session.whiteboard
-    )
+    return json_codec.wire(session_out(new_session), status_code=201)
+
+# Declared before /sessions/{session_id} so "export" isn't taken for an id
+@fastapi_app.get("/sessions/export")
+async def export_sessions(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    gzip: bool = False,
+    user: models.User = Depends(require_interviewer),
+):
+    # The caller's sessions, streamed oldest first in batches; the CompressionMiddleware compresses it for clients
+    # that accept an encoding, while gzip=true sends a .gz file for clients that can't
+    try:
+        names = export.parse_fields(fields)
+        stmt = export.query(user.id, names, export.parse_day(start, "from"), export.parse_day(end, "to"))
+    except export.ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Include room edits still waiting to be written
+    await write_buffer.flush_all()
+
+    media_type, extension = export.FORMATS[fmt]
+    body = export.encode(fmt, names, export.iter_batches(SessionLocal, stmt))
+    filename = f"sessions.{extension}"
+    if gzip:
+        body, media_type, filename = export.gzipped(body, COMPRESSION_GZIP_LEVEL), "application/gzip", filename + ".gz"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Declared before /sessions/{session_id} so "stats" isn't taken for an id
+@fastapi_app.get("/sessions/stats")
+async def get_session_stats(
+    day_from: Optional[str] = Query(None, alias="from", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    day_to: Optional[str] = Query(None, alias="to", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    user: models.User = Depends(require_interviewer),
+    db: AsyncSession = Depends(get_db)
+):
+    # The caller's sessions, precomputed by app.stats; per-day rows default to the last 30 days
+    if not day_from and not day_to:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        day_from = (today - datetime.timedelta(days=29)).isoformat()
+    return await stats.read(db, user.id, day_from, day_to)
+
+# Declared before /sessions/{session_id} so "search" isn't taken for an id
+@fastapi_app.get("/sessions/search", response_model=List[SessionSearchHit])
+async def search_sessions(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    language: Optional[str] = None,
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: models.User = Depends(require_interviewer),
+    db: AsyncSession = Depends(get_db)
+):
+    # The caller's sessions, best match first; every word of q must match, the last one as a prefix
+    try:
+        rows, next_cursor = await search.search(db, user.id, q, status_filter, language, cursor, limit)
+    except search.SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except search.SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    hits = [
+        SessionSearchHit.model_construct(**dict(summary_out(row)), relevance=row.relevance, snippet=row.snippet)
+        for row in rows
+    ]
+    return json_codec.wire(hits, response=response)
 
 @fastapi_app.get("/sessions/{session_id}", response_model=Session)
-async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.Session).where(models.Session.id == session_id))
-    session = result.scalars().first()
-    if not session:
+async def get_session(
+    session_id: str,
+    response: Response = None,
+    since: Optional[int] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+    user: Optional[models.User] = Depends(optional_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Revisions first: a client that is up to date never makes us load the board
+    current = await session_cache.get(db, session_id)
+    if not current:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Inject current server time for sync
-    # We don't save serverTime to DB usually, it's a transient field for sync?
-    # The model has server_time.
-    # Let's set it on the object before returning.
-    session.server_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    return Session(
-        id=session.id,
-        candidateName=session.candidate_name,
-        candidateEmail=session.candidate_email,
-        date=session.date,
-        duration=session.duration,
-        score=session.score,
-        status=session.status,
-        language=session.language,
-        notes=session.notes,
-        startTime=session.start_time,
-        code=session.code,
-        output=session.output,
-        question=session.question,
-        serverTime=session.server_time,
-        whiteboard=session.whiteboard
-    )
+    # Candidates join by link without a token; interviewers only see their own sessions
+    if user is not None and user.role == "interviewer":
+        check_owner(current, user)
+
+    # Current server time, for clients to sync their timers (not stored)
+    server_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    # Unflushed edits are fresher than the row and not counted in its revision yet,
+    # so while there are any the response can't be validated against it
+    pending = write_buffer.pending(session_id) or {}
+    pending_records = write_buffer.pending_whiteboard(session_id)
+    headers = {"X-Server-Time": server_time}
+    if not pending and not pending_records:
+        headers["ETag"] = revisions.etag(current.revision)
+        headers["Cache-Control"] = "no-cache"
+        if revisions.matches(if_none_match, current.revision):
+            return Response(status_code=304, headers=headers)
+
+    if since is not None and 0 <= since <= current.revision:
+        # Only the fields whose group changed after `since`, plus anything still pending
+        changed = revisions.changed_since(current, since) | set(pending)
+        if pending_records:
+            changed.add("whiteboard")
+        columns = {"id", "revision"} | (changed - {"whiteboard"})
+        delta = {wire: getattr(current, column) for wire, column in SESSION_WIRE.items() if column in columns}
+        delta.update((wire, pending[column]) for wire, column in SESSION_WIRE.items() if column in pending)
+        if "whiteboard" in changed:
+            delta["whiteboard"] = whiteboard_store.overlay(
+                await whiteboard_store.snapshot(db, session_id), pending_records
+            )
+        delta["serverTime"] = server_time
+        return json_codec.WireJSONResponse(delta, headers=headers)
+
+    session = current
+    if response is not None:
+        response.headers.update(headers)
+
+    return json_codec.wire(session_out(
+        session,
+        serverTime=server_time,
+        language=pending.get("language", session.language),
+        startTime=pending.get("start_time", session.start_time),
+        code=pending.get("code", session.code),
+        output=pending.get("output", session.output),
+        question=pending.get("question", session.question),
+        whiteboard=whiteboard_store.overlay(
+            await whiteboard_store.snapshot(db, session_id),
+            pending_records
+        )
+    ), response=response)
 
 @fastapi_app.post("/sessions/{session_id}/terminate")
-async def terminate_session(session_id: str, db: AsyncSession = Depends(get_db)):
+async def terminate_session(session_id: str, user: models.User = Depends(require_interviewer),
+                            db: AsyncSession = Depends(get_db)):
+    await write_buffer.flush(session_id)
+
     result = await db.execute(select(models.Session).where(models.Session.id == session_id))
     session = result.scalars().first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    check_owner(session, user)
     
+    before = stats.facts(session)
     session.status = "completed"
+    changed = ["status"]
     
     # Calculate duration if start_time exists
     if session.start_time:
@@ -350,120 +712,248 @@ async def terminate_session(session_id: str, db: AsyncSession = Depends(get_db))
             
             diff = now - start
             session.duration = max(1, int(diff.total_seconds() / 60))
+            changed.append("duration")
         except Exception as e:
             print(f"Error calculating duration: {e}")
-            
+
+    revisions.stamp(session, changed)
+    await stats.record(db, before, stats.facts(session))
     await db.commit()
+    await session_cache.invalidate(session_id)
     await sio.emit('session_ended', {}, room=session_id)
     return {"message": "Session terminated"}
 
 @fastapi_app.delete("/sessions/{session_id}")
-async def delete_session(session_id: str, db: AsyncSession = Depends(get_db)):
+async def delete_session(session_id: str, user: models.User = Depends(require_interviewer),
+                         db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Session).where(models.Session.id == session_id))
     session = result.scalars().first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    check_owner(session, user)
     
+    write_buffer.discard(session_id)
+    rooms.invalidate(session_id)
+    recorder.discard(session_id)
+    await whiteboard_store.delete_board(db, session_id)
+    await replay.delete_recording(db, session_id)
+    await stats.record(db, stats.facts(session), None)
     await db.delete(session)
     await db.commit()
+    await session_cache.invalidate(session_id)
     return {"message": "Session deleted"}
 
 @fastapi_app.put("/sessions/{session_id}")
-async def update_session(session_id: str, data: dict, db: AsyncSession = Depends(get_db)):
+async def update_session(session_id: str, data: dict, user: models.User = Depends(require_interviewer),
+                         db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Session).where(models.Session.id == session_id))
     session = result.scalars().first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    check_owner(session, user)
     
-    if "score" in data:
-        session.score = data["score"]
-    if "notes" in data:
-        session.notes = data["notes"]
-        
+    before = stats.facts(session)
+    changed = [field for field in ("score", "notes") if field in data]
+    for field in changed:
+        setattr(session, field, data[field])
+    if changed:
+        revisions.stamp(session, changed)
+        await stats.record(db, before, stats.facts(session))
+
     await db.commit()
+    await session_cache.invalidate(session_id)
     await db.refresh(session)
-    
-    return Session(
-        id=session.id,
-        candidateName=session.candidate_name,
-        candidateEmail=session.candidate_email,
-        date=session.date,
-        duration=session.duration,
-        score=session.score,
-        status=session.status,
-        language=session.language,
-        notes=session.notes,
-        startTime=session.start_time,
-        code=session.code,
-        output=session.output,
-        question=session.question,
-        serverTime=session.server_time,
-        whiteboard=session.whiteboard
-    )
+
+    return json_codec.wire(session_out(session, whiteboard=await whiteboard_store.snapshot(db, session_id)))
 
 @fastapi_app.post("/sessions/{session_id}/save_code")
-async def save_code_endpoint(session_id: str, data: dict, db: AsyncSession = Depends(get_db)):
+async def save_code_endpoint(session_id: str, data: dict,
+                             x_socket_id: Annotated[Optional[str], Header()] = None,
+                             user: Optional[models.User] = Depends(optional_user),
+                             db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(models.Session).where(models.Session.id == session_id))
     session = result.scalars().first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    check_member(session, user, x_socket_id)
     
-    if "code" in data:
-        session.code = data["code"]
-    if "language" in data:
-        session.language = data["language"]
-        
+    before = stats.facts(session)
+    changed = [field for field in ("code", "language") if field in data]
+    for field in changed:
+        setattr(session, field, data[field])
+    if changed:
+        revisions.stamp(session, changed)
+        await stats.record(db, before, stats.facts(session))
+
+    # An explicit save supersedes any keystrokes still waiting to be flushed
+    write_buffer.discard(session_id, "code", "language")
     await db.commit()
+    await session_cache.invalidate(session_id)
+    rooms.invalidate(session_id)
     return {"message": "Code saved successfully"}
 
+async def run_code(room_id: str, language: str, code: str, stdin: str = "", use_cache: bool = True) -> dict:
+    """Run code in the sandbox pool, streaming output to the room, then share the result like a client-side run."""
+    run_id = uuid.uuid4().hex[:8]
+    seq = 0
+
+    async def on_output(stream, text):
+        nonlocal seq
+        seq += 1
+        await sio.emit('execution_output', {'roomId': room_id, 'runId': run_id, 'seq': seq,
+                                            'stream': stream, 'data': text}, room=room_id)
+
+    await sio.emit('execution_started', {'roomId': room_id, 'runId': run_id, 'language': language}, room=room_id)
+    try:
+        result = await execution.run(room_id, language, code, stdin, on_output=on_output, use_cache=use_cache)
+    except Exception as e:
+        await sio.emit('execution_result', {'roomId': room_id, 'runId': run_id, 'output': '', 'error': str(e)},
+                       room=room_id)
+        raise
+    result["runId"] = run_id
+    error = result["stderr"] or None
+    if result["timedOut"]:
+        error = (error or "") + "Execution timed out"
+    elif result["cpuLimitExceeded"]:
+        error = (error or "") + "CPU time limit exceeded"
+    elif result["outputLimitExceeded"]:
+        error = (error or "") + "Output limit exceeded"
+    # stdout/stderr are already just the tail of the run, so that's all that gets persisted
+    await publish_execution_result(room_id, {"roomId": room_id, "output": result["stdout"], "error": error, **result})
+    return result
+
+@fastapi_app.post("/sessions/{session_id}/execute")
+async def execute_endpoint(session_id: str, data: ExecuteRequest,
+                           x_socket_id: Annotated[Optional[str], Header()] = None,
+                           user: Optional[models.User] = Depends(optional_user),
+                           db: AsyncSession = Depends(get_db)):
+    current = await session_cache.get(db, session_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Session not found")
+    check_member(current, user, x_socket_id)
+    try:
+        return await run_code(session_id, data.language, data.code, data.stdin or "", data.cache)
+    except ExecutionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutionQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ExecutionUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def _require_session(db: AsyncSession, session_id: str, user: models.User):
+    # Replays hold the whole code and whiteboard history: the owning interviewer only
+    session = await session_cache.get(db, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    check_owner(session, user)
+
+@fastapi_app.get("/sessions/{session_id}/replay")
+async def get_replay(session_id: str, user: models.User = Depends(require_interviewer),
+                     db: AsyncSession = Depends(get_db)):
+    # Timeline bounds and keyframe positions; times are server epoch milliseconds
+    await _require_session(db, session_id, user)
+    await recorder.flush()
+    return json_codec.WireJSONResponse(await replay.timeline(db, session_id))
+
+@fastapi_app.get("/sessions/{session_id}/replay/state")
+async def get_replay_state(session_id: str, at: int, user: models.User = Depends(require_interviewer),
+                           db: AsyncSession = Depends(get_db)):
+    await _require_session(db, session_id, user)
+    await recorder.flush()
+    state = await replay.state_at(db, session_id, at)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Nothing recorded for this session")
+    # Whole whiteboards: skip the jsonable_encoder walk
+    return json_codec.WireJSONResponse(state)
+
+@fastapi_app.get("/sessions/{session_id}/replay/events")
+async def get_replay_events(
+    session_id: str,
+    start: Optional[int] = Query(None, alias="from"),
+    end: Optional[int] = Query(None, alias="to"),
+    user: models.User = Depends(require_interviewer),
+    db: AsyncSession = Depends(get_db)
+):
+    # One JSON event per line, read page by page so long sessions never sit in memory whole
+    await _require_session(db, session_id, user)
+    await recorder.flush()
+
+    async def lines():
+        async for event in replay.iter_events(SessionLocal, session_id, start, end):
+            yield json_codec.dumps(event) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 # --- Question Bank ---
-QUESTION_BANK = {
-    "python": [
-        {
-            "id": "1", 
-            "title": "Reverse String", 
-            "difficulty": "easy", 
-            "category": "Strings",
-            "description": "Write a function that reverses a string. The input string is given as an array of characters `s`.\n\nExample:\n```python\ndef reverseString(s):\n    s.reverse()\n```"
-        },
-        {
-            "id": "2", 
-            "title": "Two Sum", 
-            "difficulty": "medium", 
-            "category": "Arrays",
-            "description": "Given an array of integers `nums` and an integer `target`, return indices of the two numbers such that they add up to `target`.\n\nExample:\n```python\n# Input: nums = [2,7,11,15], target = 9\n# Output: [0,1]\n```"
-        },
-    ],
-    "javascript": [
-        {
-            "id": "3", 
-            "title": "Event Loop", 
-            "difficulty": "medium", 
-            "category": "Async",
-            "description": "Explain the JavaScript Event Loop and how it handles asynchronous operations.\n\nExample:\n```javascript\nconsole.log('Start');\nsetTimeout(() => console.log('Timeout'), 0);\nPromise.resolve().then(() => console.log('Promise'));\nconsole.log('End');\n```"
-        },
-        {
-            "id": "4", 
-            "title": "Closures", 
-            "difficulty": "easy", 
-            "category": "Functions",
-            "description": "What is a closure in JavaScript? Provide an example.\n\nExample:\n```javascript\nfunction outer() {\n    const name = 'Mozilla';\n    function inner() {\n        console.log(name);\n    }\n    return inner;\n}\n```"
-        },
-    ]
-}
+# Loaded from data files (QUESTION_BANK_PATH) at startup; POST /resources/questions/reload picks up edits
+question_store = QuestionStore()
+question_store.load()
 
 @fastapi_app.get("/resources/questions")
-def get_questions(language: str, level: str):
-    lang_lower = language.lower()
-    return QUESTION_BANK.get(lang_lower, [])
+def get_questions(
+    response: Response,
+    language: Optional[str] = None,
+    level: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(QUESTIONS_PAGE_SIZE, ge=1, le=QUESTIONS_MAX_PAGE_SIZE),
+):
+    # In bank order; X-Next-Cursor is set while there are more
+    try:
+        page, next_cursor, total = question_store.query(language, level, category, q, cursor, limit)
+    except QuestionBankError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    return page
+
+@fastapi_app.post("/resources/questions/reload", include_in_schema=False)
+async def reload_questions(force: bool = False, x_debug_token: Annotated[Optional[str], Header()] = None):
+    _check_debug_token(x_debug_token)
+    reloaded = await question_store.reload(force)
+    return {"reloaded": reloaded, "questions": len(question_store.index)}
 
 # --- Socket Events ---
-# Track users in rooms: room_id -> {user_id: user_data}
-room_users: Dict[str, Dict[str, dict]] = {}
-# Track sid to room/user for disconnect cleanup: sid -> (room_id, user_id)
+# Track users in rooms (shared between workers when PRESENCE_URL is set)
+presence = create_presence_store()
+# Track sid to room/user for disconnect cleanup: sid -> (room_id, user_id).
+# A socket always disconnects on the worker it connected to, so this stays local.
 sid_map: Dict[str, tuple] = {}
 
+def _connection_count():
+    # Every connected sid is in the namespace's `None` room on this worker
+    return len(sio.manager.rooms.get('/', {}).get(None, {}))
+
+metrics.REGISTRY.callback("socketio_connections", "Open Socket.IO connections on this worker", _connection_count)
+metrics.REGISTRY.callback("rooms_active", "Rooms with at least one user present", lambda: presence.room_count())
+metrics.REGISTRY.callback("room_actors_active", "Rooms with a live state actor on this worker",
+                          lambda: len(rooms.active_rooms()))
+metrics.REGISTRY.callback("execution_queued", "Server-side runs waiting for a worker", lambda: execution.queued)
+metrics.REGISTRY.callback("execution_cache_entries", "Cached execution results",
+                          lambda: len(execution.cache) if execution.cache else 0)
+metrics.REGISTRY.callback("execution_cache_bytes", "Output bytes held by the execution cache",
+                          lambda: execution.cache.bytes if execution.cache else 0)
+metrics.REGISTRY.callback("cursor_moves_received_total", "cursor_move events received", lambda: cursors.received,
+                          type="counter")
+metrics.REGISTRY.callback("cursor_moves_sent_total", "Coalesced cursor broadcasts sent", lambda: cursors.sent,
+                          type="counter")
+metrics.REGISTRY.callback("session_cache_entries", "Session rows held by the session cache",
+                          lambda: len(session_cache))
+metrics.REGISTRY.callback("session_cache_hit_ratio", "Session cache hits / lookups since start",
+                          session_cache.hit_ratio)
+metrics.REGISTRY.callback("slow_handlers_total", "Handlers slower than the profiler threshold (while profiling)",
+                          lambda: profiler.slow, type="counter")
+metrics.REGISTRY.callback("event_loop_stalls_total", "Loop stalls longer than the profiler threshold (while profiling)",
+                          lambda: profiler.stalls, type="counter")
+metrics.REGISTRY.callback("questions_loaded", "Questions in the loaded question bank",
+                          lambda: len(question_store.index))
+# Pool saturation: compare with DB_POOL_SIZE + DB_MAX_OVERFLOW (in-memory SQLite has no pool to size)
+metrics.REGISTRY.callback("db_pool_checked_out", "Database connections in use on this worker",
+                          lambda: engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 0)
+
 @sio.event
 async def connect(sid, environ):
     print(f"Connected: {sid}")
@@ -471,20 +961,22 @@ async def connect(sid, environ):
 @sio.event
 async def disconnect(sid):
     print(f"Disconnected: {sid}")
+    cursors.forget(sid)
     if sid in sid_map:
         room_id, user_id = sid_map[sid]
         del sid_map[sid]
         
-        if room_id in room_users and user_id in room_users[room_id]:
-            # Only remove if this sid matches the user's current sid
-            # This handles the case where a user refreshes (new sid joins before old sid leaves)
-            if room_users[room_id][user_id].get('sid') == sid:
-                del room_users[room_id][user_id]
-                
-                # Broadcast updated user list
-                users_list = list(room_users[room_id].values())
-                await sio.emit('room_users', {'users': users_list}, room=room_id)
-                await sio.emit('user_left', {'userId': user_id}, room=room_id)
+        # Only remove if this sid matches the user's current sid
+        # This handles the case where a user refreshes (new sid joins before old sid leaves),
+        # even when the new connection landed on another worker
+        users_list = await presence.leave(room_id, user_id, sid=sid)
+        if users_list is not None:
+            if not users_list:
+                await write_buffer.flush(room_id)
+            
+            # Broadcast updated user list
+            await sio.emit('room_users', {'users': users_list}, room=room_id)
+            await sio.emit('user_left', {'userId': user_id}, room=room_id)
 
 @sio.event
 async def join_room(sid, data):
@@ -493,59 +985,37 @@ async def join_room(sid, data):
     user = data['user']
     
     await sio.enter_room(sid, room_id)
-    
-    if room_id not in room_users:
-        room_users[room_id] = {}
+    # Code updates go out as operations to delta-capable clients and as full text to the rest
+    await sio.enter_room(sid, code_room(room_id, data.get('protocol') == 'delta'))
     
     # Add user to room tracking
     user['sid'] = sid
-    room_users[room_id][user['id']] = user
+    users_list = await presence.join(room_id, user)
     sid_map[sid] = (room_id, user['id'])
     
-    # Start timer if not started
-    async with SessionLocal() as db:
-        result = await db.execute(select(models.Session).where(models.Session.id == room_id))
-        session = result.scalars().first()
-        
-        if session:
-            if session.start_time is None:
-                session.start_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
-                await db.commit()
-                # Broadcast session update or just let clients fetch it?
-                # Better to emit an event so clients update timer immediately
-                # We need to serialize the session manually or use Pydantic
-                session_dict = {
-                    "id": session.id,
-                    "startTime": session.start_time,
-                    # Add other fields if needed by frontend
-                }
-                await sio.emit('session_updated', session_dict, room=room_id)
-            
-            await sio.emit('code_change', {'code': session.code, 'language': session.language}, room=sid)
-            if session.question:
-                await sio.emit('custom_question', {'question': session.question}, room=sid)
-            if session.output:
-                await sio.emit('execution_result', {'output': session.output}, room=sid)
-            if session.whiteboard:
-                 # Send full whiteboard state on join
-                 # Frontend expects { changes: { added: ... } } or just the state?
-                 # Frontend 'initialState' prop handles the load on mount.
-                 # But if we join late, we might need an event?
-                 # The 'whiteboard_update' event sends changes.
-                 # If we rely on 'initialState' via API, we don't need to emit here.
-                 # But let's check frontend logic.
-                 # Frontend uses 'initialState' prop passed from InterviewRoom.
-                 # InterviewRoom fetches session via API.
-                 # So we don't strictly need to emit here if the user just loaded the page.
-                 # However, if they reconnect via socket without reloading page?
-                 # Let's emit it just in case, or skip it if API handles it.
-                 # Existing code didn't emit whiteboard on join, it relied on 'whiteboard_update' broadcast?
-                 # No, existing code didn't have persistence.
-                 # Let's leave it to API for initial load.
-                 pass
+    async def sync_joined_user(room):
+        state = room.state
+        if not state.exists:
+            return
+
+        # Start timer if not started
+        if state.start_time is None:
+            state.start_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            write_buffer.stage(room_id, start_time=state.start_time)
+            await write_buffer.flush(room_id)
+            # Emit an event so clients update their timer immediately
+            await sio.emit('session_updated', {"id": room_id, "startTime": state.start_time}, room=room_id)
+
+        await sio.emit('code_change', code_snapshot(state), room=sid)
+        if state.question:
+            await sio.emit('custom_question', {'question': state.question}, room=sid)
+        if state.output:
+            await sio.emit('execution_result', {'output': state.output}, room=sid)
+        # The whiteboard is loaded through GET /sessions/{id} ('initialState' on the client)
+
+    await rooms.submit(room_id, sync_joined_user)
 
     # Broadcast updated user list to EVERYONE in the room
-    users_list = list(room_users[room_id].values())
     await sio.emit('room_users', {'users': users_list}, room=room_id)
     
     # Also emit user_joined for toast notifications if desired
@@ -557,111 +1027,150 @@ async def leave_room(sid, data):
     user_id = data['userId']
     
     await sio.leave_room(sid, room_id)
+    await sio.leave_room(sid, code_room(room_id, True))
+    await sio.leave_room(sid, code_room(room_id, False))
     
     if sid in sid_map:
         del sid_map[sid]
     
-    if room_id in room_users and user_id in room_users[room_id]:
-        del room_users[room_id][user_id]
+    users_list = await presence.leave(room_id, user_id)
+    if users_list is not None:
+        if not users_list:
+            await write_buffer.flush(room_id)
         
-    # Broadcast updated user list
-    if room_id in room_users:
-        users_list = list(room_users[room_id].values())
+        # Broadcast updated user list
         await sio.emit('room_users', {'users': users_list}, room=room_id)
         
     await sio.emit('user_left', {'userId': user_id}, room=room_id)
 
+def code_room(room_id, delta):
+    return f"{room_id}:{'delta' if delta else 'full'}"
+
+def code_snapshot(state):
+    # Full resync payload; delta clients rebase their next operation on this revision
+    return {'code': state.code, 'language': state.language, 'revision': state.revision, 'epoch': state.epoch}
+
+async def broadcast_code(room_id, state, ops, sid):
+    await broadcaster.send(code_room(room_id, True), 'code_delta', {
+        'ops': ops,
+        'revision': state.revision,
+        'epoch': state.epoch,
+        'language': state.language
+    }, skip_sid=sid)
+    await broadcaster.send(code_room(room_id, False), 'code_change', {
+        'roomId': room_id,
+        'code': state.code,
+        'language': state.language
+    }, skip_sid=sid)
+
 @sio.event
 async def code_change(sid, data):
-    # Broadcast code to everyone else in the room
+    # Full-text update from clients that don't send deltas
     # data = {roomId: "...", code: "...", language: "..."}
     room_id = data['roomId']
-    
-    async with SessionLocal() as db:
-        result = await db.execute(select(models.Session).where(models.Session.id == room_id))
-        session = result.scalars().first()
-        if session:
-            session.code = data['code']
-            session.language = data['language']
-            await db.commit()
-        
-    await sio.emit('code_change', data, room=room_id, skip_sid=sid)
+
+    async def apply(room):
+        ops = room.state.replace_code(data['code'])
+        room.state.language = data['language']
+        await recorder.record_code(room_id, room.state)
+        # Persisted by the write-behind flusher, not on every keystroke
+        write_buffer.stage(room_id, code=room.state.code, language=room.state.language)
+        await broadcast_code(room_id, room.state, ops, sid)
+
+    await rooms.submit(room_id, apply)
+
+@sio.event
+async def code_delta(sid, data):
+    # data = {roomId: "...", epoch: "...", baseRevision: 3, ops: [5, "x", -2, 10], language?: "..."}
+    room_id = data['roomId']
+
+    async def apply(room):
+        state = room.state
+        try:
+            ops = state.apply_delta(data.get('epoch'), data.get('baseRevision'), data.get('ops'))
+        except ResyncRequired:
+            # Too old, from a previous room lifetime, or malformed: send the whole document
+            await sio.emit('code_resync', code_snapshot(state), room=sid)
+            return
+        if data.get('language'):
+            state.language = data['language']
+        await recorder.record_code(room_id, state)
+        write_buffer.stage(room_id, code=state.code, language=state.language)
+        await sio.emit('code_ack', {'revision': state.revision, 'epoch': state.epoch}, room=sid)
+        await broadcast_code(room_id, state, ops, sid)
+
+    await rooms.submit(room_id, apply)
+
+@sio.event
+async def code_resync(sid, data):
+    async def send(room):
+        await sio.emit('code_resync', code_snapshot(room.state), room=sid)
+
+    await rooms.submit(data['roomId'], send)
 
 @sio.event
 async def cursor_move(sid, data):
-    await sio.emit('cursor_move', data, room=data['roomId'], skip_sid=sid)
+    # Only the latest position per connection survives until the next tick
+    await cursors.push(sid, data)
 
 @sio.event
 async def whiteboard_update(sid, data):
     room_id = data['roomId']
-    
-    async with SessionLocal() as db:
-        result = await db.execute(select(models.Session).where(models.Session.id == room_id))
-        session = result.scalars().first()
-        
-        if session:
-            # data['changes'] contains the tldraw updates
-            # We need to merge these into the session state
-            
-            # Ensure whiteboard is a dict (it might be None initially)
-            # Note: SQLAlchemy JSON type returns dict or list, or None.
-            # We need to be careful about mutating it.
-            # For JSON types, often you need to re-assign the field to trigger update if mutable tracking isn't perfect.
-            current_wb = dict(session.whiteboard) if session.whiteboard else {}
-            
-            # Apply changes to our in-memory store
-            # changes = { added: {...}, updated: {...}, removed: {...} }
-            changes = data.get('changes', {})
-            
-            added = changes.get('added', {})
-            updated = changes.get('updated', {})
-            removed = changes.get('removed', {})
-            
-            for k, v in added.items():
-                current_wb[k] = v
-                
-            for k, v in updated.items():
-                if isinstance(v, list) and len(v) == 2:
-                    current_wb[k] = v[1]
-                else:
-                    current_wb[k] = v
-                    
-            for k, v in removed.items():
-                if k in current_wb:
-                    del current_wb[k]
-            
-            session.whiteboard = current_wb
-            await db.commit()
-                
-    await sio.emit('whiteboard_update', data, room=data['roomId'], skip_sid=sid)
+
+    async def apply(room):
+        # data['changes'] = { added: {...}, updated: {...}, removed: {...} } from tldraw.
+        # Only the changed records are staged (and recorded for replay); the board itself isn't loaded here.
+        if room.state.exists:
+            records = whiteboard_store.flatten_changes(data.get('changes', {}))
+            await recorder.record_whiteboard(room_id, room.state, records)
+            write_buffer.stage_whiteboard(room_id, records)
+        await broadcaster.send(room_id, 'whiteboard_update', data, skip_sid=sid)
+
+    await rooms.submit(room_id, apply)
 
 @sio.event
 async def custom_question(sid, data):
     # data = {roomId: "...", question: {...}}
     room_id = data['roomId']
-    
-    async with SessionLocal() as db:
-        result = await db.execute(select(models.Session).where(models.Session.id == room_id))
-        session = result.scalars().first()
-        if session:
-            session.question = data['question']
-            await db.commit()
-        
-    await sio.emit('custom_question', data, room=room_id)
+
+    async def apply(room):
+        await recorder.record_question(room_id, room.state, data['question'])
+        room.state.question = data['question']
+        write_buffer.stage(room_id, question=data['question'])
+        await sio.emit('custom_question', data, room=room_id)
+
+    await rooms.submit(room_id, apply)
+
+async def publish_execution_result(room_id, data):
+    # Client-side runs can report any amount of output; keep the same tail a server-side run would
+    data = dict(data, output=tail(data.get('output')), error=tail(data.get('error')))
+
+    async def apply(room):
+        await recorder.record_execution(room_id, room.state, data.get('output'), data.get('error'))
+        room.state.output = data.get('output') or data.get('error')
+        write_buffer.stage(room_id, output=room.state.output)
+        await sio.emit('execution_result', data, room=room_id)
+
+    await rooms.submit(room_id, apply)
 
 @sio.event
 async def execution_result(sid, data):
     # data = {roomId: "...", output: "...", error: "..."}
-    room_id = data['roomId']
-    
-    async with SessionLocal() as db:
-        result = await db.execute(select(models.Session).where(models.Session.id == room_id))
-        session = result.scalars().first()
-        if session:
-            session.output = data.get('output') or data.get('error')
-            await db.commit()
-        
-    await sio.emit('execution_result', data, room=data['roomId'])
+    await publish_execution_result(data['roomId'], data)
+
+@sio.event
+async def execute_code(sid, data):
+    # data = {roomId: "...", code: "...", language: "...", stdin: "..."}; the ack carries the result
+    if sid_map.get(sid, (None,))[0] != data['roomId']:
+        return {'error': "Join the session's room first"}
+    try:
+        return await run_code(data['roomId'], data['language'], data['code'], data.get('stdin') or "",
+                              data.get('cache', True))
+    except (ExecutionError, ExecutionQueueFull, ExecutionUnavailable) as e:
+        return {'error': str(e)}
+
+# Time every handler registered above
+metrics.instrument_socketio(sio)
 
 # Wrap FastAPI app with Socket.IO
 app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app)
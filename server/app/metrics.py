@@ -0,0 +1,314 @@
+"""Minimal Prometheus text-format metrics, kept in-process.
+
+Observations only touch a couple of dict entries; all formatting happens when
+/metrics is scraped. With several workers every process reports its own
+numbers, so scrape each worker (or sum them) rather than the load balancer.
+"""
+import asyncio
+import bisect
+import functools
+import inspect
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .profiler import profiler, socket_context
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# How often the event loop lag probe wakes up (seconds); 0 disables it
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statement verbs we label DB queries with; anything else is OTHER to keep cardinality bounded
+_SQL_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA",
+              "CREATE", "ALTER", "DROP", "WITH"}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def clear(self):
+        self._values.clear()
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}"
+                for key, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def clear(self):
+        self._series.clear()
+
+    def collect(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class _Callback:
+    """A gauge or counter whose value is read from the app when scraped."""
+
+    def __init__(self, name: str, help: str, fn: Callable, type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.type = type
+
+    async def collect_async(self) -> List[str]:
+        value = self.fn()
+        if inspect.isawaitable(value):
+            value = await value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, fn, type="gauge"):
+        return self.register(_Callback(name, help, fn, type))
+
+    def clear(self):
+        for metric in self._metrics.values():
+            if hasattr(metric, "clear"):
+                metric.clear()
+
+    async def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            try:
+                if isinstance(metric, _Callback):
+                    samples = await metric.collect_async()
+                else:
+                    samples = metric.collect()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SIO_EVENT_SECONDS = REGISTRY.histogram(
+    "socketio_event_duration_seconds", "Socket.IO event handler latency", ["event"])
+SIO_EVENT_ERRORS = REGISTRY.counter(
+    "socketio_event_errors_total", "Socket.IO event handlers that raised", ["event"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "REST request latency by route template", ["method", "route", "status"])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database statement latency by statement type", ["operation"])
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Database statements that raised", ["operation"])
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_LAST = REGISTRY.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+# --- Socket.IO ---
+
+def _timed_handler(event: str, handler: Callable) -> Callable:
+    params = inspect.signature(handler).parameters.values()
+    takes_varargs = any(p.kind == p.VAR_POSITIONAL for p in params)
+    nargs = None if takes_varargs else len(params)
+
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        # python-socketio retries connect/disconnect with fewer args on TypeError;
+        # trim up front so that retry never counts as a failed handler
+        if nargs is not None:
+            args = args[:nargs]
+        start = time.perf_counter()
+        watch = profiler.begin("socketio", event, *socket_context(event, args)) if profiler.enabled else None
+        try:
+            result = handler(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception:
+            SIO_EVENT_ERRORS.inc(event)
+            raise
+        finally:
+            SIO_EVENT_SECONDS.observe(time.perf_counter() - start, event)
+            if watch is not None:
+                profiler.end(watch)
+
+    return wrapper
+
+
+def instrument_socketio(sio, namespace: str = "/"):
+    """Wrap every handler registered on `namespace` so it is timed. Call once all handlers exist."""
+    handlers = sio.handlers.get(namespace, {})
+    for event, handler in list(handlers.items()):
+        if not getattr(handler, "_metrics_timed", False):
+            wrapped = _timed_handler(event, handler)
+            wrapped._metrics_timed = True
+            handlers[event] = wrapped
+
+
+# --- REST ---
+
+async def http_middleware(request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # FastAPI stores the matched route in the scope; use its template so ids don't explode cardinality
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, route, str(status))
+
+
+# --- Database ---
+
+def _operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else ""
+    return verb if verb in _SQL_VERBS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if starts:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - starts.pop(), _operation(statement))
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    DB_QUERY_ERRORS.inc(_operation(context.statement or ""))
+
+
+def instrument_engine(engine):
+    """Time every statement executed through an (async) SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# --- Event loop ---
+
+class LoopLagMonitor:
+    """Sleeps for `interval` in a loop and records how much later than asked it woke up."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
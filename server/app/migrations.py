@@ -0,0 +1,107 @@
+import os
+
+from sqlalchemy import inspect, text, update
+from sqlalchemy.future import select
+
+from .database import Base
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from . import search, stats
+
+# Email of the interviewer that sessions from before ownership are assigned to; defaults to the
+# interviewer account with the lowest id
+BACKFILL_INTERVIEWER_EMAIL = os.getenv("BACKFILL_INTERVIEWER_EMAIL", "")
+
+
+def _upgrade_schema(sync_conn):
+    """Bring tables created by older versions up to date with the models.
+
+    `create_all` only creates missing tables, so columns and indexes added to an
+    existing table later on are applied here. Only additive changes are handled.
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+            default = column.server_default
+            if default is not None:
+                ddl += f" DEFAULT {default.arg.text if hasattr(default.arg, 'text') else default.arg}"
+            for fk in column.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+                if fk.ondelete:
+                    ddl += f" ON DELETE {fk.ondelete}"
+            sync_conn.execute(text(ddl))
+
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _drop_outdated_stats(sync_conn):
+    # Aggregates are derived data: a table from before per-interviewer stats is rebuilt rather than altered
+    inspector = inspect(sync_conn)
+    if not inspector.has_table("session_stats"):
+        return
+    if "interviewer_id" not in {c["name"] for c in inspector.get_columns("session_stats")}:
+        models.SessionStat.__table__.drop(sync_conn)
+
+
+def _add_interviewer_foreign_key(sync_conn):
+    """Constrain a sessions.interviewer_id added before it referenced users.
+
+    PostgreSQL only: SQLite can't add a constraint to an existing column (and
+    doesn't enforce them unless asked to).
+    """
+    if sync_conn.dialect.name != "postgresql":
+        return
+    if any(fk["constrained_columns"] == ["interviewer_id"] for fk in inspect(sync_conn).get_foreign_keys("sessions")):
+        return
+    # Owners that no longer exist would fail the constraint; the backfill reassigns their sessions
+    sync_conn.execute(text(
+        "UPDATE sessions SET interviewer_id = NULL "
+        "WHERE interviewer_id IS NOT NULL AND interviewer_id NOT IN (SELECT id FROM users)"
+    ))
+    sync_conn.execute(text(
+        "ALTER TABLE sessions ADD CONSTRAINT sessions_interviewer_id_fkey "
+        "FOREIGN KEY (interviewer_id) REFERENCES users (id) ON DELETE SET NULL"
+    ))
+
+
+async def _backfill_interviewers(conn) -> int:
+    """Give sessions without an interviewer to BACKFILL_INTERVIEWER_EMAIL (or the first interviewer)."""
+    sessions, users = models.Session.__table__, models.User.__table__
+    unowned = sessions.c.interviewer_id.is_(None)
+    if (await conn.execute(select(sessions.c.id).where(unowned).limit(1))).first() is None:
+        return 0
+    query = select(users.c.id).where(users.c.role == "interviewer")
+    if BACKFILL_INTERVIEWER_EMAIL:
+        query = query.where(users.c.email == BACKFILL_INTERVIEWER_EMAIL)
+    owner = (await conn.execute(query.order_by(users.c.id).limit(1))).scalar()
+    if owner is None:
+        print("Sessions without an interviewer left unassigned: no interviewer account to assign them to")
+        return 0
+    result = await conn.execute(update(sessions).where(unowned).values(interviewer_id=owner))
+    print(f"Assigned {result.rowcount} sessions without an interviewer to {owner}")
+    return result.rowcount
+
+
+async def upgrade(conn):
+    await conn.run_sync(_drop_outdated_stats)
+    existing_tables = await conn.run_sync(lambda sync_conn: set(inspect(sync_conn).get_table_names()))
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.run_sync(_upgrade_schema)
+    await conn.run_sync(_add_interviewer_foreign_key)
+    # Sessions tables from before full-text search get the index, built from their rows
+    await conn.run_sync(search.install)
+    backfilled = await _backfill_interviewers(conn)
+    # Aggregates added to a database that already has sessions (or whose sessions changed hands)
+    # start from a full count
+    if "sessions" in existing_tables and ("session_stats" not in existing_tables or backfilled):
+        await stats.rebuild(conn)
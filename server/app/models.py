@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, JSON
+from sqlalchemy import Column, String, Integer, BigInteger, Text, JSON, Index, ForeignKey
 from .database import Base
 
 class User(Base):
@@ -14,9 +14,11 @@ class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(String, primary_key=True, index=True)
+    # The users.id of the interviewer who created it; only they can list, change or delete it
+    interviewer_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     candidate_name = Column(String)
     candidate_email = Column(String)
-    date = Column(String)
+    date = Column(String, index=True)
     duration = Column(Integer, default=0)
     score = Column(Integer, nullable=True)
     status = Column(String)
@@ -28,3 +30,77 @@ class Session(Base):
     question = Column(JSON, nullable=True)
     server_time = Column(String, nullable=True)
     whiteboard = Column(JSON, nullable=True)
+    # Bumped on every write; the *_revision columns hold the revision each group of columns last changed in
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    code_revision = Column(Integer, nullable=False, default=0, server_default="0")
+    output_revision = Column(Integer, nullable=False, default=0, server_default="0")
+    question_revision = Column(Integer, nullable=False, default=0, server_default="0")
+    whiteboard_revision = Column(Integer, nullable=False, default=0, server_default="0")
+    details_revision = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Dashboard listings are per interviewer, filter by status/language and page by (date, id)
+    __table_args__ = (
+        Index("ix_sessions_interviewer_date", "interviewer_id", "date", "id"),
+        Index("ix_sessions_status_date", "status", "date"),
+        Index("ix_sessions_language_date", "language", "date"),
+    )
+
+class SessionStat(Base):
+    # Running totals over one interviewer's sessions in one group (dimension "all", "status", "language"
+    # or "day" and its key), kept current by app.stats on every write that changes what they count
+    __tablename__ = "session_stats"
+
+    interviewer_id = Column(String, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    scored = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    # Sessions with a duration, and a histogram of them by minutes
+    timed = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Integer, nullable=False, default=0)
+    duration_le_15 = Column(Integer, nullable=False, default=0)
+    duration_le_30 = Column(Integer, nullable=False, default=0)
+    duration_le_45 = Column(Integer, nullable=False, default=0)
+    duration_le_60 = Column(Integer, nullable=False, default=0)
+    duration_le_90 = Column(Integer, nullable=False, default=0)
+    duration_over_90 = Column(Integer, nullable=False, default=0)
+
+class WhiteboardRecord(Base):
+    # One row per tldraw record so an update only touches the records it changed.
+    # Session.whiteboard is the legacy whole-board blob, migrated lazily into this table.
+    __tablename__ = "whiteboard_records"
+
+    session_id = Column(String, primary_key=True)
+    record_id = Column(String, primary_key=True)
+    data = Column(JSON)
+
+class SessionEvent(Base):
+    # Append-only replay log; seq orders a session's events, ts is server time in epoch ms
+    __tablename__ = "session_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)
+    ts = Column(BigInteger, nullable=False)
+    type = Column(String, nullable=False)
+    data = Column(JSON)
+
+    __table_args__ = (
+        Index("ix_session_events_session_seq", "session_id", "seq"),
+        Index("ix_session_events_session_ts", "session_id", "ts"),
+    )
+
+class SessionKeyframe(Base):
+    # Full replay state after applying a session's events up to and including seq
+    __tablename__ = "session_keyframes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)
+    ts = Column(BigInteger, nullable=False)
+    state = Column(JSON)
+
+    __table_args__ = (
+        Index("ix_session_keyframes_session_ts", "session_id", "ts"),
+    )
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+# redis://host:6379/0 to share room presence between workers; in-process when unset
+PRESENCE_URL = os.getenv("PRESENCE_URL")
+# Message queue used to fan Socket.IO emits out to every worker (redis:// or amqp://)
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+# Shared presence entries expire if no one joins the room for this long (seconds)
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", "86400"))
+
+
+class PresenceStore:
+    """Who is in which room. Each entry remembers the sid the user joined with.
+
+    `leave` with a sid only removes the user if that sid is still their current
+    one, so a refresh that reconnects (possibly to another worker) before the
+    old socket's disconnect arrives does not drop the user.
+    """
+
+    async def join(self, room_id: str, user: dict) -> List[dict]:
+        raise NotImplementedError
+
+    async def leave(self, room_id: str, user_id: str, sid: Optional[str] = None) -> Optional[List[dict]]:
+        """Remove a user; returns the remaining users, or None if nothing was removed."""
+        raise NotImplementedError
+
+    async def users(self, room_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    async def room_count(self) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryPresenceStore(PresenceStore):
+    def __init__(self):
+        # room_id -> {user_id: user_data}
+        self.rooms: Dict[str, Dict[str, dict]] = {}
+
+    async def join(self, room_id, user):
+        self.rooms.setdefault(room_id, {})[user['id']] = user
+        return list(self.rooms[room_id].values())
+
+    async def leave(self, room_id, user_id, sid=None):
+        users = self.rooms.get(room_id)
+        if not users or user_id not in users:
+            return None
+        if sid is not None and users[user_id].get('sid') != sid:
+            return None
+        del users[user_id]
+        if not users:
+            del self.rooms[room_id]
+        return list(users.values())
+
+    async def users(self, room_id):
+        return list(self.rooms.get(room_id, {}).values())
+
+    async def room_count(self):
+        return len(self.rooms)
+
+
+class RedisPresenceStore(PresenceStore):
+    """Presence kept in one Redis hash per room, shared by every worker."""
+
+    def __init__(self, redis, prefix: str = "presence:", ttl: int = PRESENCE_TTL):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis.asyncio as aioredis
+        return cls(aioredis.from_url(url), **kwargs)
+
+    def _key(self, room_id):
+        return f"{self.prefix}{room_id}"
+
+    async def join(self, room_id, user):
+        key = self._key(room_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, user['id'], json.dumps(user))
+            pipe.expire(key, self.ttl)
+            pipe.hvals(key)
+            *_, values = await pipe.execute()
+        return [json.loads(v) for v in values]
+
+    async def leave(self, room_id, user_id, sid=None):
+        from redis.exceptions import WatchError
+
+        key = self._key(room_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Compare-and-delete: another worker may have re-registered the user meanwhile
+                    await pipe.watch(key)
+                    raw = await pipe.hget(key, user_id)
+                    if raw is None or (sid is not None and json.loads(raw).get('sid') != sid):
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.hdel(key, user_id)
+                    pipe.hvals(key)
+                    _, values = await pipe.execute()
+                    return [json.loads(v) for v in values]
+                except WatchError:
+                    continue
+
+    async def users(self, room_id):
+        return [json.loads(v) for v in await self.redis.hvals(self._key(room_id))]
+
+    async def room_count(self):
+        count = 0
+        async for _ in self.redis.scan_iter(match=f"{self.prefix}*"):
+            count += 1
+        return count
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class InProcessPubSubManager(AsyncPubSubManager):
+    """Pub/sub manager whose "queue" is a dict of asyncio queues in this process.
+
+    Lets several AsyncServer instances in one process behave like separate
+    workers behind a message queue; used for tests and local experiments.
+    """
+    name = 'inprocess'
+    _channels: Dict[str, List[asyncio.Queue]] = {}
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._channels.setdefault(channel, []).append(self.queue)
+
+    async def _publish(self, data):
+        for queue in self._channels.get(self.channel, []):
+            queue.put_nowait(data)
+
+    async def _listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+def create_presence_store(url: Optional[str] = PRESENCE_URL) -> PresenceStore:
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisPresenceStore.from_url(url)
+    return MemoryPresenceStore()
+
+
+def create_client_manager(url: Optional[str] = SOCKETIO_MESSAGE_QUEUE):
+    """Socket.IO client manager for the configured message queue, or None for the in-process default."""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://")):
+        return socketio.AsyncRedisManager(url)
+    if url.startswith(("amqp://", "amqps://")):
+        return socketio.AsyncAioPikaManager(url)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
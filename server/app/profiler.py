@@ -0,0 +1,281 @@
+"""Slow handler and event loop stall profiler.
+
+Off unless PROFILER_ENABLED=1 or switched on at runtime (PUT /debug/profiler);
+while off, the Socket.IO, REST and room actor wrappers only check
+`profiler.enabled`. While on:
+
+- a Socket.IO event, REST request or room actor step that takes longer than
+  the threshold is recorded with its name, room id, payload size and a stack
+  sample: the await chain it was suspended in when it crossed the threshold,
+  or the loop thread's stack if it was blocking the loop;
+- a watchdog thread pings the loop and, when a ping goes unanswered for longer
+  than the threshold, samples the loop thread's stack while the blocking code
+  is still running.
+
+The most recent PROFILER_RING_SIZE records are kept for GET /debug/profiler.
+Each worker profiles (and is toggled) on its own.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+# Start with the profiler on
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+# Handlers and loop stalls longer than this are recorded (milliseconds)
+SLOW_HANDLER_MS = float(os.getenv("SLOW_HANDLER_MS", "100"))
+# Records kept in the ring buffer
+PROFILER_RING_SIZE = int(os.getenv("PROFILER_RING_SIZE", "200"))
+# Innermost frames kept per stack sample
+PROFILER_STACK_DEPTH = int(os.getenv("PROFILER_STACK_DEPTH", "25"))
+# Required as X-Debug-Token by the /debug endpoints, which answer 404 while it is empty
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+
+def _frame_line(filename: str, lineno, name: str) -> str:
+    return f"{filename}:{lineno} in {name}"
+
+
+def thread_stack(thread_id: int, depth: int) -> List[str]:
+    """What `thread_id` is executing right now, outermost call first."""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    return [_frame_line(f.filename, f.lineno, f.name) for f in traceback.extract_stack(frame, limit=depth)]
+
+
+def await_stack(coro, depth: int) -> List[str]:
+    """The chain of awaits a suspended coroutine is waiting in, outermost first."""
+    lines = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        lines.append(_frame_line(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return lines[-depth:]
+
+
+def payload_size(payload) -> Optional[int]:
+    if payload is None:
+        return None
+    if isinstance(payload, int):
+        return payload
+    if isinstance(payload, (bytes, str)):
+        return len(payload)
+    try:
+        return len(json.dumps(payload, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return None
+
+
+def socket_context(event: str, args: tuple):
+    """(room id, payload) of a Socket.IO handler call."""
+    if event in ("connect", "disconnect") or len(args) < 2:
+        return None, None
+    data = args[1]
+    return (data.get("roomId") if isinstance(data, dict) else None), data
+
+
+class _Watch:
+    __slots__ = ("kind", "name", "room_id", "payload", "task", "start", "timer", "parent", "stack",
+                 "stack_source", "blocked", "entry")
+
+    def __init__(self, kind, name, room_id, payload, task, parent):
+        self.kind = kind
+        self.name = name
+        self.room_id = room_id
+        self.payload = payload
+        self.task = task
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.timer = None
+        self.stack = None
+        self.stack_source = None
+        self.blocked = 0.0
+        # The record, once there is one; a stall still in progress fills in its blockedMs later
+        self.entry = None
+
+
+class _Watchdog(threading.Thread):
+    """Pings the loop from another thread; an unanswered ping means the loop is blocked."""
+
+    def __init__(self, profiler: "Profiler", loop: asyncio.AbstractEventLoop):
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.profiler = profiler
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._sent: Optional[float] = None
+        self._stall = None
+
+    def run(self):
+        while not self.stopped.wait(max(0.005, self.profiler.threshold / 4)):
+            with self._lock:
+                if self._sent is None:
+                    self._sent = time.perf_counter()
+                    try:
+                        self.loop.call_soon_threadsafe(self._pong)
+                    except RuntimeError:
+                        return  # loop closed
+                elif self._stall is None and time.perf_counter() - self._sent >= self.profiler.threshold:
+                    self._stall = self.profiler._stalled(self.loop, self.loop_thread)
+
+    def _pong(self):
+        # On the loop, once it got round to the ping
+        with self._lock:
+            stall, sent = self._stall, self._sent
+            self._stall = self._sent = None
+        if stall is not None:
+            self.profiler._stall_ended(stall, time.perf_counter() - sent)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class Profiler:
+    def __init__(self, threshold_ms: float = SLOW_HANDLER_MS, size: int = PROFILER_RING_SIZE,
+                 stack_depth: int = PROFILER_STACK_DEPTH):
+        self.enabled = False
+        self.threshold = threshold_ms / 1000
+        self.stack_depth = stack_depth
+        self.entries: deque = deque(maxlen=size)
+        self.slow = 0
+        self.stalls = 0
+        # Innermost watched handler per task, for attributing loop stalls
+        self._inflight: Dict[asyncio.Task, _Watch] = {}
+        self._watchdog: Optional[_Watchdog] = None
+
+    def enable(self, threshold_ms: Optional[float] = None):
+        """Start profiling; call from the event loop being profiled."""
+        if threshold_ms is not None:
+            self.threshold = threshold_ms / 1000
+        self.enabled = True
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = _Watchdog(self, asyncio.get_running_loop())
+            self._watchdog.start()
+
+    def disable(self):
+        self.enabled = False
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        for watch in self._inflight.values():
+            if watch.timer is not None:
+                watch.timer.cancel()
+        self._inflight.clear()
+
+    def clear(self):
+        self.entries.clear()
+        self.slow = 0
+        self.stalls = 0
+
+    def begin(self, kind: str, name: str, room_id: Optional[str] = None, payload=None) -> _Watch:
+        task = asyncio.current_task()
+        watch = _Watch(kind, name, room_id, payload, task, self._inflight.get(task))
+        if task is not None:
+            self._inflight[task] = watch
+            watch.timer = task.get_loop().call_later(self.threshold, self._sample, watch)
+        return watch
+
+    def end(self, watch: _Watch, name: Optional[str] = None, room_id: Optional[str] = None):
+        elapsed = time.perf_counter() - watch.start
+        if watch.timer is not None:
+            watch.timer.cancel()
+        if watch.task is not None and self._inflight.get(watch.task) is watch:
+            if watch.parent is not None:
+                self._inflight[watch.task] = watch.parent
+            else:
+                del self._inflight[watch.task]
+        if not self.enabled or elapsed < self.threshold:
+            return
+        self.slow += 1
+        watch.entry = {
+            "kind": watch.kind,
+            "name": name or watch.name,
+            "roomId": room_id or watch.room_id,
+            "payloadBytes": payload_size(watch.payload),
+            "durationMs": round(elapsed * 1000, 1),
+            "blockedMs": round(watch.blocked * 1000, 1) if watch.blocked else None,
+            "at": int(time.time() * 1000),
+            "stackSource": watch.stack_source,
+            "stack": watch.stack or [],
+        }
+        self.entries.append(watch.entry)
+
+    def _sample(self, watch: _Watch):
+        # Still running at the threshold: note where it's waiting, unless the watchdog caught it blocking
+        if watch.stack is None and watch.task is not None and not watch.task.done():
+            watch.stack = await_stack(watch.task.get_coro(), self.stack_depth)
+            watch.stack_source = "await"
+
+    def _stalled(self, loop, thread_id: int):
+        # Watchdog thread: the loop is stuck right now, so its stack shows the culprit
+        stack = thread_stack(thread_id, self.stack_depth)
+        task = asyncio.current_task(loop)
+        watch = self._inflight.get(task) if task is not None else None
+        if watch is not None:
+            watch.stack = stack
+            watch.stack_source = "blocked"
+        return watch, task.get_name() if task is not None else None, stack, int(time.time() * 1000)
+
+    def _stall_ended(self, stall, duration: float):
+        watch, task_name, stack, at = stall
+        self.stalls += 1
+        if watch is not None:
+            watch.blocked = max(watch.blocked, duration)
+            if watch.entry is not None:
+                watch.entry["blockedMs"] = round(watch.blocked * 1000, 1)
+        self.entries.append({
+            "kind": "loop_stall",
+            "name": watch.name if watch is not None else task_name,
+            "roomId": watch.room_id if watch is not None else None,
+            "payloadBytes": None,
+            "durationMs": round(duration * 1000, 1),
+            "blockedMs": round(duration * 1000, 1),
+            "at": at,
+            "stackSource": "blocked",
+            "stack": stack,
+        })
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "thresholdMs": self.threshold * 1000,
+            "slow": self.slow,
+            "stalls": self.stalls,
+            # Newest first
+            "entries": list(reversed(self.entries)),
+        }
+
+
+class ProfilerMiddleware:
+    """Times REST requests for the profiler, inside the task that runs the route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope.get("headers") or []).get(b"content-length")
+        watch = profiler.begin("http", f"{scope['method']} {scope['path']}",
+                               payload=int(length) if length and length.isdigit() else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router fills in the matched route and its parameters
+            route = getattr(scope.get("route"), "path", None)
+            profiler.end(watch, name=f"{scope['method']} {route}" if route else None,
+                         room_id=(scope.get("path_params") or {}).get("session_id"))
+
+
+profiler = Profiler()
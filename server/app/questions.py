@@ -0,0 +1,226 @@
+"""Question bank loaded from data files into in-memory indexes.
+
+Every *.json (a list of questions) and *.jsonl (one per line) file under
+QUESTION_BANK_PATH is read; a question's language is its "language" field or
+else the file name (python.json). Loading builds a new `QuestionIndex` off to
+the side and swaps it in with one assignment, so a reload never serves a
+half-built index, and files that haven't changed since the last load are not
+read again.
+"""
+import asyncio
+import base64
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Directory (or single file) the question bank is loaded from
+QUESTION_BANK_PATH = os.getenv(
+    "QUESTION_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "questions")
+)
+# Questions per page when the client doesn't ask for a size, and the most it may ask for
+QUESTIONS_PAGE_SIZE = int(os.getenv("QUESTIONS_PAGE_SIZE", "10"))
+QUESTIONS_MAX_PAGE_SIZE = 100
+
+DIFFICULTIES = ("easy", "medium", "hard")
+# Interview level -> difficulties that suit it; a difficulty name also works as a level
+LEVELS = {
+    "junior": ("easy", "medium"),
+    "senior": ("medium", "hard"),
+}
+
+REQUIRED_FIELDS = ("id", "title", "difficulty", "category")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class QuestionBankError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def difficulties_for(level: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if not level:
+        return None
+    level = level.lower()
+    if level in LEVELS:
+        return LEVELS[level]
+    if level in DIFFICULTIES:
+        return (level,)
+    raise QuestionBankError(f"Unknown level {level!r}; expected one of {', '.join([*LEVELS, *DIFFICULTIES])}")
+
+
+def encode_cursor(position: int, question_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([position, question_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        position, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(position), str(question_id)
+    except Exception:
+        raise QuestionBankError("Invalid cursor")
+
+
+class QuestionIndex:
+    """An immutable set of questions with lookups by field and keyword.
+
+    Questions are numbered by load order; every index maps a key to the set of
+    positions holding it, so filters combine by set intersection and results
+    come out in load order.
+    """
+
+    def __init__(self, questions: Iterable[dict]):
+        self.questions: List[dict] = []
+        self.positions: Dict[str, int] = {}
+        by_language: Dict[str, set] = {}
+        by_difficulty: Dict[str, set] = {}
+        by_category: Dict[str, set] = {}
+        by_token: Dict[str, set] = {}
+        for question in questions:
+            if question["id"] in self.positions:
+                print(f"Skipping duplicate question id {question['id']}")
+                continue
+            position = len(self.questions)
+            self.questions.append(question)
+            self.positions[question["id"]] = position
+            by_language.setdefault(question["language"], set()).add(position)
+            by_difficulty.setdefault(question["difficulty"], set()).add(position)
+            by_category.setdefault(question["category"].lower(), set()).add(position)
+            for token in set(tokenize(question["title"]) + tokenize(question.get("description", ""))):
+                by_token.setdefault(token, set()).add(position)
+
+        self.by_language: Dict[str, FrozenSet[int]] = {k: frozenset(v) for k, v in by_language.items()}
+        self.by_difficulty: Dict[str, FrozenSet[int]] = {k: frozenset(v) for k, v in by_difficulty.items()}
+        self.by_category: Dict[str, FrozenSet[int]] = {k: frozenset(v) for k, v in by_category.items()}
+        self.by_token: Dict[str, FrozenSet[int]] = {k: frozenset(v) for k, v in by_token.items()}
+        # Sorted vocabulary, for prefix matching the last search word while it's being typed
+        self.vocabulary: List[str] = sorted(self.by_token)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def _prefixed(self, prefix: str) -> set:
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_right(self.vocabulary, prefix + "\uffff")
+        matches = set()
+        for token in self.vocabulary[start:end]:
+            matches |= self.by_token[token]
+        return matches
+
+    def search(self, language: Optional[str] = None, difficulties: Optional[Iterable[str]] = None,
+               category: Optional[str] = None, text: Optional[str] = None) -> List[int]:
+        """Positions of the questions matching every given filter, in load order.
+
+        `text` matches questions whose title or description contains all of its
+        words; the last word also matches as a prefix.
+        """
+        sets = []
+        if language:
+            sets.append(self.by_language.get(language.lower(), frozenset()))
+        if difficulties:
+            sets.append(frozenset().union(*(self.by_difficulty.get(d, frozenset()) for d in difficulties)))
+        if category:
+            sets.append(self.by_category.get(category.lower(), frozenset()))
+        words = tokenize(text) if text else []
+        for word in words[:-1]:
+            sets.append(self.by_token.get(word, frozenset()))
+        if words:
+            sets.append(self._prefixed(words[-1]))
+        if not sets:
+            return list(range(len(self.questions)))
+        # Smallest first keeps the intersection cheap
+        sets.sort(key=len)
+        matches = set(sets[0])
+        for other in sets[1:]:
+            matches &= other
+            if not matches:
+                break
+        return sorted(matches)
+
+
+def _read_file(path: str, language: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    if not isinstance(items, list):
+        raise QuestionBankError(f"{path}: expected a list of questions")
+    questions = []
+    for item in items:
+        missing = [field for field in REQUIRED_FIELDS if not item.get(field)] if isinstance(item, dict) else ["all"]
+        if missing:
+            print(f"Skipping question in {path} without {', '.join(missing)}")
+            continue
+        question = dict(item)
+        question["id"] = str(question["id"])
+        question["language"] = str(question.get("language") or language).lower()
+        question["difficulty"] = str(question["difficulty"]).lower()
+        if question["difficulty"] not in DIFFICULTIES:
+            print(f"Skipping question {question['id']} in {path}: unknown difficulty {question['difficulty']!r}")
+            continue
+        questions.append(question)
+    return questions
+
+
+class QuestionStore:
+    def __init__(self, path: str = QUESTION_BANK_PATH):
+        self.path = path
+        self.index = QuestionIndex([])
+        # (file, mtime, size) of what the current index was built from
+        self._signature: Optional[tuple] = None
+
+    def _files(self) -> List[str]:
+        if os.path.isfile(self.path):
+            return [self.path]
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.endswith((".json", ".jsonl"))
+        )
+
+    def load(self, force: bool = False) -> bool:
+        """Rebuild the index from the files if they changed; returns whether it did."""
+        files = self._files()
+        signature = tuple((path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in files)
+        if signature == self._signature and not force:
+            return False
+        questions = []
+        for path in files:
+            language = os.path.splitext(os.path.basename(path))[0]
+            try:
+                questions.extend(_read_file(path, language))
+            except (OSError, ValueError) as e:
+                print(f"Error loading questions from {path}: {e}")
+        self.index = QuestionIndex(questions)
+        self._signature = signature
+        return True
+
+    async def reload(self, force: bool = False) -> bool:
+        # Parsing thousands of questions shouldn't stall the event loop
+        return await asyncio.to_thread(self.load, force)
+
+    def query(self, language: Optional[str] = None, level: Optional[str] = None, category: Optional[str] = None,
+              text: Optional[str] = None, cursor: Optional[str] = None,
+              limit: int = QUESTIONS_PAGE_SIZE) -> Tuple[List[dict], Optional[str], int]:
+        """One page of matching questions, the cursor for the next page (or None) and the total match count."""
+        index = self.index  # one snapshot for the whole query, even if a reload swaps it meanwhile
+        matches = index.search(language, difficulties_for(level), category, text)
+        start = 0
+        if cursor:
+            position, question_id = decode_cursor(cursor)
+            # Resume after the last question seen; its position may have moved if the bank was reloaded
+            position = index.positions.get(question_id, position)
+            start = bisect_right(matches, position)
+        page = matches[start:start + limit]
+        next_cursor = None
+        if start + limit < len(matches):
+            last = page[-1]
+            next_cursor = encode_cursor(last, index.questions[last]["id"])
+        return [index.questions[p] for p in page], next_cursor, len(matches)
@@ -0,0 +1,337 @@
+"""Session recording for replay.
+
+Every change a room makes is appended to `session_events` as a small diff:
+code as a text operation against the previous recorded text, whiteboard
+records as they were staged, questions and run output whole. Every
+`keyframe_events` events (or `keyframe_seconds`, whichever comes first) the
+full state is written to `session_keyframes`, so rebuilding the state at any
+moment means loading the nearest keyframe at or before it and applying at
+most that many events.
+
+Events are numbered per session (`seq`) and carry the server time in epoch
+milliseconds. Like the write-behind buffer, the recorder only appends in
+memory; a background task inserts the batch.
+"""
+import asyncio
+import copy
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+
+from . import models, text_ot, whiteboard_store
+from .write_behind import WriteBehindBuffer
+
+# Write a full-state keyframe after this many events ...
+REPLAY_KEYFRAME_EVENTS = int(os.getenv("REPLAY_KEYFRAME_EVENTS", "100"))
+# ... or once this much time has passed since the last one (seconds)
+REPLAY_KEYFRAME_SECONDS = float(os.getenv("REPLAY_KEYFRAME_SECONDS", "30"))
+# How often recorded events are inserted (seconds)
+REPLAY_FLUSH_INTERVAL = float(os.getenv("REPLAY_FLUSH_INTERVAL", "1.0"))
+# Sessions with no events for this long stop being tracked in memory (seconds)
+REPLAY_IDLE_TIMEOUT = float(os.getenv("REPLAY_IDLE_TIMEOUT", "300"))
+# Events returned per query when streaming a range
+REPLAY_PAGE_SIZE = int(os.getenv("REPLAY_PAGE_SIZE", "500"))
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def empty_state() -> dict:
+    return {"code": "", "language": None, "question": None, "output": None, "whiteboard": {}}
+
+
+def apply_event(state: dict, type: str, data: dict):
+    """Apply one recorded event to a replay state in place."""
+    if type == "code":
+        if data.get("ops"):
+            state["code"] = text_ot.apply(state["code"] or "", data["ops"])
+        if "language" in data:
+            state["language"] = data["language"]
+    elif type == "whiteboard":
+        board = state["whiteboard"]
+        for record_id, record in data.get("records", {}).items():
+            if record is None:
+                board.pop(record_id, None)
+            else:
+                board[record_id] = record
+    elif type == "question":
+        state["question"] = data.get("question")
+    elif type == "execution":
+        state["output"] = data.get("output") or data.get("error")
+
+
+class _Recording:
+    __slots__ = ("state", "next_seq", "since_keyframe", "keyframe_at", "last_event")
+
+    def __init__(self, state: dict, next_seq: int, now: float):
+        self.state = state
+        self.next_seq = next_seq
+        self.since_keyframe = 0
+        self.keyframe_at = now
+        self.last_event = now
+
+
+class ReplayRecorder:
+    """Appends room changes to the replay log and writes periodic keyframes.
+
+    The recorder keeps its own copy of each active session's state so code can
+    be stored as a diff against what was last recorded, whichever way the
+    room's text was changed. Tracking starts with a keyframe of the room's
+    current state the first time a session records something in this process.
+    """
+
+    def __init__(self, session_factory: Callable, buffer: WriteBehindBuffer, keyframe_events: int = REPLAY_KEYFRAME_EVENTS,
+                 keyframe_seconds: float = REPLAY_KEYFRAME_SECONDS, interval: float = REPLAY_FLUSH_INTERVAL,
+                 idle_timeout: float = REPLAY_IDLE_TIMEOUT):
+        self._session_factory = session_factory
+        self.buffer = buffer
+        self.keyframe_events = keyframe_events
+        self.keyframe_seconds = keyframe_seconds
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._recordings: Dict[str, _Recording] = {}
+        # SessionEvent / SessionKeyframe rows in the order they were recorded
+        self._pending: List[object] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _open(self, session_id: str, room_state) -> _Recording:
+        recording = self._recordings.get(session_id)
+        if recording is not None:
+            return recording
+
+        async with self._session_factory() as db:
+            last_seq = (await db.execute(
+                select(func.max(models.SessionEvent.seq)).where(models.SessionEvent.session_id == session_id)
+            )).scalar()
+            board = await whiteboard_store.snapshot(db, session_id)
+
+        state = {
+            "code": room_state.code or "",
+            "language": room_state.language,
+            "question": room_state.question,
+            "output": room_state.output,
+            # Records still waiting in the write-behind buffer are newer than the table
+            "whiteboard": whiteboard_store.overlay(board, self.buffer.pending_whiteboard(session_id)) or {},
+        }
+        recording = self._recordings[session_id] = _Recording(state, (last_seq or 0) + 1, time.monotonic())
+        self._keyframe(session_id, recording, now_ms())
+        return recording
+
+    def _keyframe(self, session_id: str, recording: _Recording, ts: int):
+        self._pending.append(models.SessionKeyframe(
+            session_id=session_id,
+            seq=recording.next_seq - 1,
+            ts=ts,
+            state=copy.deepcopy(recording.state),
+        ))
+        recording.since_keyframe = 0
+        recording.keyframe_at = time.monotonic()
+
+    def _append(self, session_id: str, recording: _Recording, type: str, data: dict):
+        apply_event(recording.state, type, data)
+        ts = now_ms()
+        self._pending.append(models.SessionEvent(
+            session_id=session_id, seq=recording.next_seq, ts=ts, type=type, data=data
+        ))
+        recording.next_seq += 1
+        recording.since_keyframe += 1
+        now = recording.last_event = time.monotonic()
+        if recording.since_keyframe >= self.keyframe_events or now - recording.keyframe_at >= self.keyframe_seconds:
+            # Stamped with its last event's time so seeking to that event lands on the keyframe
+            self._keyframe(session_id, recording, ts)
+
+    async def begin(self, session_id: str, room_state):
+        """Start recording a room from its current state, if this process isn't already.
+
+        Called when a room actor loads its state, so the baseline is taken
+        before the event that woke the room up is applied.
+        """
+        if room_state.exists:
+            await self._open(session_id, room_state)
+
+    async def record_code(self, session_id: str, room_state):
+        """Record the room's current text as an operation against the previously recorded text."""
+        if not room_state.exists:
+            return
+        recording = await self._open(session_id, room_state)
+        data = {}
+        ops = text_ot.diff(recording.state["code"], room_state.code or "")
+        if any(not isinstance(op, int) or op < 0 for op in ops):
+            data["ops"] = ops
+        if room_state.language != recording.state["language"]:
+            data["language"] = room_state.language
+        if data:
+            self._append(session_id, recording, "code", data)
+
+    async def record_whiteboard(self, session_id: str, room_state, records: Dict[str, Optional[dict]]):
+        if room_state.exists and records:
+            recording = await self._open(session_id, room_state)
+            self._append(session_id, recording, "whiteboard", {"records": records})
+
+    async def record_question(self, session_id: str, room_state, question: Optional[dict]):
+        if room_state.exists:
+            recording = await self._open(session_id, room_state)
+            self._append(session_id, recording, "question", {"question": question})
+
+    async def record_execution(self, session_id: str, room_state, output: Optional[str], error: Optional[str]):
+        if room_state.exists:
+            recording = await self._open(session_id, room_state)
+            self._append(session_id, recording, "execution", {"output": output, "error": error})
+
+    def discard(self, session_id: str):
+        """Forget a session (it was deleted); its unwritten events are dropped."""
+        self._recordings.pop(session_id, None)
+        self._pending = [row for row in self._pending if row.session_id != session_id]
+
+    def clear(self):
+        self._recordings.clear()
+        self._pending.clear()
+
+    async def flush(self):
+        # Serialized so batches are inserted in the order they were recorded
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    async with self._session_factory() as db:
+                        db.add_all(batch)
+                        await db.commit()
+                except Exception as e:
+                    print(f"Error writing replay events: {e}")
+                    self._pending = batch + self._pending
+                    return
+
+            # Only sessions with nothing left to write can be dropped; reopening reads their last seq
+            now = time.monotonic()
+            waiting = {row.session_id for row in self._pending}
+            for session_id, recording in list(self._recordings.items()):
+                if now - recording.last_event >= self.idle_timeout and session_id not in waiting:
+                    del self._recordings[session_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# --- Reading ---
+
+def _event_dict(row) -> dict:
+    return {"seq": row.seq, "ts": row.ts, "type": row.type, "data": row.data}
+
+
+async def timeline(db, session_id: str) -> dict:
+    """Recorded range of a session and where its keyframes are."""
+    first, last, count = (await db.execute(
+        select(func.min(models.SessionEvent.ts), func.max(models.SessionEvent.ts), func.count())
+        .where(models.SessionEvent.session_id == session_id)
+    )).one()
+    keyframes = (await db.execute(
+        select(models.SessionKeyframe.seq, models.SessionKeyframe.ts)
+        .where(models.SessionKeyframe.session_id == session_id)
+        .order_by(models.SessionKeyframe.ts, models.SessionKeyframe.seq)
+    )).all()
+    if keyframes:
+        first = min(first, keyframes[0].ts) if first is not None else keyframes[0].ts
+        last = max(last, keyframes[-1].ts) if last is not None else keyframes[-1].ts
+    return {
+        "start": first,
+        "end": last,
+        "events": count,
+        "keyframes": [{"seq": k.seq, "ts": k.ts} for k in keyframes],
+    }
+
+
+async def state_at(db, session_id: str, at: int) -> Optional[dict]:
+    """State of the session at server time `at` (epoch ms), or None if nothing was recorded.
+
+    Starts from the latest keyframe at or before `at` and applies the events
+    after it, so the cost is bounded by the keyframe spacing rather than the
+    length of the session.
+    """
+    keyframe = (await db.execute(
+        select(models.SessionKeyframe)
+        .where(models.SessionKeyframe.session_id == session_id, models.SessionKeyframe.ts <= at)
+        .order_by(models.SessionKeyframe.ts.desc(), models.SessionKeyframe.seq.desc())
+        .limit(1)
+    )).scalars().first()
+    if keyframe is None:
+        # Before recording started: the earliest state there is
+        keyframe = (await db.execute(
+            select(models.SessionKeyframe)
+            .where(models.SessionKeyframe.session_id == session_id)
+            .order_by(models.SessionKeyframe.ts, models.SessionKeyframe.seq)
+            .limit(1)
+        )).scalars().first()
+        if keyframe is None:
+            return None
+
+    state = copy.deepcopy(keyframe.state) if keyframe.state else empty_state()
+    seq, ts = keyframe.seq, keyframe.ts
+    # Only this keyframe's segment: a later segment's clock may be behind `at`
+    next_seq = (await db.execute(
+        select(func.min(models.SessionKeyframe.seq))
+        .where(models.SessionKeyframe.session_id == session_id, models.SessionKeyframe.seq > keyframe.seq)
+    )).scalar()
+    query = (
+        select(models.SessionEvent)
+        .where(models.SessionEvent.session_id == session_id, models.SessionEvent.seq > keyframe.seq)
+        .order_by(models.SessionEvent.seq)
+    )
+    if next_seq is not None:
+        query = query.where(models.SessionEvent.seq <= next_seq)
+    applied = 0
+    for event in (await db.execute(query)).scalars():
+        # Events apply in seq order, so stop at the first one after `at` rather than skip it
+        if event.ts > at:
+            break
+        apply_event(state, event.type, event.data or {})
+        seq, ts = event.seq, event.ts
+        applied += 1
+    return {"at": at, "seq": seq, "ts": ts, "keyframe": keyframe.seq, "applied": applied, "state": state}
+
+
+async def iter_events(session_factory: Callable, session_id: str, start: Optional[int] = None,
+                      end: Optional[int] = None, page_size: int = REPLAY_PAGE_SIZE) -> AsyncIterator[dict]:
+    """Yield the events with start <= ts <= end in order, one page per query."""
+    after_seq = 0
+    while True:
+        query = select(models.SessionEvent).where(
+            models.SessionEvent.session_id == session_id, models.SessionEvent.seq > after_seq
+        )
+        if start is not None:
+            query = query.where(models.SessionEvent.ts >= start)
+        if end is not None:
+            query = query.where(models.SessionEvent.ts <= end)
+        # Each page gets its own short-lived session so a slow reader doesn't hold a connection
+        async with session_factory() as db:
+            rows = (await db.execute(query.order_by(models.SessionEvent.seq).limit(page_size))).scalars().all()
+        for row in rows:
+            yield _event_dict(row)
+        if len(rows) < page_size:
+            return
+        after_seq = rows[-1].seq
+
+
+async def delete_recording(db, session_id: str):
+    await db.execute(delete(models.SessionEvent).where(models.SessionEvent.session_id == session_id))
+    await db.execute(delete(models.SessionKeyframe).where(models.SessionKeyframe.session_id == session_id))
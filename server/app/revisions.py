@@ -0,0 +1,63 @@
+"""Session revisions for conditional and delta GETs.
+
+`Session.revision` goes up by one on every write to a session. Each group of
+columns also records the revision it last changed in, so a client holding
+revision N can be sent only the groups stamped after N. Writers get both from
+`bump()`; the increment happens in the UPDATE itself, so concurrent writers
+never hand out the same revision.
+"""
+from typing import Iterable, Optional, Set
+
+from . import models
+
+# Revision column -> the session columns it covers ("whiteboard" stands for the board records)
+GROUPS = {
+    "code_revision": ("code", "language"),
+    "output_revision": ("output",),
+    "question_revision": ("question",),
+    "whiteboard_revision": ("whiteboard",),
+    "details_revision": ("candidate_name", "candidate_email", "date", "duration", "score", "status", "notes",
+                         "start_time"),
+}
+GROUP_OF = {column: group for group, columns in GROUPS.items() for column in columns}
+COLUMNS = [getattr(models.Session, group) for group in GROUPS]
+
+
+def bump(columns: Iterable[str]) -> dict:
+    """UPDATE values for a write touching `columns`: the next revision, stamped on their groups."""
+    next_revision = models.Session.revision + 1
+    values = {"revision": next_revision}
+    for column in columns:
+        values[GROUP_OF[column]] = next_revision
+    return values
+
+
+def stamp(session, columns: Iterable[str]):
+    """bump() for a loaded ORM row; the new values are read back after the flush."""
+    for key, value in bump(columns).items():
+        setattr(session, key, value)
+
+
+def changed_since(row, since: int) -> Set[str]:
+    """Session columns whose group changed after revision `since`."""
+    changed = set()
+    for group, columns in GROUPS.items():
+        if (getattr(row, group) or 0) > since:
+            changed.update(columns)
+    return changed
+
+
+def etag(revision: int) -> str:
+    # Weak: the body also carries serverTime, which differs on every response
+    return f'W/"{revision}"'
+
+
+def matches(if_none_match: Optional[str], revision: int) -> bool:
+    if not if_none_match:
+        return False
+    current = etag(revision)[2:]
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == current:
+            return True
+    return False
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.future import select
+
+from . import models, text_ot
+from .profiler import profiler
+from .write_behind import WriteBehindBuffer
+
+# Max events queued for a single room before senders are made to wait
+ROOM_INBOX_SIZE = int(os.getenv("ROOM_INBOX_SIZE", "1000"))
+# Rooms with no events for this long are torn down (seconds)
+ROOM_IDLE_TIMEOUT = float(os.getenv("ROOM_IDLE_TIMEOUT", "300"))
+# Code operations kept for rebasing late deltas; older bases get a full resync
+CODE_HISTORY_SIZE = int(os.getenv("CODE_HISTORY_SIZE", "200"))
+# Worker processes behind this instance (start.sh passes UVICORN_WORKERS; uvicorn itself reads WEB_CONCURRENCY)
+WEB_CONCURRENCY = int(os.getenv("UVICORN_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+# Set to 1 only when the proxy in front sends all of a room's connections and requests to the same process
+STICKY_ROOMS = os.getenv("STICKY_ROOMS", "0") == "1"
+
+
+class ResyncRequired(Exception):
+    pass
+
+
+def check_room_affinity(workers: int = WEB_CONCURRENCY, shared: bool = False, sticky: bool = STICKY_ROOMS):
+    """Refuse to start where a room could be served by more than one process.
+
+    A room's actor (its state, code revisions and history), its write-behind
+    buffer and its replay sequence numbers all live in the process that serves
+    it; two processes serving one room would each keep their own copy. So more
+    than one worker, or a shared message queue / presence store (which are only
+    there for several processes), needs sticky routing by room.
+    """
+    if (workers > 1 or shared) and not sticky:
+        raise RuntimeError(
+            "Rooms are held in one process: run a single worker, or route every room to one process and set "
+            "STICKY_ROOMS=1"
+        )
+
+
+class RoomState:
+    """In-memory copy of the session fields a room mutates.
+
+    The code document is versioned: every edit bumps `revision` and its
+    operation is kept in `history` so deltas written against an older revision
+    can be transformed onto the current one. `epoch` changes whenever the state
+    is (re)loaded, which invalidates revisions clients got before.
+    """
+
+    __slots__ = ("exists", "code", "language", "question", "output", "start_time",
+                 "revision", "epoch", "history")
+
+    def __init__(self, row=None):
+        self.exists = row is not None
+        self.code = row.code if row else None
+        self.language = row.language if row else None
+        self.question = row.question if row else None
+        self.output = row.output if row else None
+        self.start_time = row.start_time if row else None
+        self.revision = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history = deque(maxlen=CODE_HISTORY_SIZE)
+
+    def apply_delta(self, epoch: str, base_revision: int, ops) -> List:
+        """Rebase ops from base_revision onto the current document and apply them."""
+        oldest = self.revision - len(self.history)
+        if epoch != self.epoch or not isinstance(base_revision, int) or not oldest <= base_revision <= self.revision:
+            raise ResyncRequired()
+        try:
+            for concurrent in list(self.history)[base_revision - oldest:]:
+                ops, _ = text_ot.transform(ops, concurrent)
+            code = text_ot.apply(self.code or "", ops)
+        except ValueError:
+            raise ResyncRequired()
+        self._commit(code, ops)
+        return ops
+
+    def replace_code(self, code: str) -> List:
+        """Full-text update from a client that does not speak deltas."""
+        ops = text_ot.diff(self.code or "", code)
+        self._commit(code, ops)
+        return ops
+
+    def _commit(self, code: str, ops):
+        self.code = code
+        self.revision += 1
+        self.history.append(ops)
+
+
+class RoomActor:
+    """Runs every state change for one room in order on a single task.
+
+    Socket handlers submit callables that receive the actor; they run one at a
+    time against `state`, which is loaded from the DB once and then kept in
+    memory. Writes go through the shared write-behind buffer so they are
+    batched across events.
+    """
+
+    def __init__(self, room_id: str, registry: "RoomRegistry"):
+        self.room_id = room_id
+        self.registry = registry
+        self.state: Optional[RoomState] = None
+        self.stale = False
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=registry.inbox_size)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def buffer(self) -> WriteBehindBuffer:
+        return self.registry.buffer
+
+    async def _load(self):
+        async with self.registry.session_factory() as db:
+            if self.registry.cache is not None:
+                state = RoomState(await self.registry.cache.get(db, self.room_id))
+            else:
+                result = await db.execute(
+                    select(
+                        models.Session.code,
+                        models.Session.language,
+                        models.Session.question,
+                        models.Session.output,
+                        models.Session.start_time,
+                    ).where(models.Session.id == self.room_id)
+                )
+                state = RoomState(result.first())
+
+        # Anything still waiting in the buffer is newer than the row
+        for field, value in (self.buffer.pending(self.room_id) or {}).items():
+            if field in RoomState.__slots__:
+                setattr(state, field, value)
+        self.state = state
+        self.stale = False
+        if self.registry.on_load is not None:
+            await self.registry.on_load(self.room_id, state)
+
+    async def _run(self):
+        while True:
+            try:
+                fn, future = await asyncio.wait_for(self.inbox.get(), timeout=self.registry.idle_timeout)
+            except asyncio.TimeoutError:
+                if self.inbox.empty():
+                    self.registry._remove(self)
+                    await self.buffer.flush(self.room_id)
+                    return
+                continue
+
+            watch = None
+            if profiler.enabled:
+                watch = profiler.begin("room", getattr(fn, "__qualname__", repr(fn)), self.room_id)
+            try:
+                if self.state is None or self.stale:
+                    await self._load()
+                result = await fn(self)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                if watch is not None:
+                    profiler.end(watch)
+
+    async def submit(self, fn: Callable[["RoomActor"], Awaitable]):
+        future = asyncio.get_running_loop().create_future()
+        await self.inbox.put((fn, future))
+        return await future
+
+
+class RoomRegistry:
+    def __init__(self, session_factory: Callable, buffer: WriteBehindBuffer,
+                 inbox_size: int = ROOM_INBOX_SIZE, idle_timeout: float = ROOM_IDLE_TIMEOUT,
+                 on_load: Optional[Callable[[str, RoomState], Awaitable]] = None, cache=None):
+        self.session_factory = session_factory
+        self.buffer = buffer
+        # Optional SessionCache rooms load their state through
+        self.cache = cache
+        # Awaited with (room_id, state) whenever an actor (re)loads its state
+        self.on_load = on_load
+        self.inbox_size = inbox_size
+        self.idle_timeout = idle_timeout
+        self._actors: Dict[str, RoomActor] = {}
+
+    def get(self, room_id: str) -> RoomActor:
+        actor = self._actors.get(room_id)
+        if actor is None or actor.task is None or actor.task.done():
+            actor = self._actors[room_id] = RoomActor(room_id, self)
+            actor.task = asyncio.create_task(actor._run())
+        return actor
+
+    async def submit(self, room_id: str, fn: Callable[[RoomActor], Awaitable]):
+        return await self.get(room_id).submit(fn)
+
+    def invalidate(self, room_id: str):
+        # The row was changed outside the actor (REST); reload before the next event
+        actor = self._actors.get(room_id)
+        if actor is not None:
+            actor.stale = True
+
+    def active_rooms(self):
+        return list(self._actors)
+
+    def _remove(self, actor: RoomActor):
+        if self._actors.get(actor.room_id) is actor:
+            del self._actors[actor.room_id]
+
+    def clear(self):
+        self._actors.clear()
+
+    async def stop(self):
+        actors = list(self._actors.values())
+        self._actors.clear()
+        for actor in actors:
+            if actor.task is not None:
+                actor.task.cancel()
+        for actor in actors:
+            if actor.task is not None:
+                try:
+                    await actor.task
+                except (asyncio.CancelledError, RuntimeError):
+                    pass
+            # Don't leave submitters waiting on events that will never run
+            while not actor.inbox.empty():
+                _, future = actor.inbox.get_nowait()
+                if not future.done():
+                    future.cancel()
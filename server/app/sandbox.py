@@ -0,0 +1,447 @@
+"""Pre-forked execution worker for one language.
+
+Started by the execution pool as `python sandbox.py <language> <root> [user]`. It reads one
+JSON job per line on stdin, forks a child per job with CPU time, memory and
+file size rlimits applied, collects its output under a wall-clock deadline and
+an output cap, and writes one JSON result per line on stdout. Streaming jobs
+also get `{"chunk": [stream, text]}` lines while the program runs; the result
+only carries the tail of each stream.
+
+Python code is executed directly in the forked child, so runs skip
+interpreter start-up entirely. Other languages exec their toolchain from the
+child. This module only uses the standard library so it can run standalone.
+
+With a user, every run is also isolated: the child moves to a new network
+namespace (no interfaces up) and pid namespace, caps the account's processes
+and then switches to that unprivileged account for good, so it can't reach the
+network, other processes' environments or files the account can't read, and
+can't fork without bound or leave processes behind. That needs the worker to
+start as root. Without a user
+runs only get the limits, which is fit for local development only.
+"""
+import codecs
+import ctypes
+import json
+import os
+import pwd
+import resource
+import selectors
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+# file: source file name; compile/run: argv (may use {memory_mb});
+# address_space: whether RLIMIT_AS can be applied (JIT/GC runtimes reserve far more than they use)
+RUNTIMES = {
+    "python": {"file": "main.py", "inline": True, "address_space": True},
+    "javascript": {"file": "main.js", "run": ["node", "--max-old-space-size={memory_mb}", "main.js"],
+                   "address_space": False, "version": ["node", "--version"]},
+    "java": {"file": "Main.java", "run": ["java", "-Xmx{memory_mb}m", "-XX:+UseSerialGC", "Main.java"],
+             "address_space": False, "version": ["java", "-version"]},
+    "cpp": {"file": "main.cpp", "compile": ["g++", "-O2", "-o", "main", "main.cpp"], "run": ["./main"],
+            "address_space": True, "version": ["g++", "--version"], "warmup": "#include <iostream>\nint main() { std::cout << 1; }\n"},
+    "go": {"file": "main.go", "compile": ["go", "build", "-o", "main", "main.go"], "run": ["./main"],
+           "address_space": False, "version": ["go", "version"], "warmup": "package main\nimport \"fmt\"\nfunc main() { fmt.Println(1) }\n"},
+}
+
+# Processes and threads the run account may have at once when a job doesn't say (one JVM or Go build uses dozens)
+DEFAULT_PROCESSES = 256
+
+# Modules commonly used in interview solutions, imported once before forking
+WARM_MODULES = ("bisect", "collections", "dataclasses", "functools", "heapq", "itertools", "json",
+                "math", "random", "re", "string", "typing")
+
+
+def available(language):
+    spec = RUNTIMES.get(language)
+    if spec is None:
+        return False
+    if spec.get("inline"):
+        return True
+    return shutil.which((spec.get("compile") or spec["run"])[0]) is not None
+
+
+def runtime_version(language):
+    """First line the toolchain prints about its version, so cached results don't outlive an upgrade."""
+    spec = RUNTIMES[language]
+    if spec.get("inline"):
+        return sys.version
+    try:
+        out = subprocess.run(spec["version"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    lines = (out.stdout or out.stderr).strip().splitlines()
+    return lines[0] if lines else "unknown"
+
+
+def _child_env(workdir, root):
+    env = {
+        "PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"),
+        "HOME": workdir,
+        "LANG": "C.UTF-8",
+        "TMPDIR": workdir,
+        # Shared across runs so repeat Go builds only compile the user's package
+        "GOCACHE": os.path.join(root, "go-cache"),
+        "GOPATH": os.path.join(root, "go-path"),
+        "GO111MODULE": "off",
+    }
+    return env
+
+
+def _apply_limits(limits, address_space):
+    cpu = int(limits["cpu_seconds"])
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    file_bytes = int(limits["file_bytes"])
+    resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))
+    if address_space:
+        memory = int(limits["memory_mb"]) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+PR_SET_PDEATHSIG = 1
+
+
+def _isolate(account, processes):
+    # Still root here: leave the network and pid namespaces first, then drop every privilege for good
+    os.unshare(os.CLONE_NEWNET | os.CLONE_NEWPID)
+    # Counts every process and thread of the account across runs, so a fork bomb stops here, not at the host
+    resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+    os.setgroups([])
+    os.setgid(account.pw_gid)
+    os.setuid(account.pw_uid)
+    _enter_pid_namespace()
+
+
+def _enter_pid_namespace():
+    """Fork the namespace's init and, under it, the process that runs the job; returns only in the latter.
+
+    When init exits the kernel kills whatever is left in the namespace, so processes
+    that left the process group with setsid() can't outlive the run. init dies with
+    the child above it, which reports the run's exit status as its own.
+    """
+    status_r, status_w = os.pipe()
+    init = os.fork()
+    if init:
+        os.close(status_w)
+        os.waitpid(init, 0)
+        with os.fdopen(status_r, "rb") as f:
+            reported = f.read()
+        _exit_with(int(reported) if reported else signal.SIGKILL)
+    os.close(status_r)
+    # After setuid, which clears it
+    ctypes.CDLL(None, use_errno=True).prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+    pid = os.fork()
+    if pid:
+        while True:
+            # pid 1 also reaps the orphans reparented to it
+            child, status = os.wait()
+            if child == pid:
+                os.write(status_w, str(status).encode())
+                os._exit(0)
+    os.close(status_w)
+
+
+def _exit_with(status):
+    # A signal can't be passed on through an exit code, so die of the same one
+    if os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        signal.signal(sig, signal.SIG_DFL)
+        os.kill(os.getpid(), sig)
+        os._exit(128 + sig)
+    os._exit(os.waitstatus_to_exitcode(status))
+
+
+def _run_child(spec, job, workdir, root, out_w, err_w, account=None):
+    """Runs in the forked child; never returns."""
+    limits = job["limits"]
+    os.setsid()
+    if account is not None:
+        _isolate(account, int(limits.get("processes", DEFAULT_PROCESSES)))
+    os.chdir(workdir)
+    with open(spec["file"], "w") as f:
+        f.write(job["code"])
+    with open("stdin.txt", "w") as f:
+        f.write(job.get("stdin") or "")
+
+    stdin_fd = os.open("stdin.txt", os.O_RDONLY)
+    os.dup2(stdin_fd, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    for fd in (stdin_fd, out_w, err_w):
+        os.close(fd)
+    env = _child_env(workdir, root)
+
+    if spec.get("compile"):
+        try:
+            compiled = subprocess.run(spec["compile"], env=env, stdin=subprocess.DEVNULL, stdout=2, stderr=2,
+                                      timeout=limits["compile_seconds"])
+        except subprocess.TimeoutExpired:
+            os.write(2, b"Compilation timed out\n")
+            os._exit(1)
+        if compiled.returncode != 0:
+            os._exit(compiled.returncode)
+
+    _apply_limits(limits, spec.get("address_space", False))
+
+    if spec.get("inline"):
+        os.environ.clear()
+        os.environ.update(env)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        sys.argv = [spec["file"]]
+        sys.path[0] = workdir
+        status = 0
+        try:
+            code = compile(job["code"], spec["file"], "exec")
+            exec(code, {"__name__": "__main__", "__file__": spec["file"], "__builtins__": __builtins__})
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                status = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+    argv = [arg.format(memory_mb=limits["memory_mb"]) for arg in spec["run"]]
+    os.execvpe(argv[0], argv, env)
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class RingBuffer:
+    """Keeps the last `size` bytes written to it."""
+
+    def __init__(self, size):
+        self.size = size
+        self._buf = bytearray()
+        self.dropped = 0
+
+    def write(self, data):
+        self._buf += data
+        # Trim in batches so a chatty program doesn't pay a memmove per read
+        if len(self._buf) > self.size * 2:
+            excess = len(self._buf) - self.size
+            del self._buf[:excess]
+            self.dropped += excess
+
+    def getvalue(self):
+        data = bytes(self._buf[-self.size:]) if self.size else b""
+        if len(data) < len(self._buf) or self.dropped:
+            # Don't start the tail halfway through a UTF-8 sequence
+            i = 0
+            while i < min(len(data), 3) and data[i] & 0xC0 == 0x80:
+                i += 1
+            data = data[i:]
+        return data.decode("utf-8", "replace")
+
+    @property
+    def truncated(self):
+        return self.dropped > 0 or len(self._buf) > self.size
+
+
+class _Stream:
+    """Output of one pipe: tail for the final result plus pending text for streaming."""
+
+    def __init__(self, name, tail_bytes):
+        self.name = name
+        self.tail = RingBuffer(tail_bytes)
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.pending = []
+        self.pending_bytes = 0
+
+
+# pid of the run in progress, so a terminating worker can take its process group down with it
+_current = None
+
+
+def _terminate(signum, frame):
+    if _current is not None:
+        _kill_group(_current)
+    os._exit(0)
+
+
+def run_job(language, job, root, emit=None, account=None):
+    """Run one job. With `emit`, output is also passed on as emit(stream, text) while it arrives."""
+    global _current
+    spec = RUNTIMES[language]
+    limits = job["limits"]
+    workdir = tempfile.mkdtemp(prefix="run-", dir=root)
+    if account is not None:
+        os.chown(workdir, account.pw_uid, account.pw_gid)
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.close(out_r)
+            os.close(err_r)
+            _run_child(spec, job, workdir, root, out_w, err_w, account)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(127)
+
+    _current = pid
+    os.close(out_w)
+    os.close(err_w)
+    wall = limits["wall_seconds"] + (limits["compile_seconds"] if spec.get("compile") else 0)
+    deadline = started + wall
+    # Past this many bytes in total the program is stopped; only a tail of output_bytes is kept
+    max_output = limits.get("max_output_bytes", limits["output_bytes"])
+    stream_interval = limits.get("stream_interval", 0.05)
+    streams = {out_r: _Stream("stdout", limits["output_bytes"]), err_r: _Stream("stderr", limits["output_bytes"])}
+    total = 0
+    timed_out = output_exceeded = False
+    exit_status = None
+    last_flush = started
+
+    def flush_pending():
+        for stream in streams.values():
+            if stream.pending:
+                emit(stream.name, "".join(stream.pending))
+                stream.pending.clear()
+                stream.pending_bytes = 0
+
+    sel = selectors.DefaultSelector()
+    for fd in streams:
+        sel.register(fd, selectors.EVENT_READ)
+    try:
+        while sel.get_map():
+            now = time.monotonic()
+            if now >= deadline:
+                timed_out = True
+                _kill_group(pid)
+                break
+            timeout = deadline - now
+            if emit is not None:
+                timeout = min(timeout, stream_interval)
+            for key, _ in sel.select(timeout=min(timeout, 0.1)):
+                data = os.read(key.fd, 65536)
+                stream = streams[key.fd]
+                if not data:
+                    sel.unregister(key.fd)
+                    continue
+                data = data[:max(0, max_output - total)]
+                total += len(data)
+                stream.tail.write(data)
+                if emit is not None:
+                    text = stream.decoder.decode(data)
+                    if text:
+                        stream.pending.append(text)
+                        stream.pending_bytes += len(text)
+                if total >= max_output:
+                    output_exceeded = True
+            if emit is not None:
+                now = time.monotonic()
+                pending = sum(s.pending_bytes for s in streams.values())
+                # Coalesce small writes into one message per interval
+                if pending and (now - last_flush >= stream_interval or pending >= 16384):
+                    flush_pending()
+                    last_flush = now
+            if output_exceeded:
+                _kill_group(pid)
+                break
+            if exit_status is None:
+                done, status = os.waitpid(pid, os.WNOHANG)
+                if done:
+                    exit_status = status
+                    # Background processes left behind would hold the pipes open
+                    _kill_group(pid)
+        if emit is not None:
+            flush_pending()
+    finally:
+        sel.close()
+        os.close(out_r)
+        os.close(err_r)
+        if exit_status is None:
+            _, exit_status = os.waitpid(pid, 0)
+        _kill_group(pid)
+        _current = None
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    exit_code = os.waitstatus_to_exitcode(exit_status)
+    stdout, stderr = streams[out_r].tail, streams[err_r].tail
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "exitCode": exit_code,
+        "timedOut": timed_out,
+        "cpuLimitExceeded": exit_code == -signal.SIGXCPU,
+        "outputLimitExceeded": output_exceeded,
+        "truncated": output_exceeded or stdout.truncated or stderr.truncated,
+        "outputBytes": total,
+        "durationMs": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def main():
+    language = sys.argv[1]
+    root = sys.argv[2] if len(sys.argv) > 2 else tempfile.gettempdir()
+    account = pwd.getpwnam(sys.argv[3]) if len(sys.argv) > 3 else None
+    os.makedirs(root, exist_ok=True)
+    if account is not None:
+        if os.geteuid() != 0:
+            sys.exit(f"Running code as {account.pw_name} needs the sandbox to start as root")
+        # Runs can reach their own directory and the shared compiler caches, nothing else in root
+        os.chmod(root, 0o711)
+        for name in ("go-cache", "go-path"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+            os.chown(os.path.join(root, name), account.pw_uid, account.pw_gid)
+    signal.signal(signal.SIGTERM, _terminate)
+    if RUNTIMES[language].get("inline"):
+        for name in WARM_MODULES:
+            __import__(name)
+
+    protocol_in = sys.stdin.buffer
+    protocol_out = sys.stdout.buffer
+    protocol_out.write(b'{"ready": true}\n')
+    protocol_out.flush()
+    warmup = RUNTIMES[language].get("warmup")
+    if warmup:
+        # Fill the compiler's caches before the first real run; jobs sent meanwhile just wait in the pipe
+        limits = {"cpu_seconds": 60, "wall_seconds": 60, "compile_seconds": 120, "memory_mb": 512,
+                  "output_bytes": 1024, "file_bytes": 1 << 20}
+        try:
+            run_job(language, {"code": warmup, "limits": limits}, root, account=account)
+        except Exception:
+            pass
+    def emit(stream, text):
+        protocol_out.write(json.dumps({"chunk": [stream, text]}).encode() + b"\n")
+        protocol_out.flush()
+
+    for line in protocol_in:
+        try:
+            job = json.loads(line)
+            result = run_job(language, job, root, emit if job.get("stream") else None, account)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        protocol_out.write(json.dumps(result).encode() + b"\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    main()
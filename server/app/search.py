@@ -0,0 +1,192 @@
+"""Full-text search over sessions' candidate name and email, notes and code.
+
+The index lives in the database and the database keeps it current on every
+write to those columns, whichever path makes it (REST updates, explicit code
+saves, flushed room edits):
+
+- SQLite: an FTS5 table (`sessions_fts`) over the sessions table's own rows,
+  maintained by triggers;
+- PostgreSQL: a generated `search_vector` tsvector column with a GIN index.
+
+It is created with the sessions table and added (and backfilled) by
+`migrations.upgrade` on databases that predate it. Room edits still waiting in
+the write-behind buffer are searchable once flushed.
+"""
+import base64
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, inspect, text
+
+from . import models
+
+# Hits per page when the client doesn't ask for a size
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+
+# Words of a query that are used; the last one also matches as a prefix
+MAX_TERMS = 16
+# Matches are wrapped in these in snippets (plain text, not HTML)
+SNIPPET_OPEN = "**"
+SNIPPET_CLOSE = "**"
+SNIPPET_WORDS = 16
+
+_TERM = re.compile(r"[^\W_]+")
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5("
+    "candidate_name, candidate_email, notes, code, content='sessions', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN "
+    "INSERT INTO sessions_fts(rowid, candidate_name, candidate_email, notes, code) "
+    "VALUES (new.rowid, new.candidate_name, new.candidate_email, new.notes, new.code); END",
+    "CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN "
+    "INSERT INTO sessions_fts(sessions_fts, rowid, candidate_name, candidate_email, notes, code) "
+    "VALUES ('delete', old.rowid, old.candidate_name, old.candidate_email, old.notes, old.code); END",
+    # Only the indexed columns: revision bumps and whiteboard writes don't touch the index
+    "CREATE TRIGGER IF NOT EXISTS sessions_fts_update "
+    "AFTER UPDATE OF candidate_name, candidate_email, notes, code ON sessions BEGIN "
+    "INSERT INTO sessions_fts(sessions_fts, rowid, candidate_name, candidate_email, notes, code) "
+    "VALUES ('delete', old.rowid, old.candidate_name, old.candidate_email, old.notes, old.code); "
+    "INSERT INTO sessions_fts(rowid, candidate_name, candidate_email, notes, code) "
+    "VALUES (new.rowid, new.candidate_name, new.candidate_email, new.notes, new.code); END",
+)
+
+# Name/email weigh most, then notes, then code. Code is capped to stay under tsvector's 1MB limit.
+_POSTGRES_DDL = (
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(candidate_name, '') || ' ' || coalesce(candidate_email, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(notes, '')), 'B') || "
+    "setweight(to_tsvector('simple', left(coalesce(code, ''), 100000)), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_sessions_search ON sessions USING GIN (search_vector)",
+)
+
+_HIT_COLUMNS = "s.id, s.candidate_name, s.candidate_email, s.date, s.duration, s.score, s.status, s.language"
+
+
+class SearchError(ValueError):
+    pass
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+def install(sync_conn):
+    """Create the index for the connection's dialect if it's missing, indexing existing rows."""
+    dialect = sync_conn.dialect.name
+    if dialect == "sqlite":
+        existed = inspect(sync_conn).has_table("sessions_fts")
+        for ddl in _SQLITE_DDL:
+            sync_conn.execute(text(ddl))
+        if not existed:
+            sync_conn.execute(text("INSERT INTO sessions_fts(sessions_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        # Adding the generated column computes it for every existing row
+        for ddl in _POSTGRES_DDL:
+            sync_conn.execute(text(ddl))
+
+
+def _create(table, sync_conn, **kw):
+    install(sync_conn)
+
+
+def _drop(table, sync_conn, **kw):
+    # The triggers go with the sessions table; the FTS table has to be dropped on its own
+    if sync_conn.dialect.name == "sqlite":
+        sync_conn.execute(text("DROP TABLE IF EXISTS sessions_fts"))
+
+
+event.listen(models.Session.__table__, "after_create", _create)
+event.listen(models.Session.__table__, "before_drop", _drop)
+
+
+def terms(query: str) -> List[str]:
+    return _TERM.findall((query or "").lower())[:MAX_TERMS]
+
+
+def fts5_query(words: List[str]) -> str:
+    # Each word quoted, so nothing in the query is read as FTS5 syntax
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def tsquery(words: List[str]) -> str:
+    return " & ".join(words[:-1] + [words[-1] + ":*"])
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([offset]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        (offset,) = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return max(0, int(offset))
+    except Exception:
+        raise SearchError("Invalid cursor")
+
+
+def _filters(status: Optional[str], language: Optional[str]) -> str:
+    # Always scoped to one interviewer's sessions (ix_sessions_interviewer_date)
+    sql = " AND s.interviewer_id = :interviewer_id"
+    if status:
+        sql += " AND s.status = :status"
+    if language:
+        sql += " AND s.language = :language"
+    return sql
+
+
+def _sqlite_sql(filters: str) -> str:
+    return (
+        f"SELECT {_HIT_COLUMNS}, -bm25(sessions_fts, 10.0, 10.0, 4.0, 1.0) AS relevance, "
+        f"snippet(sessions_fts, -1, :open, :close, '…', {SNIPPET_WORDS}) AS snippet "
+        "FROM sessions_fts JOIN sessions s ON s.rowid = sessions_fts.rowid "
+        f"WHERE sessions_fts MATCH :match{filters} "
+        "ORDER BY relevance DESC, s.id LIMIT :limit OFFSET :offset"
+    )
+
+
+def _postgres_sql(filters: str) -> str:
+    options = f"StartSel={SNIPPET_OPEN}, StopSel={SNIPPET_CLOSE}, MaxWords={SNIPPET_WORDS}, MinWords=4, MaxFragments=2"
+    return (
+        f"SELECT {_HIT_COLUMNS}, ts_rank_cd(s.search_vector, q) AS relevance, "
+        "ts_headline('simple', concat_ws(' … ', s.candidate_name, s.notes, left(s.code, 100000)), q, "
+        f"'{options}') AS snippet "
+        "FROM sessions s, to_tsquery('simple', :match) q "
+        f"WHERE s.search_vector @@ q{filters} "
+        "ORDER BY relevance DESC, s.id LIMIT :limit OFFSET :offset"
+    )
+
+
+async def search(db, interviewer_id: str, query: str, status: Optional[str] = None,
+                 language: Optional[str] = None, cursor: Optional[str] = None,
+                 limit: int = SEARCH_PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """One page of an interviewer's sessions matching every word of `query`, best first, and the next cursor.
+
+    Ranks shift as sessions change, so pages are by position rather than keyset.
+    """
+    words = terms(query)
+    if not words:
+        raise SearchError("Search query has no words")
+    offset = decode_cursor(cursor) if cursor else 0
+
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        sql, match = _sqlite_sql(_filters(status, language)), fts5_query(words)
+    elif dialect == "postgresql":
+        sql, match = _postgres_sql(_filters(status, language)), tsquery(words)
+    else:
+        raise SearchUnavailable(f"Full-text search is not supported on {dialect}")
+
+    params = {"match": match, "open": SNIPPET_OPEN, "close": SNIPPET_CLOSE, "interviewer_id": interviewer_id,
+              "status": status,
+              "language": language, "limit": limit + 1, "offset": offset}
+    rows = (await db.execute(text(sql), params)).all()
+    # One extra row tells whether there is a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(offset + limit)
+    return rows, next_cursor
@@ -0,0 +1,165 @@
+import os
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from sqlalchemy.future import select
+
+from . import metrics, models
+
+# Session rows kept per worker; 0 disables the cache
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+# How long a row may be served without rereading it (seconds). Writes made by this
+# worker invalidate immediately; this bounds staleness from writes made by other workers.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+
+SESSION_CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    "session_cache_lookups_total", "Session row cache lookups by result", ["result"])
+
+# Everything but the legacy whiteboard blob, which boards no longer live in
+CACHED_COLUMNS = [column for column in models.Session.__table__.columns if column.name != "whiteboard"]
+
+
+class CacheBackend:
+    """Where cached session rows are kept.
+
+    Values are plain dicts of JSON-compatible column values, so a backend
+    shared between workers (e.g. redis with SETEX) only has to implement these
+    methods. The in-process LRU below is the default.
+    """
+
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: dict, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryBackend(CacheBackend):
+    """Bounded LRU with a per-entry expiry."""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict, ttl: float):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SessionCache:
+    """Read-through cache of session rows by id.
+
+    `get()` returns an object with the row's column attributes (not an ORM
+    instance; routes that modify a session still load it themselves) and must
+    be followed by `invalidate()` after any write to the row commits. A load
+    that overlaps an invalidation is returned but not cached, so a reader that
+    started before a write can't put the old row back.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = SESSION_CACHE_TTL):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation; only ids with a load in flight are tracked
+        self._generation: Dict[str, int] = {}
+        self._loading: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and getattr(self.backend, "max_entries", 1) > 0
+
+    async def get(self, db, session_id: str) -> Optional[SimpleNamespace]:
+        """The session's columns, from the cache or the database; None if there is no such session."""
+        if self.enabled:
+            try:
+                values = await self.backend.get(session_id)
+            except Exception as e:
+                # A shared backend being down shouldn't take reads with it
+                print(f"Error reading cached session {session_id}: {e}")
+                values = None
+            if values is not None:
+                self.hits += 1
+                SESSION_CACHE_LOOKUPS.inc("hit")
+                return SimpleNamespace(whiteboard=None, **values)
+            self.misses += 1
+            SESSION_CACHE_LOOKUPS.inc("miss")
+
+        generation = self._generation.get(session_id, 0)
+        self._loading[session_id] = self._loading.get(session_id, 0) + 1
+        try:
+            result = await db.execute(select(*CACHED_COLUMNS).where(models.Session.id == session_id))
+            row = result.mappings().first()
+        finally:
+            self._loading[session_id] -= 1
+            loading = self._loading[session_id]
+            if not loading:
+                del self._loading[session_id]
+        current = self._generation.pop(session_id, 0) if not loading else self._generation.get(session_id, 0)
+        if row is None:
+            return None
+        values = dict(row)
+        if self.enabled and current == generation:
+            try:
+                await self.backend.set(session_id, values, self.ttl)
+            except Exception as e:
+                print(f"Error caching session {session_id}: {e}")
+        return SimpleNamespace(whiteboard=None, **values)
+
+    async def invalidate(self, *session_ids: str):
+        for session_id in session_ids:
+            if session_id in self._loading:
+                self._generation[session_id] = self._generation.get(session_id, 0) + 1
+            try:
+                await self.backend.delete(session_id)
+            except Exception as e:
+                print(f"Error invalidating cached session {session_id}: {e}")
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self.backend.clear()
+        self._generation.clear()
+        self._loading.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.backend)
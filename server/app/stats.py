@@ -0,0 +1,240 @@
+"""Dashboard aggregates over sessions, maintained incrementally.
+
+Every write that changes a session's status, language, date, score or
+duration adds the difference between the session's old and new contribution
+to a handful of its interviewer's `session_stats` rows (one per dimension it
+is counted under), in the same transaction as the write. Reading the stats is
+then a lookup of a few rows, however many sessions there are.
+
+`rebuild` recomputes every row from the sessions table; run it after changing
+sessions outside the app:
+
+    python -m app.stats rebuild
+"""
+import argparse
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import case, delete, func, literal, text
+from sqlalchemy.future import select
+
+from . import models
+
+# Upper bounds (minutes) of the duration histogram buckets; longer ones count as "over"
+DURATION_BUCKETS = (15, 30, 45, 60, 90)
+
+# Session columns the aggregates depend on
+TRACKED_COLUMNS = ("interviewer_id", "status", "language", "date", "score", "duration")
+
+COUNTERS = ("sessions", "scored", "score_sum", "timed", "duration_sum",
+            *(f"duration_le_{b}" for b in DURATION_BUCKETS), f"duration_over_{DURATION_BUCKETS[-1]}")
+
+
+class Facts(NamedTuple):
+    interviewer_id: str
+    status: str
+    language: str
+    day: str
+    score: Optional[int]
+    duration: int
+
+
+def facts(row) -> Facts:
+    """What the aggregates count of a session row (or anything with its columns)."""
+    return Facts(row.interviewer_id or "", row.status or "", row.language or "", (row.date or "")[:10],
+                 row.score, row.duration or 0)
+
+
+def _bucket(duration: int) -> str:
+    for bound in DURATION_BUCKETS:
+        if duration <= bound:
+            return f"duration_le_{bound}"
+    return f"duration_over_{DURATION_BUCKETS[-1]}"
+
+
+def _groups(f: Facts):
+    return tuple((f.interviewer_id, dimension, key) for dimension, key in (
+        ("all", ""), ("status", f.status), ("language", f.language), ("day", f.day)
+    ))
+
+
+def deltas(before: Optional[Facts], after: Optional[Facts]) -> Dict[tuple, Counter]:
+    """Per (interviewer_id, dimension, key), how much each counter changes when a session goes from `before`
+    to `after`."""
+    changes: Dict[tuple, Counter] = {}
+    for f, sign in ((before, -1), (after, 1)):
+        if f is None:
+            continue
+        counts = Counter(sessions=1)
+        if f.score is not None:
+            counts.update(scored=1, score_sum=f.score)
+        if f.duration > 0:
+            counts.update({"timed": 1, "duration_sum": f.duration, _bucket(f.duration): 1})
+        for group in _groups(f):
+            change = changes.setdefault(group, Counter())
+            for counter, value in counts.items():
+                change[counter] += sign * value
+    return {group: change for group, change in changes.items() if any(change.values())}
+
+
+def _dialect_name(db) -> str:
+    # An AsyncSession, or the AsyncConnection migrations run on
+    return getattr(db, "bind", db).dialect.name
+
+
+def _upsert_stmt(dialect_name: str, rows):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = models.SessionStat.__table__
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.interviewer_id, table.c.dimension, table.c.key],
+        set_={counter: table.c[counter] + stmt.excluded[counter] for counter in COUNTERS},
+    )
+
+
+async def apply(db, changes: Dict[tuple, Counter]):
+    if not changes:
+        return
+    rows = [
+        {"interviewer_id": interviewer_id, "dimension": dimension, "key": key,
+         **{counter: change[counter] for counter in COUNTERS}}
+        for (interviewer_id, dimension, key), change in changes.items()
+    ]
+    await db.execute(_upsert_stmt(_dialect_name(db), rows))
+
+
+async def record(db, before: Optional[Facts], after: Optional[Facts]):
+    """Count a session change (None for a session that doesn't exist before/after it) in the current transaction."""
+    await apply(db, deltas(before, after))
+
+
+async def record_writes(db, writes: Dict[str, dict]):
+    """Count column writes about to be made by bulk UPDATEs: session id -> {column: new value}."""
+    ids = [session_id for session_id, values in writes.items() if values.keys() & set(TRACKED_COLUMNS)]
+    if not ids:
+        return
+    columns = [models.Session.id, *(getattr(models.Session, column) for column in TRACKED_COLUMNS)]
+    result = await db.execute(select(*columns).where(models.Session.id.in_(ids)))
+    changes: Dict[tuple, Counter] = {}
+    for row in result.all():
+        current = row._asdict()
+        before = facts(SimpleNamespace(**current))
+        after = facts(SimpleNamespace(**{**current, **{k: v for k, v in writes[row.id].items() if k in current}}))
+        for group, change in deltas(before, after).items():
+            changes.setdefault(group, Counter()).update(change)
+    await apply(db, changes)
+
+
+def summarize(stat) -> dict:
+    """Wire form of one session_stats row."""
+    last = DURATION_BUCKETS[-1]
+    return {
+        "sessions": stat.sessions,
+        "scored": stat.scored,
+        "avgScore": round(stat.score_sum / stat.scored, 1) if stat.scored else None,
+        "timed": stat.timed,
+        "avgDuration": round(stat.duration_sum / stat.timed, 1) if stat.timed else None,
+        "durationHistogram": {
+            **{f"le{b}": getattr(stat, f"duration_le_{b}") for b in DURATION_BUCKETS},
+            f"over{last}": getattr(stat, f"duration_over_{last}"),
+        },
+    }
+
+
+EMPTY = summarize(SimpleNamespace(**{counter: 0 for counter in COUNTERS}))
+
+
+async def read(db, interviewer_id: str, day_from: Optional[str] = None, day_to: Optional[str] = None) -> dict:
+    """An interviewer's totals, per status, per language and per day (optionally within [day_from, day_to])."""
+    stat = models.SessionStat
+    day_filter = stat.dimension == "day"
+    if day_from:
+        day_filter &= stat.key >= day_from
+    if day_to:
+        day_filter &= stat.key <= day_to
+    result = await db.execute(select(stat).where(
+        stat.interviewer_id == interviewer_id, stat.dimension.in_(("all", "status", "language")) | day_filter
+    ))
+
+    out = {"total": EMPTY, "byStatus": {}, "byLanguage": {}, "byDay": {}}
+    sections = {"status": "byStatus", "language": "byLanguage", "day": "byDay"}
+    for row in result.scalars().all():
+        # Groups whose sessions were all deleted or moved keep a zeroed row
+        if not row.sessions:
+            continue
+        if row.dimension == "all":
+            out["total"] = summarize(row)
+        else:
+            out[sections[row.dimension]][row.key] = summarize(row)
+    out["byDay"] = dict(sorted(out["byDay"].items()))
+    return out
+
+
+def _group_select(dimension: str, key_expr):
+    s = models.Session
+    timed = s.duration > 0
+
+    def sum_if(condition, value=1):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    interviewer_id = func.coalesce(s.interviewer_id, "")
+    columns = [
+        interviewer_id.label("interviewer_id"),
+        literal(dimension).label("dimension"),
+        key_expr.label("key"),
+        func.count().label("sessions"),
+        func.count(s.score).label("scored"),
+        func.coalesce(func.sum(s.score), 0).label("score_sum"),
+        sum_if(timed).label("timed"),
+        sum_if(timed, s.duration).label("duration_sum"),
+    ]
+    lower = 0
+    for bound in DURATION_BUCKETS:
+        columns.append(sum_if((s.duration > lower) & (s.duration <= bound)).label(f"duration_le_{bound}"))
+        lower = bound
+    columns.append(sum_if(s.duration > lower).label(f"duration_over_{lower}"))
+    query = select(*columns)
+    return query.group_by(interviewer_id) if dimension == "all" else query.group_by(interviewer_id, key_expr)
+
+
+async def rebuild(db):
+    """Recompute every aggregate from the sessions table, in one pass per dimension."""
+    if _dialect_name(db) == "postgresql":
+        # Hold off session writes until the new totals commit, so none is lost or counted twice
+        await db.execute(text("LOCK TABLE sessions IN SHARE MODE"))
+    await db.execute(delete(models.SessionStat))
+    s = models.Session
+    for dimension, key_expr in (
+        ("all", literal("")),
+        ("status", func.coalesce(s.status, "")),
+        ("language", func.coalesce(s.language, "")),
+        ("day", func.coalesce(func.substr(s.date, 1, 10), "")),
+    ):
+        await db.execute(models.SessionStat.__table__.insert().from_select(
+            ["interviewer_id", "dimension", "key", *COUNTERS], _group_select(dimension, key_expr)
+        ))
+
+
+async def _main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.stats", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    from .database import SessionLocal, engine
+    async with SessionLocal() as db:
+        await rebuild(db)
+        await db.commit()
+        total = (await db.execute(
+            select(func.sum(models.SessionStat.sessions)).where(models.SessionStat.dimension == "all")
+        )).scalar()
+    await engine.dispose()
+    print(f"Rebuilt session stats over {total or 0} sessions")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
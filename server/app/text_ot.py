@@ -0,0 +1,184 @@
+"""Plain-text operational transformation, wire-compatible with ot.js.
+
+An operation is a list of components applied left to right over the whole
+document: a positive int retains that many characters, a negative int deletes
+that many, and a string is inserted. Offsets are Python characters (code
+points); clients that count UTF-16 units must avoid astral characters or send
+a full resync.
+"""
+from typing import List, Tuple, Union
+
+Component = Union[int, str]
+
+
+class _Builder:
+    def __init__(self):
+        self.ops: List[Component] = []
+
+    def retain(self, n: int):
+        if n <= 0:
+            return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] > 0:
+            self.ops[-1] += n
+        else:
+            self.ops.append(n)
+
+    def insert(self, s: str):
+        if not s:
+            return
+        ops = self.ops
+        if ops and isinstance(ops[-1], str):
+            ops[-1] += s
+        elif ops and isinstance(ops[-1], int) and ops[-1] < 0:
+            # Keep inserts before deletes so equal operations have one representation
+            if len(ops) >= 2 and isinstance(ops[-2], str):
+                ops[-2] += s
+            else:
+                ops.insert(len(ops) - 1, s)
+        else:
+            ops.append(s)
+
+    def delete(self, n: int):
+        if n <= 0:
+            return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] < 0:
+            self.ops[-1] -= n
+        else:
+            self.ops.append(-n)
+
+
+def _check(ops) -> List[Component]:
+    if not isinstance(ops, list):
+        raise ValueError("operation must be a list")
+    for op in ops:
+        if isinstance(op, bool) or not isinstance(op, (int, str)) or op == 0 or op == "":
+            raise ValueError(f"invalid component: {op!r}")
+    return ops
+
+
+def base_length(ops) -> int:
+    return sum(abs(op) for op in _check(ops) if isinstance(op, int))
+
+
+def apply(doc: str, ops) -> str:
+    if base_length(ops) != len(doc):
+        raise ValueError("operation does not match document length")
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(doc[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def transform(a, b) -> Tuple[List[Component], List[Component]]:
+    """Given a and b on the same document, return (a', b') with apply(apply(d, a), b') == apply(apply(d, b), a')."""
+    if base_length(a) != base_length(b):
+        raise ValueError("operations are not based on the same document")
+
+    a_prime, b_prime = _Builder(), _Builder()
+    ops1, ops2 = list(a), list(b)
+    i1 = i2 = 0
+    op1 = ops1[0] if ops1 else None
+    op2 = ops2[0] if ops2 else None
+
+    def next1():
+        nonlocal i1
+        i1 += 1
+        return ops1[i1] if i1 < len(ops1) else None
+
+    def next2():
+        nonlocal i2
+        i2 += 1
+        return ops2[i2] if i2 < len(ops2) else None
+
+    while op1 is not None or op2 is not None:
+        # Inserts go first; ties are won by a
+        if isinstance(op1, str):
+            a_prime.insert(op1)
+            b_prime.retain(len(op1))
+            op1 = next1()
+            continue
+        if isinstance(op2, str):
+            a_prime.retain(len(op2))
+            b_prime.insert(op2)
+            op2 = next2()
+            continue
+        if op1 is None or op2 is None:
+            raise ValueError("operations are not based on the same document")
+
+        if op1 > 0 and op2 > 0:
+            if op1 > op2:
+                n = op2
+                op1 -= op2
+                op2 = next2()
+            elif op1 == op2:
+                n = op2
+                op1, op2 = next1(), next2()
+            else:
+                n = op1
+                op2 -= op1
+                op1 = next1()
+            a_prime.retain(n)
+            b_prime.retain(n)
+        elif op1 < 0 and op2 < 0:
+            # Both deleted the same range; neither needs to delete it again
+            if -op1 > -op2:
+                op1 -= op2
+                op2 = next2()
+            elif op1 == op2:
+                op1, op2 = next1(), next2()
+            else:
+                op2 -= op1
+                op1 = next1()
+        elif op1 < 0 < op2:
+            if -op1 > op2:
+                n = op2
+                op1 += op2
+                op2 = next2()
+            elif -op1 == op2:
+                n = op2
+                op1, op2 = next1(), next2()
+            else:
+                n = -op1
+                op2 += op1
+                op1 = next1()
+            a_prime.delete(n)
+        else:
+            if op1 > -op2:
+                n = -op2
+                op1 += op2
+                op2 = next2()
+            elif op1 == -op2:
+                n = op1
+                op1, op2 = next1(), next2()
+            else:
+                n = op1
+                op2 += op1
+                op1 = next1()
+            b_prime.delete(n)
+
+    return a_prime.ops, b_prime.ops
+
+
+def diff(old: str, new: str) -> List[Component]:
+    """A single-span operation turning old into new (common prefix/suffix kept)."""
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    ops = _Builder()
+    ops.retain(prefix)
+    ops.insert(new[prefix:len(new) - suffix])
+    ops.delete(len(old) - prefix - suffix)
+    ops.retain(suffix)
+    return ops.ops
@@ -0,0 +1,123 @@
+from typing import Dict, Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import models
+
+# Sessions whose legacy whiteboard blob has already been moved into whiteboard_records
+_migrated = set()
+_MIGRATED_CACHE_LIMIT = 10000
+
+
+def _upsert_stmt(dialect_name: str, rows):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(models.WhiteboardRecord).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.WhiteboardRecord.session_id, models.WhiteboardRecord.record_id],
+        set_={"data": stmt.excluded.data},
+    )
+
+
+async def _upsert(db: AsyncSession, session_id: str, records: dict):
+    if not records:
+        return
+    rows = [{"session_id": session_id, "record_id": k, "data": v} for k, v in records.items()]
+    await db.execute(_upsert_stmt(db.bind.dialect.name, rows))
+
+
+async def _ensure_migrated(db: AsyncSession, session_id: str) -> bool:
+    """Move a legacy Session.whiteboard blob into per-record rows. Returns False if the session is unknown."""
+    if session_id in _migrated:
+        return True
+
+    result = await db.execute(
+        select(models.Session.id, models.Session.whiteboard).where(models.Session.id == session_id)
+    )
+    row = result.first()
+    if row is None:
+        return False
+
+    if row.whiteboard:
+        await _upsert(db, session_id, dict(row.whiteboard))
+        await db.execute(
+            update(models.Session).where(models.Session.id == session_id).values(whiteboard=None)
+        )
+
+    if len(_migrated) >= _MIGRATED_CACHE_LIMIT:
+        _migrated.clear()
+    _migrated.add(session_id)
+    return True
+
+
+def flatten_changes(changes: dict) -> Dict[str, Optional[dict]]:
+    """Turn a tldraw {added, updated, removed} diff into record_id -> record, with None for removals."""
+    records = dict(changes.get('added', {}))
+    for k, v in changes.get('updated', {}).items():
+        # tldraw sends updates as [before, after]
+        if isinstance(v, list) and len(v) == 2:
+            records[k] = v[1]
+        else:
+            records[k] = v
+    for k in changes.get('removed', {}):
+        records[k] = None
+    return records
+
+
+async def apply_records(db: AsyncSession, session_id: str, records: Dict[str, Optional[dict]]) -> bool:
+    """Write flattened records. Cost is proportional to the number of records, not the board."""
+    if not await _ensure_migrated(db, session_id):
+        return False
+
+    upserts = {k: v for k, v in records.items() if v is not None}
+    removed = [k for k, v in records.items() if v is None]
+
+    await _upsert(db, session_id, upserts)
+    if removed:
+        await db.execute(
+            delete(models.WhiteboardRecord).where(
+                models.WhiteboardRecord.session_id == session_id,
+                models.WhiteboardRecord.record_id.in_(removed),
+            )
+        )
+    return True
+
+
+async def apply_changes(db: AsyncSession, session_id: str, changes: dict) -> bool:
+    return await apply_records(db, session_id, flatten_changes(changes))
+
+
+def overlay(board: Optional[dict], records: Optional[Dict[str, Optional[dict]]]) -> Optional[dict]:
+    """Apply not-yet-persisted records on top of a stored board."""
+    if not records:
+        return board
+    board = dict(board or {})
+    for k, v in records.items():
+        if v is None:
+            board.pop(k, None)
+        else:
+            board[k] = v
+    return board or None
+
+
+async def snapshot(db: AsyncSession, session_id: str) -> Optional[dict]:
+    """Assemble the full board, falling back to the legacy column for sessions not yet migrated."""
+    result = await db.execute(
+        select(models.WhiteboardRecord.record_id, models.WhiteboardRecord.data)
+        .where(models.WhiteboardRecord.session_id == session_id)
+    )
+    records = {record_id: data for record_id, data in result.all()}
+    if records:
+        return records
+
+    result = await db.execute(select(models.Session.whiteboard).where(models.Session.id == session_id))
+    return result.scalar() or None
+
+
+async def delete_board(db: AsyncSession, session_id: str):
+    await db.execute(delete(models.WhiteboardRecord).where(models.WhiteboardRecord.session_id == session_id))
+    _migrated.discard(session_id)
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import update
+
+from . import models, revisions, whiteboard_store
+
+# How long a room must be quiet before its pending writes are flushed (seconds)
+CODE_FLUSH_INTERVAL = float(os.getenv("CODE_FLUSH_INTERVAL", "1.0"))
+# Upper bound on how long a value may stay dirty while a room keeps typing (seconds)
+CODE_FLUSH_MAX_AGE = float(os.getenv("CODE_FLUSH_MAX_AGE", "5.0"))
+
+
+class PendingWrite:
+    __slots__ = ("fields", "records", "first_dirty", "last_dirty")
+
+    def __init__(self, now: float):
+        self.fields: Dict[str, object] = {}
+        # Whiteboard record_id -> record (None means removed)
+        self.records: Dict[str, Optional[dict]] = {}
+        self.first_dirty = now
+        self.last_dirty = now
+
+
+class WriteBehindBuffer:
+    """Coalesces high-frequency session updates and writes them later.
+
+    Column values and whiteboard records staged for a session overwrite each
+    other in memory, so a batch only carries the latest value per field or
+    record. A background flusher persists a room once it has been quiet for
+    `interval` seconds or has been dirty for `max_age` seconds, whichever comes
+    first. While a value is pending it is fresher than the database, so readers
+    should overlay `pending()` / `pending_whiteboard()` on what they loaded.
+    """
+
+    def __init__(self, session_factory: Callable, interval: float = CODE_FLUSH_INTERVAL,
+                 max_age: float = CODE_FLUSH_MAX_AGE, on_flush: Optional[Callable[..., Awaitable]] = None,
+                 on_write: Optional[Callable[..., Awaitable]] = None):
+        self._session_factory = session_factory
+        # Awaited with the open db session and {session_id: column values} before a flush writes them,
+        # in the same transaction
+        self.on_write = on_write
+        # Awaited with the ids of the sessions a flush just committed
+        self.on_flush = on_flush
+        self.interval = interval
+        self.max_age = max_age
+        self._pending: Dict[str, PendingWrite] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _entry(self, session_id: str) -> PendingWrite:
+        now = time.monotonic()
+        entry = self._pending.get(session_id)
+        if entry is None:
+            entry = self._pending[session_id] = PendingWrite(now)
+        entry.last_dirty = now
+        return entry
+
+    def stage(self, session_id: str, **fields):
+        self._entry(session_id).fields.update(fields)
+
+    def stage_whiteboard(self, session_id: str, records: Dict[str, Optional[dict]]):
+        self._entry(session_id).records.update(records)
+
+    def pending(self, session_id: str) -> Optional[dict]:
+        entry = self._pending.get(session_id)
+        return dict(entry.fields) if entry else None
+
+    def pending_whiteboard(self, session_id: str) -> Optional[dict]:
+        entry = self._pending.get(session_id)
+        return dict(entry.records) if entry and entry.records else None
+
+    def discard(self, session_id: str, *fields: str):
+        """Drop pending values for a session, or only the given columns."""
+        if not fields:
+            self._pending.pop(session_id, None)
+            return
+        entry = self._pending.get(session_id)
+        if entry is not None:
+            for field in fields:
+                entry.fields.pop(field, None)
+
+    def clear(self):
+        self._pending.clear()
+
+    def _due(self, now: float):
+        return [
+            session_id for session_id, entry in self._pending.items()
+            if now - entry.last_dirty >= self.interval or now - entry.first_dirty >= self.max_age
+        ]
+
+    async def flush(self, session_id: str):
+        await self._write([session_id])
+
+    async def flush_all(self):
+        await self._write(list(self._pending))
+
+    async def flush_due(self):
+        await self._write(self._due(time.monotonic()))
+
+    async def _write(self, session_ids):
+        # Serialize flushes so an older snapshot can never commit after a newer one
+        async with self._flush_lock:
+            batch = {}
+            for session_id in session_ids:
+                entry = self._pending.pop(session_id, None)
+                if entry is not None:
+                    batch[session_id] = entry
+            if not batch:
+                return
+
+            try:
+                async with self._session_factory() as db:
+                    if self.on_write is not None:
+                        await self.on_write(db, {session_id: entry.fields for session_id, entry in batch.items()})
+                    for session_id, entry in batch.items():
+                        changed = list(entry.fields) + (["whiteboard"] if entry.records else [])
+                        await db.execute(
+                            update(models.Session)
+                            .where(models.Session.id == session_id)
+                            .values(**entry.fields, **revisions.bump(changed))
+                        )
+                        if entry.records:
+                            await whiteboard_store.apply_records(db, session_id, entry.records)
+                    await db.commit()
+            except Exception as e:
+                print(f"Error flushing pending writes: {e}")
+                # Put the values back unless something newer was staged meanwhile
+                for session_id, entry in batch.items():
+                    newer = self._pending.get(session_id)
+                    if newer is None:
+                        self._pending[session_id] = entry
+                    else:
+                        newer.fields = {**entry.fields, **newer.fields}
+                        newer.records = {**entry.records, **newer.records}
+                        newer.first_dirty = min(newer.first_dirty, entry.first_dirty)
+            else:
+                if self.on_flush is not None:
+                    await self.on_flush(*batch)
+
+    async def _run(self):
+        tick = max(0.05, min(self.interval, self.max_age) / 2)
+        while True:
+            await asyncio.sleep(tick)
+            await self.flush_due()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_all()
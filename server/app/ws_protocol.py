@@ -0,0 +1,57 @@
+"""uvicorn websocket protocol with a size threshold on permessage-deflate.
+
+uvicorn's wsproto protocol deflates every outgoing message once a browser
+negotiates permessage-deflate, including the many tiny cursor and presence
+frames where compression costs more CPU than it saves bytes. Run uvicorn with
+`--ws app.ws_protocol:WSProtocol` to send messages smaller than
+SOCKETIO_COMPRESSION_MIN_SIZE uncompressed (RSV1 unset, which the extension
+allows per message) and to report websocket compression in /metrics.
+"""
+import dataclasses
+import time
+
+from uvicorn.protocols.websockets import wsproto_impl
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection
+from wsproto.extensions import PerMessageDeflate
+from wsproto.frame_protocol import Opcode
+
+from .compression import COMPRESSION_SKIPPED, SOCKETIO_COMPRESSION_MIN_SIZE, observe
+
+
+class ThresholdDeflate(PerMessageDeflate):
+    minimum_size = SOCKETIO_COMPRESSION_MIN_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Whether the message being sent (possibly over several frames) went out uncompressed
+        self._skipping = False
+
+    def frame_outbound(self, proto, opcode, rsv, data, fin):
+        if not self._compressible_opcode(opcode):
+            return rsv, data
+        if opcode is not Opcode.CONTINUATION:
+            # Only a whole message can be judged; fragments are rare here (uvicorn sends one frame per message)
+            self._skipping = fin and len(data) < self.minimum_size
+            if self._skipping:
+                COMPRESSION_SKIPPED.inc("websocket", "small")
+        if self._skipping:
+            return rsv, data
+        start = time.thread_time()
+        rsv, out = super().frame_outbound(proto, opcode, rsv, data, fin)
+        observe("websocket", "deflate", len(data), len(out), time.thread_time() - start)
+        return rsv, out
+
+
+class _Connection(WSConnection):
+    def send(self, event):
+        if isinstance(event, AcceptConnection) and event.extensions:
+            extensions = [ThresholdDeflate() if type(ext) is PerMessageDeflate else ext for ext in event.extensions]
+            event = dataclasses.replace(event, extensions=extensions)
+        return super().send(event)
+
+
+class WSProtocol(wsproto_impl.WSProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.conn = _Connection(connection_type=ConnectionType.SERVER)
@@ -0,0 +1,165 @@
+"""Measure what it costs to serialize large sessions for REST and Socket.IO.
+
+Example:
+    python benchmarks/serialization.py --records 2000 --code-kb 64 --sessions 200
+    FAST_JSON=1 python benchmarks/serialization.py
+
+Builds a throwaway SQLite database with one large session (code plus a
+whiteboard of `--records` shapes) and `--sessions` ordinary ones, then times
+requests through the ASGI app in-process (no network) and the encoding of a
+whiteboard_update Socket.IO packet. Run it before and after a change to
+compare; the REST numbers include the DB read, which doesn't change between
+runs, so differences are serialization.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def shape(i):
+    return {
+        "id": f"shape:{i}", "typeName": "shape", "type": "geo", "x": i * 1.5, "y": i * 2.25,
+        "rotation": 0, "index": f"a{i}", "parentId": "page:page", "isLocked": False, "opacity": 1,
+        "props": {"w": 120, "h": 80, "geo": "rectangle", "color": "black", "fill": "none", "dash": "draw",
+                  "size": "m", "font": "draw", "text": f"node {i} ✓", "align": "middle", "verticalAlign": "middle",
+                  "growY": 0, "url": ""},
+        "meta": {},
+    }
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "min_ms": round(samples[0] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+    }
+
+
+async def timed(fn, iterations):
+    await fn()  # warm-up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def run(args):
+    from httpx import ASGITransport, AsyncClient
+    from socketio import packet
+
+    from app import main, models, migrations
+    from app.database import SessionLocal, engine
+
+    async with engine.begin() as conn:
+        await migrations.upgrade(conn)
+
+    code = ("def solve(xs):\n    return sorted(xs)\n" * (args.code_kb * 1024 // 36 + 1))[:args.code_kb * 1024]
+    board = {f"shape:{i}": shape(i) for i in range(args.records)}
+    async with SessionLocal() as db:
+        db.add(models.User(id="bench", email="bench@example.com", password="bench", name="Bench",
+                           role="interviewer"))
+        db.add(models.Session(id="big", interviewer_id="bench", candidate_name="Big", candidate_email="big@example.com",
+                              date="2030-01-01T00:00:00+00:00", duration=0, status="in-progress",
+                              language="python", code=code, output="ok\n" * 100,
+                              question={"title": "Sort", "description": "x" * 2000}))
+        db.add_all(models.WhiteboardRecord(session_id="big", record_id=k, data=v) for k, v in board.items())
+        db.add_all(models.Session(id=f"s{i:05d}", interviewer_id="bench", candidate_name=f"Candidate {i}",
+                                  candidate_email=f"c{i}@example.com", date=f"2024-01-01T00:00:{i % 60:02d}+00:00",
+                                  duration=30, status="completed", language="python",
+                                  code=code[:2048], output="", notes="notes " * 20)
+                   for i in range(args.sessions))
+        await db.commit()
+
+    report = {"records": args.records, "code_kb": args.code_kb, "sessions": args.sessions,
+              "fast_json": os.getenv("FAST_JSON", "0")}
+    headers = {"Authorization": f"Bearer {main.create_access_token({'sub': 'bench@example.com'})}"}
+    async with AsyncClient(transport=ASGITransport(app=main.fastapi_app), base_url="http://bench",
+                           headers=headers) as client:
+        async def get_big():
+            res = await client.get("/sessions/big")
+            res.raise_for_status()
+
+        async def list_full():
+            (await client.get("/sessions", params={"limit": args.sessions})).raise_for_status()
+
+        async def list_summary():
+            (await client.get("/sessions", params={"limit": args.sessions, "summary": "true"})).raise_for_status()
+
+        report["response_bytes"] = len((await client.get("/sessions/big")).content)
+        report["GET /sessions/{id}"] = await timed(get_big, args.iterations)
+        report["GET /sessions"] = await timed(list_full, args.iterations)
+        report["GET /sessions?summary=true"] = await timed(list_summary, args.iterations)
+
+    # Serialization alone for the large session: the old per-route construction (validated, then
+    # serialized through response_model) against session_out() and whatever wire() returns
+    from pydantic import TypeAdapter
+    adapter = TypeAdapter(main.Session)
+    async with SessionLocal() as db:
+        row = await db.get(models.Session, "big")
+        model = main.session_out(row, whiteboard=board)
+
+    async def legacy():
+        adapter.dump_json(adapter.validate_python(main.Session(**model.__dict__)))
+
+    async def current():
+        result = main.json_codec.wire(main.session_out(row, whiteboard=board))
+        if not isinstance(result, main.Response):
+            adapter.dump_json(adapter.validate_python(result))
+
+    report["serialize session (legacy)"] = await timed(legacy, args.iterations)
+    report["serialize session"] = await timed(current, args.iterations)
+
+    # Encoded with the packet class the server was configured with
+    packet_class = main.sio.packet_class
+    changes = {"added": {k: board[k] for k in list(board)[:args.packet_records]}}
+    event = ["whiteboard_update", {"roomId": "big", "changes": changes}]
+
+    async def encode():
+        packet_class(packet.EVENT, data=event, namespace="/").encode()
+
+    report["whiteboard_update packet"] = await timed(encode, args.iterations)
+    report["packet_class"] = packet_class.__name__
+    await engine.dispose()
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark REST and Socket.IO serialization of large sessions")
+    parser.add_argument("--records", type=int, default=2000, help="Whiteboard shapes in the large session")
+    parser.add_argument("--code-kb", type=int, default=64, help="Size of the large session's code")
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions returned by the listing benchmarks")
+    parser.add_argument("--packet-records", type=int, default=500, help="Shapes in the benchmarked Socket.IO packet")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        os.environ.setdefault("EXECUTION_WORKERS", "0")
+        # Statement logging would dominate the timings
+        os.environ.setdefault("DB_PROFILE", "test")
+        report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in report.items():
+            print(f"{name:28} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""Simulate many concurrent interview rooms against a running server.
+
+Example:
+    python loadtest.py --url http://localhost:8000 --rooms 200 --peers 3 --duration 60 --server-pid 1234
+
+Logs in as the `--email` interviewer, creates the sessions through the REST
+API, connects `--peers` Socket.IO clients per room, replays typing, cursor and
+whiteboard traffic and reports throughput, broadcast fan-out latency
+percentiles, errors and server CPU.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import socketio
+
+PROBE_PREFIX = "# probe:"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def read_cpu_seconds(pid):
+    """User + system CPU seconds of a local process, from /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf(os.sysconf_names["SC_CLK_TCK"])
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+        return (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self.sent = defaultdict(int)
+        self.received = defaultdict(int)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record_receive(self, event, sent_at):
+        self.received[event] += 1
+        if sent_at is not None:
+            self.latencies[event].append((time.monotonic() - sent_at) * 1000)
+
+
+class Peer:
+    def __init__(self, args, stats, room_id, index):
+        self.args = args
+        self.stats = stats
+        self.room_id = room_id
+        self.index = index
+        self.user_id = f"load-{room_id}-{index}"
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.code = "def solution():\n"
+        self.shapes = []
+        self._register_handlers()
+
+    def _register_handlers(self):
+        @self.client.on('code_change')
+        async def on_code_change(data):
+            self._on_event('code_change', data)
+
+        @self.client.on('cursor_move')
+        async def on_cursor_move(data):
+            self._on_event('cursor_move', data)
+
+        @self.client.on('whiteboard_update')
+        async def on_whiteboard_update(data):
+            self._on_event('whiteboard_update', data)
+
+        @self.client.on('batch')
+        async def on_batch(data):
+            for item in data.get('events', []):
+                if item.get('from') != self.client.sid:
+                    self._on_event(item['event'], item['data'])
+
+        @self.client.on('disconnect')
+        async def on_disconnect(*args):
+            if not self.args._stopping:
+                self.stats.errors['disconnect'] += 1
+
+    def _on_event(self, event, data):
+        sent_at = data.get('sentAt')
+        if sent_at is None and event == 'code_change':
+            # The server rebuilds code_change payloads, so the timestamp rides in the code
+            code = data.get('code') or ''
+            marker = code.rfind(PROBE_PREFIX)
+            if marker != -1:
+                try:
+                    sent_at = float(code[marker + len(PROBE_PREFIX):].split("\n", 1)[0])
+                except ValueError:
+                    pass
+        self.stats.record_receive(event, sent_at)
+
+    async def connect(self):
+        await self.client.connect(self.args.url, socketio_path='/socket.io', transports=['websocket'])
+        await self.client.emit('join_room', {
+            'roomId': self.room_id,
+            'user': {'id': self.user_id, 'name': f"Load {self.index}",
+                     'role': 'interviewer' if self.index == 0 else 'candidate'}
+        })
+
+    async def _emit(self, event, data):
+        try:
+            await self.client.emit(event, data)
+            self.stats.sent[event] += 1
+        except Exception:
+            self.stats.errors[f"emit_{event}"] += 1
+
+    async def _every(self, rate, action, deadline):
+        if rate <= 0:
+            return
+        # Jitter the start so rooms don't fire in lockstep
+        await asyncio.sleep(random.random() / rate)
+        while time.monotonic() < deadline:
+            await action()
+            await asyncio.sleep(min(random.expovariate(rate), max(0, deadline - time.monotonic())))
+
+    async def type_char(self):
+        self.code += random.choice(string.ascii_lowercase + "    \n()")
+        if len(self.code) > self.args.max_code:
+            self.code = "def solution():\n"
+        await self._emit('code_change', {
+            'roomId': self.room_id,
+            'code': f"{self.code}\n{PROBE_PREFIX}{time.monotonic()}",
+            'language': 'python'
+        })
+
+    async def move_cursor(self):
+        await self._emit('cursor_move', {
+            'roomId': self.room_id,
+            'line': self.code.count("\n") + 1,
+            'column': random.randint(0, 80),
+            'sentAt': time.monotonic()
+        })
+
+    async def draw(self):
+        if self.shapes and random.random() < 0.7:
+            shape_id = random.choice(self.shapes)
+            before = {'id': shape_id, 'x': 0, 'y': 0}
+            after = {'id': shape_id, 'x': random.randint(0, 800), 'y': random.randint(0, 600)}
+            changes = {'updated': {shape_id: [before, after]}}
+        else:
+            shape_id = f"shape:{self.user_id}-{len(self.shapes)}"
+            self.shapes.append(shape_id)
+            changes = {'added': {shape_id: {'id': shape_id, 'type': 'geo', 'x': 0, 'y': 0}}}
+        await self._emit('whiteboard_update', {'roomId': self.room_id, 'changes': changes, 'sentAt': time.monotonic()})
+
+    async def run(self, deadline):
+        await asyncio.gather(
+            self._every(self.args.typing_rate, self.type_char, deadline),
+            self._every(self.args.cursor_rate, self.move_cursor, deadline),
+            self._every(self.args.whiteboard_rate, self.draw, deadline),
+        )
+
+    async def close(self):
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+
+
+async def create_sessions(args, stats):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    session_ids = []
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as http:
+        # Sessions belong to the interviewer who creates them
+        res = await http.post("/auth/login", json={"email": args.email, "password": args.password})
+        res.raise_for_status()
+        http.headers["Authorization"] = f"Bearer {res.json()['token']}"
+
+        async def create(i):
+            async with semaphore:
+                try:
+                    res = await http.post("/sessions", json={
+                        "candidateName": f"Load Candidate {i}",
+                        "candidateEmail": f"load{i}@example.com",
+                        "language": "python"
+                    })
+                    res.raise_for_status()
+                    session_ids.append(res.json()["id"])
+                except Exception:
+                    stats.errors['create_session'] += 1
+
+        await asyncio.gather(*(create(i) for i in range(args.rooms)))
+    return session_ids
+
+
+async def run(args):
+    stats = Stats()
+    args._stopping = False
+
+    session_ids = await create_sessions(args, stats)
+    peers = [Peer(args, stats, room_id, i) for room_id in session_ids for i in range(args.peers)]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def connect(peer):
+        async with semaphore:
+            try:
+                await peer.connect()
+                return peer
+            except Exception:
+                stats.errors['connect'] += 1
+
+    connected = [p for p in await asyncio.gather(*(connect(p) for p in peers)) if p]
+    # Let join_room snapshots settle so they don't count as traffic
+    await asyncio.sleep(1)
+    stats.received.clear()
+
+    cpu_before = read_cpu_seconds(args.server_pid) if args.server_pid else None
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(peer.run(deadline) for peer in connected))
+    elapsed = time.monotonic() - started
+    cpu_after = read_cpu_seconds(args.server_pid) if args.server_pid else None
+    # Give in-flight broadcasts a moment to arrive
+    await asyncio.sleep(args.drain)
+
+    args._stopping = True
+    await asyncio.gather(*(peer.close() for peer in connected))
+
+    report = {
+        "rooms": len(session_ids),
+        "peers": len(connected),
+        "duration_s": round(elapsed, 2),
+        "sent_per_s": {e: round(n / elapsed, 1) for e, n in stats.sent.items()},
+        "received_per_s": {e: round(n / elapsed, 1) for e, n in stats.received.items()},
+        "fanout_latency_ms": {
+            e: {f"p{p}": round(percentile(values, p), 2) for p in (50, 95, 99)}
+            for e, values in stats.latencies.items() if values
+        },
+        "errors": dict(stats.errors),
+        "server_cpu_percent": (
+            round((cpu_after - cpu_before) / elapsed * 100, 1)
+            if cpu_before is not None and cpu_after is not None else None
+        ),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\nRooms: {report['rooms']}  Peers: {report['peers']}  Duration: {report['duration_s']}s")
+    print("\nThroughput (events/s)      sent    received")
+    for event in sorted(set(report["sent_per_s"]) | set(report["received_per_s"])):
+        print(f"  {event:<22} {report['sent_per_s'].get(event, 0):>8} {report['received_per_s'].get(event, 0):>10}")
+    print("\nFan-out latency (ms)        p50       p95       p99")
+    for event, pcts in sorted(report["fanout_latency_ms"].items()):
+        print(f"  {event:<22} {pcts['p50']:>8} {pcts['p95']:>9} {pcts['p99']:>9}")
+    print(f"\nErrors: {report['errors'] or 'none'}")
+    if report["server_cpu_percent"] is not None:
+        print(f"Server CPU: {report['server_cpu_percent']}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test DevInterview rooms over REST + Socket.IO")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="interviewer@example.com", help="Interviewer account that owns the rooms")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--peers", type=int, default=2, help="Socket.IO clients per room")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--typing-rate", type=float, default=5, help="code_change events/s per peer")
+    parser.add_argument("--cursor-rate", type=float, default=10, help="cursor_move events/s per peer")
+    parser.add_argument("--whiteboard-rate", type=float, default=2, help="whiteboard_update events/s per peer")
+    parser.add_argument("--max-code", type=int, default=4000, help="Reset the typed document after this many chars")
+    parser.add_argument("--concurrency", type=int, default=50, help="Parallel session creations / connects")
+    parser.add_argument("--drain", type=float, default=1.0, help="Seconds to wait for late broadcasts")
+    parser.add_argument("--server-pid", type=int, help="Local server PID to sample CPU from /proc")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,19 @@
+import os
 import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+# Tests that need the sandbox pool start their own (see test_execution.py)
+os.environ.setdefault("EXECUTION_WORKERS", "0")
+# Quiet engine without fsyncs; also inherited by the uvicorn subprocess in `server`
+os.environ.setdefault("DB_PROFILE", "test")
+
 from app.database import Base, get_db
-from app.main import app, fastapi_app
+from app.main import app, fastapi_app, create_access_token
+from app import models
 import asyncio
 from fastapi.testclient import TestClient
+from httpx import AsyncClient, ASGITransport
 
 # Use in-memory SQLite for tests
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -47,10 +55,42 @@ def override_dependency(test_db):
     # Also override SessionLocal in main.py for Socket.IO handlers
     import app.main
     app.main.SessionLocal = TestingSessionLocal
+    app.main.write_buffer.clear()
+    app.main.session_cache.clear()
+    app.main.recorder.clear()
+    app.main.rooms.clear()
+    app.main.cursors.clear()
+    app.main.broadcaster.clear()
+    app.main.whiteboard_store._migrated.clear()
+
+@pytest_asyncio.fixture(autouse=True)
+async def stop_room_actors():
+    yield
+    # Room actors run on the test's event loop; don't let them outlive it
+    import app.main
+    await app.main.rooms.stop()
+
+# Owner of the sessions the test clients create
+INTERVIEWER_ID = "interviewer-1"
+
+@pytest_asyncio.fixture
+async def auth_headers(test_db):
+    """Bearer token of an interviewer account in the test database."""
+    test_db.add(models.User(id=INTERVIEWER_ID, email="ivy@example.com", password="password123",
+                            name="Ivy Interviewer", role="interviewer"))
+    await test_db.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'ivy@example.com'})}"}
 
 @pytest.fixture
-def client():
-    with TestClient(app) as c:
+def client(auth_headers):
+    with TestClient(app, headers=auth_headers) as c:
+        yield c
+
+@pytest_asyncio.fixture
+async def api(auth_headers):
+    """Async client for tests that drive the REST app on the test's own event loop."""
+    async with AsyncClient(transport=ASGITransport(app=fastapi_app), base_url="http://test",
+                           headers=auth_headers) as c:
         yield c
 
 @pytest_asyncio.fixture(scope="function")
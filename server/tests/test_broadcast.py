@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.broadcast import RoomBatch, RoomBroadcaster, merge_whiteboard_changes
+
+
+def test_merge_whiteboard_changes_keeps_latest_record_state():
+    first = {"added": {"shape:1": {"x": 0}}, "updated": {"shape:2": [{"x": 0}, {"x": 1}]}}
+    second = {"updated": {"shape:1": [{"x": 0}, {"x": 5}], "shape:2": [{"x": 1}, {"x": 2}]},
+              "removed": {"shape:3": {"x": 9}}}
+    third = {"added": {"shape:4": {"x": 4}}, "removed": {"shape:4": {"x": 4}}}
+
+    merged = merge_whiteboard_changes(merge_whiteboard_changes(first, second), third)
+    assert merged["added"] == {"shape:1": {"x": 5}}
+    assert merged["updated"] == {"shape:2": [{"x": 0}, {"x": 2}]}
+    # Added then removed within the batch never reaches peers
+    assert merged["removed"] == {"shape:3": {"x": 9}}
+
+
+@pytest.mark.asyncio
+async def test_events_are_batched_per_room_per_tick():
+    emit = AsyncMock()
+    broadcaster = RoomBroadcaster(emit, tick_ms=50, max_batch=100)
+
+    for i in range(5):
+        await broadcaster.send("room1", "cursor_move", {"roomId": "room1", "column": i}, skip_sid="a")
+        await broadcaster.send("room1", "whiteboard_update",
+                               {"roomId": "room1", "changes": {"added": {f"shape:{i}": {}}}}, skip_sid="a")
+    await broadcaster.send("room1", "code_change", {"code": "x"}, skip_sid="b")
+    await broadcaster.send("room2", "cursor_move", {"roomId": "room2", "column": 0}, skip_sid="c")
+    assert emit.await_count == 0
+
+    await broadcaster.flush()
+
+    assert emit.await_count == 2
+    batches = {c.kwargs["room"]: c.args[1]["events"] for c in emit.await_args_list}
+    room1 = batches["room1"]
+    assert [item["event"] for item in room1] == ["cursor_move", "whiteboard_update", "code_change"]
+    assert room1[0]["data"]["column"] == 4
+    assert room1[0]["from"] == "a"
+    assert len(room1[1]["data"]["changes"]["added"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_early_and_disabled_mode_passes_through():
+    emit = AsyncMock()
+    broadcaster = RoomBroadcaster(emit, tick_ms=50, max_batch=2)
+    await broadcaster.send("room1", "code_delta", {"ops": [1]}, skip_sid="a")
+    await broadcaster.send("room1", "code_delta", {"ops": [2]}, skip_sid="a")
+    # Deltas are never merged, and the second one filled the batch
+    assert emit.await_count == 1
+    assert len(emit.await_args.args[1]["events"]) == 2
+
+    emit = AsyncMock()
+    broadcaster = RoomBroadcaster(emit, tick_ms=0)
+    await broadcaster.send("room1", "cursor_move", {"column": 1}, skip_sid="a")
+    emit.assert_awaited_once_with("cursor_move", {"column": 1}, room="room1", skip_sid="a")
+
+
+def test_interleaved_senders_end_on_the_newest_state():
+    batch = RoomBatch()
+    batch.add("code_change", {"code": "v1"}, "a")
+    batch.add("code_change", {"code": "v2"}, "b")
+    batch.add("code_change", {"code": "v3"}, "a")
+    assert [(item["from"], item["data"]["code"]) for item in batch.items] == [("b", "v2"), ("a", "v3")]
+
+    batch = RoomBatch()
+    batch.add("whiteboard_update", {"changes": {"added": {"x": {"v": 1}}}}, "a")
+    batch.add("whiteboard_update", {"changes": {"removed": {"x": {"v": 1}}}}, "b")
+    batch.add("whiteboard_update", {"changes": {"added": {"x": {"v": 2}}}}, "a")
+    # Not folded into a's first diff: that would apply b's removal last
+    assert [(item["from"], item["data"]["changes"]) for item in batch.items] == [
+        ("a", {"added": {"x": {"v": 1}}}),
+        ("b", {"removed": {"x": {"v": 1}}}),
+        ("a", {"added": {"x": {"v": 2}}}),
+    ]
+
+    # Other events in between don't stop a sender's diffs from merging
+    batch = RoomBatch()
+    batch.add("whiteboard_update", {"changes": {"added": {"y": {}}}}, "a")
+    batch.add("cursor_move", {"column": 1}, "b")
+    batch.add("whiteboard_update", {"changes": {"added": {"z": {}}}}, "a")
+    assert [item["event"] for item in batch.items] == ["cursor_move", "whiteboard_update"]
+    assert set(batch.items[1]["data"]["changes"]["added"]) == {"y", "z"}
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app import models, text_ot
+from app.main import code_delta, code_change, join_room, rooms, write_buffer
+
+
+def test_transform_converges_for_concurrent_edits():
+    doc = "hello world"
+    a = text_ot.diff(doc, "hello brave world")
+    b = text_ot.diff(doc, "hello world!")
+    a_prime, b_prime = text_ot.transform(a, b)
+    assert text_ot.apply(text_ot.apply(doc, a), b_prime) == text_ot.apply(text_ot.apply(doc, b), a_prime)
+    assert text_ot.apply(text_ot.apply(doc, a), b_prime) == "hello brave world!"
+
+
+def test_overlapping_deletes_converge():
+    doc = "abcdef"
+    a = [1, -3, 2]      # delete "bcd"
+    b = [2, -3, 1]      # delete "cde"
+    a_prime, b_prime = text_ot.transform(a, b)
+    assert text_ot.apply(text_ot.apply(doc, a), b_prime) == "af"
+    assert text_ot.apply(text_ot.apply(doc, b), a_prime) == "af"
+
+
+def test_apply_rejects_mismatched_operation():
+    with pytest.raises(ValueError):
+        text_ot.apply("abc", [5])
+    with pytest.raises(ValueError):
+        text_ot.apply("abc", [3, 0])
+
+
+async def _create_session(test_db, session_id, code):
+    test_db.add(models.Session(
+        id=session_id,
+        candidate_name="Test",
+        candidate_email="test@example.com",
+        date="2024-01-01",
+        duration=0,
+        status="scheduled",
+        language="python",
+        code=code
+    ))
+    await test_db.commit()
+
+
+def _emitted(mock_emit, event):
+    return [c for c in mock_emit.await_args_list if c.args[0] == event]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deltas_are_rebased_on_the_server(test_db):
+    session_id = "test-delta-rebase"
+    await _create_session(test_db, session_id, "print(1)")
+
+    with patch('app.main.sio.emit', new_callable=AsyncMock) as mock_emit, \
+            patch('app.main.sio.enter_room', new_callable=AsyncMock):
+        await join_room("sid-a", {"roomId": session_id, "protocol": "delta",
+                                  "user": {"id": "a", "name": "A", "role": "interviewer"}})
+        snapshot = _emitted(mock_emit, 'code_change')[0].args[1]
+        assert snapshot["revision"] == 0
+        epoch = snapshot["epoch"]
+
+        # Both clients edit revision 0 without seeing each other's change
+        await code_delta("sid-a", {"roomId": session_id, "epoch": epoch, "baseRevision": 0,
+                                   "ops": ["# a\n", 8]})
+        await code_delta("sid-b", {"roomId": session_id, "epoch": epoch, "baseRevision": 0,
+                                   "ops": [6, -1, "2", 1]})
+
+        state = rooms.get(session_id).state
+        assert state.code == "# a\nprint(2)"
+        assert state.revision == 2
+
+        # Peers get the rebased operation, not the document
+        deltas = _emitted(mock_emit, 'code_delta')
+        assert deltas[-1].args[1]["ops"] == [10, "2", -1, 1]
+        assert deltas[-1].args[1]["revision"] == 2
+        acks = _emitted(mock_emit, 'code_ack')
+        assert [c.args[1]["revision"] for c in acks] == [1, 2]
+
+        # Clients without delta support still get the full text
+        full = [c for c in _emitted(mock_emit, 'code_change') if c.kwargs.get('room') == f"{session_id}:full"]
+        assert full[-1].args[1]["code"] == "# a\nprint(2)"
+
+    assert write_buffer.pending(session_id)["code"] == "# a\nprint(2)"
+
+
+@pytest.mark.asyncio
+async def test_stale_or_foreign_delta_triggers_full_resync(test_db):
+    session_id = "test-delta-resync"
+    await _create_session(test_db, session_id, "x")
+
+    with patch('app.main.sio.emit', new_callable=AsyncMock) as mock_emit:
+        # A full-text client keeps the revision history going
+        await code_change("sid-legacy", {"roomId": session_id, "code": "xy", "language": "python"})
+        await code_delta("sid-a", {"roomId": session_id, "epoch": "old-epoch", "baseRevision": 0, "ops": [1, "z"]})
+
+        resyncs = _emitted(mock_emit, 'code_resync')
+        assert len(resyncs) == 1
+        assert resyncs[0].kwargs['room'] == "sid-a"
+        assert resyncs[0].args[1]["code"] == "xy"
+        assert resyncs[0].args[1]["revision"] == 1
+
+    assert rooms.get(session_id).state.code == "xy"
@@ -0,0 +1,93 @@
+import asyncio
+import gzip
+import zlib
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection, Message, Request
+from wsproto.extensions import PerMessageDeflate
+
+from app import compression
+from app.ws_protocol import ThresholdDeflate, _Connection
+
+
+def test_large_responses_are_gzipped_small_ones_are_not(client):
+    res = client.post("/sessions", json={"candidateName": "Z", "candidateEmail": "z@example.com",
+                                         "language": "python"})
+    session_id = res.json()["id"]
+    client.post(f"/sessions/{session_id}/save_code", json={"code": "print('hello')\n" * 500})
+    before = compression.COMPRESSION_INPUT_BYTES.value("http", "gzip")
+
+    res = client.get(f"/sessions/{session_id}", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    assert res.json()["code"].startswith("print('hello')")
+    compressed = compression.COMPRESSION_INPUT_BYTES.value("http", "gzip") - before
+    assert compressed > 7000
+    assert compression.COMPRESSION_OUTPUT_BYTES.value("http", "gzip") < compression.COMPRESSION_INPUT_BYTES.value(
+        "http", "gzip")
+
+    res = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    res = client.get(f"/sessions/{session_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.json()["id"] == session_id
+
+
+def test_choose_encoding_honours_preference_and_q_values(monkeypatch):
+    assert compression.choose_encoding("gzip, deflate", ["gzip"]) == "gzip"
+    assert compression.choose_encoding("gzip;q=0", ["gzip"]) is None
+    assert compression.choose_encoding("*", ["gzip"]) == "gzip"
+    assert compression.choose_encoding("", ["gzip"]) is None
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.choose_encoding("br, gzip", ["br", "gzip"]) == "gzip"
+
+
+def _handshake():
+    server = _Connection(ConnectionType.SERVER)
+    client = WSConnection(ConnectionType.CLIENT)
+    server.receive_data(client.send(Request(host="test", target="/socket.io/", extensions=[PerMessageDeflate()])))
+    request = next(server.events())
+    # What uvicorn's protocol sends with --ws-per-message-deflate (the default)
+    client.receive_data(server.send(AcceptConnection(extensions=[PerMessageDeflate()])))
+    accepted = next(client.events())
+    assert [ext.name for ext in accepted.extensions] == ["permessage-deflate"] and request.extensions
+    return server, client
+
+
+def test_small_websocket_frames_skip_deflate(monkeypatch):
+    monkeypatch.setattr(ThresholdDeflate, "minimum_size", 100)
+    server, client = _handshake()
+    before = compression.COMPRESSION_SKIPPED.value("websocket", "small")
+
+    small = server.send(Message(data='42["cursor_move",{"x":1}]'))
+    assert small[0] & 0x40 == 0  # RSV1 unset: sent as is
+    big_text = '42["whiteboard_update",' + '{"id":"shape:1","x":1}' * 100 + "]"
+    big = server.send(Message(data=big_text))
+    assert big[0] & 0x40
+    assert len(big) < len(big_text) / 4
+
+    client.receive_data(small + big)
+    assert [event.data for event in client.events()] == ['42["cursor_move",{"x":1}]', big_text]
+    assert compression.COMPRESSION_SKIPPED.value("websocket", "small") == before + 1
+    assert compression.COMPRESSION_OUTPUT_BYTES.value("websocket", "deflate") > 0
+
+
+def test_streamed_bodies_are_compressed_per_chunk():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        await send({"type": "http.response.body", "body": b'{"seq":1}\n', "more_body": True})
+        await send({"type": "http.response.body", "body": b'{"seq":2}\n', "more_body": False})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(compression.CompressionMiddleware(app, minimum_size=8, encodings=["gzip"])(scope, None, send))
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    # Past the threshold each chunk is flushed, so the first line can be decoded before the stream ends
+    assert zlib.decompressobj(31).decompress(sent[1]["body"]) == b'{"seq":1}\n'
+    assert gzip.decompress(b"".join(m["body"] for m in sent[1:])) == b'{"seq":1}\n{"seq":2}\n'
@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.main import cursor_move, cursors
+from app.cursors import CursorCoalescer
+
+
+@pytest.mark.asyncio
+async def test_cursor_moves_are_coalesced_per_connection():
+    with patch('app.main.sio.emit', new_callable=AsyncMock) as mock_emit:
+        for column in range(10):
+            await cursor_move("sid-a", {"roomId": "room1", "line": 1, "column": column})
+        await cursor_move("sid-b", {"roomId": "room1", "line": 5, "column": 0})
+
+        # Nothing goes out until the tick
+        assert mock_emit.await_count == 0
+        await cursors.flush()
+
+    assert mock_emit.await_count == 2
+    sent = {call.kwargs['skip_sid']: call.args[1] for call in mock_emit.await_args_list}
+    assert sent["sid-a"]["column"] == 9
+    assert sent["sid-b"]["line"] == 5
+
+
+@pytest.mark.asyncio
+async def test_budget_drops_superseded_updates_instead_of_queueing():
+    emit = AsyncMock()
+    coalescer = CursorCoalescer(emit, tick_ms=40, budget=2)
+
+    for i in range(5):
+        await coalescer.push("sid", {"roomId": "r", "column": i})
+        await coalescer.flush()
+
+    # Two broadcasts fit in the budget; the rest wait as a single pending position
+    assert emit.await_count == 2
+    assert coalescer._latest["sid"]["column"] == 4
+    assert coalescer.superseded == 2
+
+
+@pytest.mark.asyncio
+async def test_zero_tick_disables_coalescing():
+    emit = AsyncMock()
+    coalescer = CursorCoalescer(emit, tick_ms=0)
+    await coalescer.push("sid", {"roomId": "r", "column": 1})
+    emit.assert_awaited_once_with("sid", {"roomId": "r", "column": 1})
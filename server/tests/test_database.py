@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import text
+
+from app import database
+
+
+def test_profiles_and_overrides():
+    prod = database.engine_settings("prod", environ={})
+    assert prod["echo"] is False and prod["pool_pre_ping"] is True
+    assert database.engine_settings("dev", environ={})["echo"] is True
+
+    tuned = database.engine_settings("prod", environ={"DB_POOL_SIZE": "3", "DB_ECHO": "true",
+                                                       "DB_POOL_TIMEOUT": "2.5", "DB_STATEMENT_CACHE_SIZE": ""})
+    assert tuned["pool_size"] == 3 and tuned["echo"] is True and tuned["pool_timeout"] == 2.5
+    assert tuned["statement_cache_size"] == prod["statement_cache_size"]
+
+    with pytest.raises(ValueError):
+        database.engine_settings("staging", environ={})
+
+
+def test_postgres_engine_gets_pool_and_statement_cache():
+    pytest.importorskip("asyncpg")
+    settings = database.engine_settings("prod", environ={"DB_STATEMENT_CACHE_SIZE": "0"})
+    # Nothing connects until first use
+    engine = database.make_engine("postgresql+asyncpg://u:p@db.invalid/app", settings)
+    assert engine.pool.size() == settings["pool_size"]
+    assert engine.pool._recycle == 1800 and engine.pool._pre_ping
+    assert engine.echo is False
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas_are_applied_on_connect(tmp_path):
+    settings = database.engine_settings("prod", environ={"SQLITE_BUSY_TIMEOUT": "1234"})
+    engine = database.make_engine(f"sqlite+aiosqlite:///{tmp_path}/app.db", settings)
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 1234
+            # NORMAL
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+    finally:
+        await engine.dispose()
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import pwd
+import shutil
+import tempfile
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+
+from app.execution import ExecutionPool, ExecutionError, ExecutionQueueFull, ExecutionUnavailable
+
+
+@pytest_asyncio.fixture
+async def pool(tmp_path):
+    pool = ExecutionPool(workers_per_language=1, max_concurrency=1, queue_per_room=3,
+                         limits={"wall_seconds": 2, "cpu_seconds": 1, "output_bytes": 1000}, root=str(tmp_path),
+                         languages=["python"], allow_unisolated=True)
+    await pool.start()
+    yield pool
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_runs_python_with_stdin(pool):
+    result = await pool.run("room-1", "python", "import sys\nprint(sys.stdin.read().upper())", stdin="hello")
+    assert result["stdout"] == "HELLO\n"
+    assert result["exitCode"] == 0
+    assert result["language"] == "python"
+
+
+@pytest.mark.asyncio
+async def test_limits_are_enforced(pool):
+    result = await pool.run("room-1", "python", "import time\ntime.sleep(5)")
+    assert result["timedOut"]
+
+    result = await pool.run("room-1", "python", "while True: print('x' * 100)")
+    assert result["truncated"]
+    assert len(result["stdout"]) <= 1000
+
+    result = await pool.run("room-1", "python", "raise ValueError('boom')")
+    assert result["exitCode"] == 1
+    assert "ValueError: boom" in result["stderr"]
+
+
+@pytest.mark.asyncio
+async def test_rooms_are_served_round_robin(pool):
+    order = []
+
+    async def run(room, tag):
+        await pool.run(room, "python", f"print({tag!r})")
+        order.append(tag)
+
+    tasks = [asyncio.create_task(run("room-a", f"a{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(run("room-b", "b0")))
+    await asyncio.gather(*tasks)
+
+    # room-b's single run goes ahead of room-a's backlog
+    assert order.index("b0") < order.index("a2")
+
+
+@pytest.mark.asyncio
+async def test_rejects_bad_requests(pool):
+    with pytest.raises(ExecutionError):
+        await pool.run("room-1", "cobol", "DISPLAY 'HI'.")
+
+    blockers = [asyncio.create_task(pool.run("room-1", "python", "import time; time.sleep(0.3)")) for _ in range(4)]
+    await asyncio.sleep(0)
+    with pytest.raises(ExecutionQueueFull):
+        await pool.run("room-1", "python", "print(1)")
+    await asyncio.gather(*blockers)
+
+
+@pytest.mark.asyncio
+async def test_disabled_pool_is_unavailable(tmp_path):
+    pool = ExecutionPool(workers_per_language=0, root=str(tmp_path))
+    await pool.start()
+    with pytest.raises(ExecutionUnavailable):
+        await pool.run("room-1", "python", "print(1)")
+
+    # Workers alone aren't enough: without an account to run code as, the pool stays off
+    pool = ExecutionPool(workers_per_language=1, root=str(tmp_path), languages=["python"], user="",
+                         allow_unisolated=False)
+    await pool.start()
+    with pytest.raises(ExecutionUnavailable):
+        await pool.run("room-1", "python", "print(1)")
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="switching users needs root")
+@pytest.mark.asyncio
+async def test_runs_are_isolated_from_the_server(tmp_path, monkeypatch):
+    monkeypatch.setenv("SECRET_THING", "hunter2")
+    secret_file = tmp_path / "secret.db"
+    secret_file.write_text("rows")
+    secret_file.chmod(0o600)
+    # Somewhere the account can reach (pytest's own tmp dirs are private to root)
+    root = tempfile.mkdtemp(prefix="exec-test-")
+    pool = ExecutionPool(workers_per_language=1, root=root, languages=["python"], user="nobody")
+    await pool.start()
+    code = (
+        "import os\n"
+        "print(os.getuid(), 'SECRET_THING' in os.environ)\n"
+        f"for path in ('/proc/{os.getpid()}/environ', '{secret_file}'):\n"
+        "    try:\n"
+        "        open(path).read(); print('read')\n"
+        "    except PermissionError:\n"
+        "        print('denied')\n"
+        "# Network interfaces the run can see\n"
+        "print(','.join(line.split(':')[0].strip() for line in open('/proc/net/dev').readlines()[2:]))\n"
+    )
+    try:
+        result = await pool.run("room-1", "python", code)
+    finally:
+        await pool.stop()
+        shutil.rmtree(root, ignore_errors=True)
+    assert result["stdout"].split() == [str(pwd.getpwnam("nobody").pw_uid), "False", "denied", "denied", "lo"]
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="switching users needs root")
+@pytest.mark.asyncio
+async def test_runs_cannot_fork_without_bound_or_outlive_the_run():
+    root = tempfile.mkdtemp(prefix="exec-test-")
+    uid = pwd.getpwnam("nobody").pw_uid
+    before = _processes_of(uid)
+    pool = ExecutionPool(workers_per_language=1, root=root, languages=["python"], user="nobody",
+                         limits={"processes": 32, "wall_seconds": 3})
+    await pool.start()
+    bomb = (
+        "import os, sys, time\n"
+        "children = 0\n"
+        "try:\n"
+        "    for _ in range(1000):\n"
+        "        if os.fork() == 0:\n"
+        "            time.sleep(60); os._exit(0)\n"
+        "        children += 1\n"
+        "except OSError:\n"
+        "    pass\n"
+        "print(children < 32)\n"
+        "sys.stdout.flush()\n"
+        "# Leave the process group, as if to dodge the cleanup\n"
+        "if os.fork() == 0:\n"
+        "    os.setsid(); time.sleep(60)\n"
+    )
+    try:
+        result = await pool.run("room-1", "python", bomb)
+    finally:
+        await pool.stop()
+        shutil.rmtree(root, ignore_errors=True)
+    assert result["stdout"] == "True\n" and not result["timedOut"]
+    assert _processes_of(uid) <= before
+
+
+def _processes_of(uid):
+    pids = set()
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            if os.stat(f"/proc/{pid}").st_uid == uid:
+                pids.add(pid)
+        except FileNotFoundError:
+            pass
+    return pids
+
+
+@pytest.mark.asyncio
+async def test_execute_endpoint_broadcasts_result(pool, monkeypatch, auth_headers):
+    import app.main
+    from httpx import ASGITransport, AsyncClient
+
+    monkeypatch.setattr(app.main, "execution", pool)
+    async with AsyncClient(transport=ASGITransport(app=app.main.fastapi_app), base_url="http://test",
+                           headers=auth_headers) as client:
+        res = await client.post("/sessions", json={"candidateName": "E", "candidateEmail": "e@example.com",
+                                                  "language": "python"})
+        session_id = res.json()["id"]
+
+        with patch("app.main.sio.emit", new_callable=AsyncMock) as mock_emit:
+            res = await client.post(f"/sessions/{session_id}/execute", json={"code": "print(6 * 7)", "language": "python"})
+        assert res.status_code == 200
+        assert res.json()["stdout"] == "42\n"
+        event, payload = mock_emit.call_args.args[:2]
+        assert event == "execution_result"
+        assert payload["output"] == "42\n"
+
+        res = await client.post("/sessions/missing/execute", json={"code": "1", "language": "python"})
+        assert res.status_code == 404
+
+    # Without the interviewer's token, only a connection that joined the room can run code
+    monkeypatch.setitem(app.main.sid_map, "sid-in-room", (session_id, "candidate"))
+    monkeypatch.setitem(app.main.sid_map, "sid-elsewhere", ("other-room", "candidate"))
+    async with AsyncClient(transport=ASGITransport(app=app.main.fastapi_app), base_url="http://test") as anonymous:
+        body = {"code": "print(1)", "language": "python"}
+        assert (await anonymous.post(f"/sessions/{session_id}/execute", json=body)).status_code == 403
+        res = await anonymous.post(f"/sessions/{session_id}/execute", json=body,
+                                   headers={"X-Socket-Id": "sid-elsewhere"})
+        assert res.status_code == 403
+        with patch("app.main.sio.emit", new_callable=AsyncMock):
+            res = await anonymous.post(f"/sessions/{session_id}/execute", json=body,
+                                       headers={"X-Socket-Id": "sid-in-room"})
+        assert res.json()["stdout"] == "1\n"
+
+
+@pytest.mark.asyncio
+async def test_output_is_streamed_and_only_the_tail_kept(pool):
+    chunks = []
+
+    async def on_output(stream, text):
+        chunks.append((stream, text))
+
+    code = "import sys, time\nfor i in range(3):\n    print(i, flush=True)\n    time.sleep(0.1)\nprint('x' * 3000)\nprint('err', file=sys.stderr)"
+    result = await pool.run("room-1", "python", code, on_output=on_output)
+
+    streamed = "".join(text for stream, text in chunks if stream == "stdout")
+    assert streamed.startswith("0\n1\n2\n")
+    assert len(streamed) == 6 + 3001
+    assert ("stderr", "err\n") in chunks
+    # Chunks arrived while the program was still sleeping between prints
+    assert len([c for c in chunks if c[0] == "stdout"]) >= 3
+
+    assert result["truncated"]
+    assert not result["outputLimitExceeded"]
+    assert len(result["stdout"]) == 1000
+    assert result["stdout"].endswith("x\n")
+
+
+@pytest.mark.asyncio
+async def test_runaway_output_is_stopped(tmp_path):
+    pool = ExecutionPool(workers_per_language=1, limits={"output_bytes": 100, "max_output_bytes": 10000},
+                         root=str(tmp_path), languages=["python"], allow_unisolated=True)
+    await pool.start()
+    try:
+        result = await pool.run("room-1", "python", "while True: print('spam')")
+    finally:
+        await pool.stop()
+    assert result["outputLimitExceeded"]
+    assert result["outputBytes"] == 10000
+    assert len(result["stdout"]) <= 100
+
+
+@pytest.mark.asyncio
+async def test_reported_output_is_capped_before_persisting(monkeypatch):
+    import app.main
+
+    monkeypatch.setattr(app.main, "tail", lambda text, limit=10: text[-limit:] if text else text)
+    with patch("app.main.sio.emit", new_callable=AsyncMock) as mock_emit:
+        await app.main.publish_execution_result("room-x", {"roomId": "room-x", "output": "a" * 50 + "END"})
+    assert mock_emit.call_args.args[1]["output"] == "aaaaaaaEND"
+    assert app.main.write_buffer.pending("room-x")["output"] == "aaaaaaaEND"
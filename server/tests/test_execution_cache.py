@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+from app.execution import ExecutionPool
+from app.execution_cache import ExecutionCache, cache_key
+
+LIMITS = {"cpu_seconds": 5}
+
+
+def result(stdout="", **extra):
+    return {"stdout": stdout, "stderr": "", "exitCode": 0, "timedOut": False, "cpuLimitExceeded": False, **extra}
+
+
+def test_key_covers_everything_that_changes_output():
+    base = cache_key("python", "3.12", "print(1)", "", LIMITS)
+    assert base == cache_key("python", "3.12", "print(1)", "", LIMITS)
+    assert base != cache_key("python", "3.13", "print(1)", "", LIMITS)
+    assert base != cache_key("python", "3.12", "print(2)", "", LIMITS)
+    assert base != cache_key("python", "3.12", "print(1)", "x", LIMITS)
+    assert base != cache_key("python", "3.12", "print(1)", "", {"cpu_seconds": 1})
+
+
+def test_lru_and_byte_budget():
+    cache = ExecutionCache(max_entries=2, ttl=60, max_bytes=10)
+    cache.put("a", result("1"))
+    cache.put("b", result("2"))
+    assert cache.get("a")["stdout"] == "1"  # a is now most recent
+    cache.put("c", result("3"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    cache.put("big", result("x" * 10))
+    assert len(cache) == 1 and cache.bytes == 10
+    cache.put("huge", result("x" * 11))
+    assert cache.get("huge") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_ttl_and_uncacheable_results(monkeypatch):
+    cache = ExecutionCache(max_entries=10, ttl=5, max_bytes=1000)
+    now = time.monotonic()
+    monkeypatch.setattr("app.execution_cache.time.monotonic", lambda: now)
+    cache.put("a", result("1"))
+    cache.put("slow", result("", timedOut=True))
+    assert cache.get("slow") is None
+    cache.put("killed", result("", exitCode=-9))
+    assert cache.get("killed") is None
+
+    monkeypatch.setattr("app.execution_cache.time.monotonic", lambda: now + 6)
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+
+
+@pytest_asyncio.fixture
+async def pool(tmp_path):
+    pool = ExecutionPool(workers_per_language=1, max_concurrency=1, root=str(tmp_path), languages=["python"],
+                         cache=ExecutionCache(max_entries=10, ttl=60, max_bytes=10000), allow_unisolated=True)
+    await pool.start()
+    yield pool
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_reruns_are_served_from_cache(pool):
+    code = "import time\ntime.sleep(0.2)\nprint('done')"
+    first = await pool.run("room-1", "python", code)
+    assert first["cached"] is False
+
+    chunks = []
+
+    async def on_output(stream, text):
+        chunks.append((stream, text))
+
+    started = time.monotonic()
+    second = await pool.run("room-2", "python", code, on_output=on_output)
+    assert second["cached"] is True
+    assert second["stdout"] == "done\n"
+    assert time.monotonic() - started < 0.1
+    # Listeners still see the output as if it had been streamed
+    assert chunks == [("stdout", "done\n")]
+
+    bypass = await pool.run("room-1", "python", code, use_cache=False)
+    assert bypass["cached"] is False
+    assert pool.cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_runs_share_one_execution(pool):
+    code = "import time\ntime.sleep(0.3)\nprint('once')"
+    results = await asyncio.gather(*(pool.run(f"room-{i}", "python", code) for i in range(3)))
+    assert [r["stdout"] for r in results] == ["once\n"] * 3
+    # Sharing a run isn't a cache hit
+    assert [r["cached"] for r in results] == [False] * 3
+    assert pool.cache.hits == 0
+    assert (await pool.run("room-0", "python", code))["cached"] is True
+
+
+@pytest.mark.asyncio
+async def test_timed_out_runs_are_not_shared(tmp_path):
+    pool = ExecutionPool(workers_per_language=1, max_concurrency=1, root=str(tmp_path), languages=["python"],
+                         limits={"wall_seconds": 0.3}, cache=ExecutionCache(max_entries=10, ttl=60, max_bytes=10000),
+                         allow_unisolated=True)
+    await pool.start()
+    executed = []
+    enqueue = pool._enqueue
+
+    async def counting_enqueue(room_id, *args):
+        executed.append(room_id)
+        return await enqueue(room_id, *args)
+
+    pool._enqueue = counting_enqueue
+    try:
+        code = "import time\ntime.sleep(5)"
+        results = await asyncio.gather(*(pool.run(f"room-{i}", "python", code) for i in range(2)))
+        assert [r["timedOut"] for r in results] == [True, True]
+        assert [r["cached"] for r in results] == [False, False]
+        # The second caller waited for the first run, then ran on its own
+        assert executed == ["room-0", "room-1"]
+        assert len(pool.cache) == 0
+    finally:
+        await pool.stop()
@@ -0,0 +1,66 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+import pytest_asyncio
+
+from app import export, models
+from tests.conftest import INTERVIEWER_ID, TestingSessionLocal
+
+
+@pytest_asyncio.fixture
+async def sessions(test_db):
+    for i, date in enumerate(("2024-01-31T23:59:00+00:00", "2024-02-01T09:00:00+00:00",
+                              "2024-02-29T18:30:00+00:00", "2024-03-01T00:00:00+00:00")):
+        test_db.add(models.Session(id=f"s{i}", candidate_name=f"Candidate, {i}", candidate_email=f"c{i}@example.com",
+                                   date=date, duration=30, score=i * 10, status="completed", language="python",
+                                   question={"title": "Two Sum"}, interviewer_id=INTERVIEWER_ID))
+    await test_db.commit()
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_selects_fields_and_days(api, sessions):
+    res = await api.get("/sessions/export", params={"fields": "id,score,question", "from": "2024-02-01",
+                                                    "to": "2024-02-29"})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    assert res.headers["content-disposition"] == 'attachment; filename="sessions.ndjson"'
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert rows == [
+        {"id": "s1", "score": 10, "question": {"title": "Two Sum"}},
+        {"id": "s2", "score": 20, "question": {"title": "Two Sum"}},
+    ]
+
+    assert (await api.get("/sessions/export", params={"fields": "id,password"})).status_code == 400
+    assert (await api.get("/sessions/export", params={"from": "last week"})).status_code == 400
+    assert (await api.get("/sessions/export", params={"format": "xml"})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_csv_export_as_gzip_file(api, sessions):
+    res = await api.get("/sessions/export", params={"format": "csv", "fields": "id,candidateName,question",
+                                                    "gzip": "true"}, headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-type"] == "application/gzip"
+    # Already a gzip file: not encoded a second time
+    assert "content-encoding" not in res.headers
+    rows = list(csv.reader(io.StringIO(gzip.decompress(res.content).decode())))
+    assert rows[0] == ["id", "candidateName", "question"]
+    assert rows[1] == ["s0", "Candidate, 0", '{"title":"Two Sum"}']
+    assert len(rows) == 5
+
+    # Otherwise compressed in transit when the client accepts it (and it's big enough)
+    await api.put("/sessions/s0", json={"notes": "detailed feedback " * 100})
+    res = await api.get("/sessions/export", params={"format": "csv", "fields": "id,notes"},
+                        headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.text.splitlines()[0] == "id,notes"
+
+
+@pytest.mark.asyncio
+async def test_rows_are_fetched_in_batches(sessions, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    stmt = export.query(INTERVIEWER_ID, ["id"], None, None)
+    batches = [[row.id for row in rows] async for rows in export.iter_batches(TestingSessionLocal, stmt)]
+    assert batches == [["s0", "s1", "s2"], ["s3"]]
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+from socketio import packet
+
+from app import json_codec
+
+
+@pytest.fixture
+def fast_json(monkeypatch):
+    monkeypatch.setattr(json_codec, "orjson", pytest.importorskip("orjson"))
+
+
+def _listing(client):
+    for i in range(3):
+        res = client.post("/sessions", json={"candidateName": f"C{i} ✓", "candidateEmail": f"c{i}@example.com",
+                                             "language": "python"})
+        assert res.status_code == 201
+    res = client.get("/sessions", params={"limit": 2})
+    return res.status_code, res.headers.get("X-Next-Cursor"), res.json()
+
+
+def test_fast_responses_match_the_default(client, monkeypatch):
+    # Same app and DB; only the encoder changes between the two listings
+    default = _listing(client)
+    monkeypatch.setattr(json_codec, "orjson", pytest.importorskip("orjson"))
+    fast = _listing(client)
+
+    assert fast[0] == default[0] == 200
+    assert fast[1] is not None and default[1] is not None
+    # Same fields and types either way
+    def shape(sessions):
+        return [{k: type(v).__name__ for k, v in s.items()} for s in sessions]
+    assert shape(fast[2]) == shape(default[2])
+    session_id = fast[2][0]["id"]
+    res = client.get(f"/sessions/{session_id}")
+    assert res.headers["content-type"] == "application/json"
+    assert res.json()["candidateName"] == "C2 ✓"
+    assert res.json()["serverTime"]
+
+
+def test_fast_packets_encode_like_the_default(fast_json):
+    event = ["whiteboard_update", {"roomId": "r1", "changes": {"added": {"shape:1": {"x": 1.5, "text": "✓"}}}}]
+    default = packet.Packet(packet.EVENT, data=event, namespace="/").encode()
+    fast = json_codec.FastPacket(packet.EVENT, data=event, namespace="/").encode()
+    assert fast[0] == default[0] == "2"
+    assert json.loads(fast[1:]) == json.loads(default[1:])
+    assert json_codec.FastPacket(encoded_packet=fast).data == event
+
+
+def test_default_dumps_is_compact_utf8():
+    assert json_codec.dumps({"a": [1, "✓"]}) == '{"a":[1,"✓"]}'.encode()
+    with pytest.raises(ValueError):
+        json_codec.dumps(float("nan"))
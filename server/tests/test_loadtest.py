@@ -0,0 +1,28 @@
+import pytest
+
+import loadtest
+
+
+def test_percentile_interpolates():
+    values = [10, 20, 30, 40, 50]
+    assert loadtest.percentile(values, 50) == 30
+    assert loadtest.percentile(values, 99) == pytest.approx(49.6)
+    assert loadtest.percentile([], 50) is None
+
+
+@pytest.mark.asyncio
+async def test_loadtest_against_live_server(server):
+    args = loadtest.parse_args([
+        "--url", server, "--rooms", "2", "--peers", "2", "--duration", "1.5",
+        "--typing-rate", "10", "--cursor-rate", "10", "--whiteboard-rate", "5", "--drain", "0.5"
+    ])
+    report = await loadtest.run(args)
+
+    assert report["rooms"] == 2
+    assert report["peers"] == 4
+    assert report["errors"] == {}
+    assert report["sent_per_s"]["code_change"] > 0
+    # Every peer has a partner in its room, so broadcasts come back with latencies
+    for event in ("code_change", "cursor_move", "whiteboard_update"):
+        assert report["received_per_s"].get(event, 0) > 0
+        assert report["fanout_latency_ms"][event]["p50"] >= 0
@@ -0,0 +1,74 @@
+import pytest
+import socketio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import metrics
+
+
+@pytest.mark.asyncio
+async def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    hist = registry.histogram("demo_seconds", "Demo", ["event"], buckets=(0.1, 1.0))
+    hist.observe(0.05, "a")
+    hist.observe(0.5, "a")
+    hist.observe(5, "a")
+
+    text_out = await registry.render()
+    assert '# TYPE demo_seconds histogram' in text_out
+    assert 'demo_seconds_bucket{event="a",le="0.1"} 1' in text_out
+    assert 'demo_seconds_bucket{event="a",le="1"} 2' in text_out
+    assert 'demo_seconds_bucket{event="a",le="+Inf"} 3' in text_out
+    assert 'demo_seconds_count{event="a"} 3' in text_out
+
+
+@pytest.mark.asyncio
+async def test_socketio_handlers_are_timed_and_keep_legacy_arity():
+    sio = socketio.AsyncServer(async_mode='asgi')
+    calls = []
+
+    @sio.event
+    async def disconnect(sid):
+        calls.append(sid)
+
+    @sio.event
+    async def boom(sid, data):
+        raise RuntimeError("nope")
+
+    metrics.instrument_socketio(sio)
+    before = metrics.SIO_EVENT_SECONDS.count("disconnect")
+
+    # python-socketio passes a disconnect reason that this handler doesn't accept
+    await sio._trigger_event('disconnect', '/', 'sid-1', 'client disconnect')
+    assert calls == ['sid-1']
+    assert metrics.SIO_EVENT_SECONDS.count("disconnect") == before + 1
+    assert metrics.SIO_EVENT_ERRORS.value("disconnect") == 0
+
+    errors = metrics.SIO_EVENT_ERRORS.value("boom")
+    with pytest.raises(RuntimeError):
+        await sio._trigger_event('boom', '/', 'sid-1', {})
+    assert metrics.SIO_EVENT_ERRORS.value("boom") == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_engine_queries_are_timed():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    metrics.instrument_engine(engine)
+    before = metrics.DB_QUERY_SECONDS.count("SELECT")
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    await engine.dispose()
+    assert metrics.DB_QUERY_SECONDS.count("SELECT") == before + 1
+
+
+def test_metrics_endpoint_reports_routes_by_template(client):
+    res = client.post("/sessions", json={"candidateName": "M", "candidateEmail": "m@example.com", "language": "python"})
+    client.get(f"/sessions/{res.json()['id']}")
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/sessions/{session_id}",status="200"}' in body
+    assert "socketio_connections 0" in body
+    assert "# TYPE event_loop_lag_seconds histogram" in body
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import migrations
+
+
+@pytest.mark.asyncio
+async def test_upgrade_adds_missing_indexes_and_tables():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        # Schema as created by the first release
+        await conn.execute(text(
+            "CREATE TABLE sessions (id VARCHAR PRIMARY KEY, candidate_name VARCHAR, candidate_email VARCHAR, "
+            "date VARCHAR, duration INTEGER, score INTEGER, status VARCHAR, language VARCHAR, notes TEXT, "
+            "start_time VARCHAR, code TEXT, output TEXT, question JSON, server_time VARCHAR, whiteboard JSON)"
+        ))
+
+        await migrations.upgrade(conn)
+        # Running it twice is a no-op
+        await migrations.upgrade(conn)
+
+        indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("sessions")})
+        columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("sessions")})
+        tables = await conn.run_sync(lambda c: set(inspect(c).get_table_names()))
+
+    assert {"ix_sessions_status_date", "ix_sessions_language_date", "ix_sessions_date"} <= indexes
+    assert "whiteboard_records" in tables
+    assert {"revision", "code_revision", "whiteboard_revision"} <= columns
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_upgrade_assigns_existing_sessions_to_an_interviewer(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE sessions (id VARCHAR PRIMARY KEY, candidate_name VARCHAR, candidate_email VARCHAR, "
+            "date VARCHAR, duration INTEGER, score INTEGER, status VARCHAR, language VARCHAR, notes TEXT, "
+            "start_time VARCHAR, code TEXT, output TEXT, question JSON, server_time VARCHAR, whiteboard JSON)"
+        ))
+        await conn.execute(text(
+            "CREATE TABLE users (id VARCHAR PRIMARY KEY, email VARCHAR, password VARCHAR, name VARCHAR, role VARCHAR)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO users (id, email, role) VALUES ('u1', 'a@example.com', 'interviewer'), "
+            "('u2', 'b@example.com', 'interviewer'), ('u0', 'c@example.com', 'candidate')"
+        ))
+        await conn.execute(text(
+            "INSERT INTO sessions (id, date, status, language) VALUES ('old', '2023-01-01', 'completed', 'python')"
+        ))
+        # Per-interviewer stats replace the global ones from the previous release
+        await conn.execute(text("CREATE TABLE session_stats (dimension VARCHAR, key VARCHAR, sessions INTEGER, "
+                                "PRIMARY KEY (dimension, key))"))
+
+        monkeypatch.setattr(migrations, "BACKFILL_INTERVIEWER_EMAIL", "b@example.com")
+        await migrations.upgrade(conn)
+        await migrations.upgrade(conn)
+
+        owner = (await conn.execute(text("SELECT interviewer_id FROM sessions WHERE id = 'old'"))).scalar()
+        stats = (await conn.execute(text(
+            "SELECT interviewer_id, sessions FROM session_stats WHERE dimension = 'all'"
+        ))).all()
+        indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("sessions")})
+        foreign_keys = await conn.run_sync(lambda c: inspect(c).get_foreign_keys("sessions"))
+
+    assert owner == "u2"
+    assert [tuple(r) for r in stats] == [("u2", 1)]
+    assert "ix_sessions_interviewer_date" in indexes
+    assert [(fk["constrained_columns"], fk["referred_table"]) for fk in foreign_keys] == [(["interviewer_id"], "users")]
+    await engine.dispose()
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import socketio
+from unittest.mock import AsyncMock
+from app.presence import MemoryPresenceStore, RedisPresenceStore, InProcessPubSubManager
+
+
+def _memory_store():
+    return MemoryPresenceStore()
+
+
+def _redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    # Both "workers" talk to the same fake server
+    return RedisPresenceStore(fakeredis.FakeAsyncRedis())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("make_store", [_memory_store, _redis_store])
+async def test_refresh_on_another_worker_keeps_user_present(make_store):
+    store = make_store()
+    await store.join("room1", {"id": "user_a", "name": "A", "sid": "sid-old"})
+    await store.join("room1", {"id": "user_b", "name": "B", "sid": "sid-b"})
+
+    # The refreshed page reconnects (new sid) before the old socket's disconnect is seen
+    users = await store.join("room1", {"id": "user_a", "name": "A", "sid": "sid-new"})
+    assert len(users) == 2
+
+    # Stale disconnect for the old sid must not remove the user
+    assert await store.leave("room1", "user_a", sid="sid-old") is None
+    assert {u["sid"] for u in await store.users("room1")} == {"sid-new", "sid-b"}
+
+    remaining = await store.leave("room1", "user_a", sid="sid-new")
+    assert [u["id"] for u in remaining] == ["user_b"]
+
+    # Explicit leave_room has no sid and always removes
+    assert await store.leave("room1", "user_b") == []
+    assert await store.users("room1") == []
+
+
+@pytest.mark.asyncio
+async def test_emit_reaches_clients_connected_to_another_worker():
+    channel = "test-fanout"
+    worker_a = socketio.AsyncServer(async_mode='asgi', client_manager=InProcessPubSubManager(channel=channel))
+    worker_b = socketio.AsyncServer(async_mode='asgi', client_manager=InProcessPubSubManager(channel=channel))
+    for worker in (worker_a, worker_b):
+        worker.manager.initialize()
+
+    # A client connected to worker B only
+    sid = await worker_b.manager.connect('eio-1', '/')
+    await worker_b.manager.enter_room(sid, '/', 'room1')
+    worker_b._send_eio_packet = AsyncMock()
+
+    await worker_a.emit('code_change', {'code': 'x'}, room='room1')
+
+    for _ in range(50):
+        if worker_b._send_eio_packet.await_count:
+            break
+        await asyncio.sleep(0.01)
+    assert worker_b._send_eio_packet.await_count == 1
+    eio_sid, packet = worker_b._send_eio_packet.await_args.args
+    assert eio_sid == 'eio-1'
+    assert packet.data == '2["code_change",{"code":"x"}]'
+
+    for worker in (worker_a, worker_b):
+        worker.manager.thread.cancel()
+    InProcessPubSubManager._channels.pop(channel, None)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+import app.main
+from app import metrics
+from app.main import rooms
+from app.profiler import profiler
+
+
+@pytest_asyncio.fixture
+async def profiling():
+    threshold = profiler.threshold
+    profiler.enable(threshold_ms=30)
+    yield profiler
+    profiler.disable()
+    profiler.clear()
+    profiler.threshold = threshold
+
+
+@pytest.mark.asyncio
+async def test_blocking_room_step_is_caught_with_its_stack(profiling):
+    async def merge_huge_board(room):
+        time.sleep(0.15)  # blocks the loop
+
+    await rooms.submit("room-1", merge_huge_board)
+    await asyncio.sleep(0.05)  # let the watchdog's ping through
+
+    entries = profiling.snapshot()["entries"]
+    step = next(e for e in entries if e["kind"] == "room")
+    assert step["name"].endswith("merge_huge_board") and step["roomId"] == "room-1"
+    assert step["durationMs"] >= 150 and step["blockedMs"] >= 30
+    assert step["stackSource"] == "blocked"
+    assert any("in merge_huge_board" in line for line in step["stack"])
+
+    stall = next(e for e in entries if e["kind"] == "loop_stall")
+    assert stall["name"] == step["name"] and stall["roomId"] == "room-1"
+    assert profiling.stalls >= 1
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_handler_records_where_it_waited(profiling):
+    async def whiteboard_update(sid, data):
+        await asyncio.sleep(0.06)
+
+    async def cursor_move(sid, data):
+        pass
+
+    data = {"roomId": "room-2", "changes": {"added": {"shape:1": {"x": 1}}}}
+    await metrics._timed_handler("whiteboard_update", whiteboard_update)("sid-1", data)
+    await metrics._timed_handler("cursor_move", cursor_move)("sid-1", {"roomId": "room-2"})
+
+    entries = profiling.snapshot()["entries"]
+    assert [e["name"] for e in entries if e["kind"] == "socketio"] == ["whiteboard_update"]
+    entry = entries[0]
+    assert entry["roomId"] == "room-2"
+    assert entry["payloadBytes"] == len('{"roomId":"room-2","changes":{"added":{"shape:1":{"x":1}}}}')
+    assert entry["stackSource"] == "await"
+    assert any("in whiteboard_update" in line for line in entry["stack"])
+    assert any("in sleep" in line for line in entry["stack"])
+
+
+def test_profiler_is_toggled_at_runtime(client, monkeypatch):
+    threshold = profiler.threshold
+    assert client.get("/debug/profiler").status_code == 404
+    assert client.put("/debug/profiler", json={"enabled": True}).status_code == 404
+
+    monkeypatch.setattr(app.main, "DEBUG_TOKEN", "s3cret")
+    debug = {"X-Debug-Token": "s3cret"}
+    assert client.get("/debug/profiler").status_code == 404
+    assert client.get("/debug/profiler", headers={"X-Debug-Token": "wrong"}).status_code == 404
+    assert client.get("/debug/profiler", headers=debug).json()["enabled"] is False
+    try:
+        res = client.put("/debug/profiler", json={"enabled": True, "thresholdMs": 1}, headers=debug)
+        assert res.json()["enabled"] is True and res.json()["thresholdMs"] == 1
+        client.get("/sessions")
+        entries = client.get("/debug/profiler", headers=debug).json()["entries"]
+        assert any(e["kind"] == "http" and e["name"] == "GET /sessions" for e in entries)
+
+        res = client.put("/debug/profiler", json={"enabled": False, "clear": True}, headers=debug)
+        assert res.json() == {**res.json(), "enabled": False, "entries": []}
+    finally:
+        profiler.disable()
+        profiler.clear()
+        profiler.threshold = threshold
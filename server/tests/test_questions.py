@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+import app.main
+from app.questions import QuestionStore
+
+
+def _question(id, title, difficulty, category="Arrays", description=""):
+    return {"id": id, "title": title, "difficulty": difficulty, "category": category, "description": description}
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    (tmp_path / "python.json").write_text(json.dumps([
+        _question("p1", "Reverse String", "easy", "Strings", "Reverse a list of characters in place."),
+        _question("p2", "Two Sum", "medium", description="Find two numbers that add up to a target."),
+        _question("p3", "Merge Intervals", "hard", description="Merge all overlapping intervals."),
+        _question("p4", "Binary Search", "easy", description="Search a sorted array."),
+    ]))
+    (tmp_path / "javascript.jsonl").write_text(
+        json.dumps(_question("j1", "Closures", "easy", "Functions", "What is a closure?")) + "\n"
+    )
+    store = QuestionStore(str(tmp_path))
+    store.load()
+    monkeypatch.setattr(app.main, "question_store", store)
+    return store
+
+
+def test_default_bank_serves_the_client(client):
+    res = client.get("/resources/questions", params={"language": "python", "level": "junior"})
+    assert res.status_code == 200
+    assert [q["title"] for q in res.json()] == ["Reverse String", "Two Sum"]
+
+
+def test_filters_by_level_category_and_keywords(client, bank):
+    def titles(**params):
+        return [q["title"] for q in client.get("/resources/questions", params=params).json()]
+
+    assert titles(language="python", level="junior") == ["Reverse String", "Two Sum", "Binary Search"]
+    assert titles(language="python", level="senior") == ["Two Sum", "Merge Intervals"]
+    assert titles(language="Python", level="hard") == ["Merge Intervals"]
+    assert titles(category="functions") == ["Closures"]
+    assert titles(q="sorted array") == ["Binary Search"]
+    # The last word is matched as a prefix while it's being typed
+    assert titles(q="overlap") == ["Merge Intervals"]
+    assert titles(q="two num", level="senior") == ["Two Sum"]
+    assert titles(q="closure", language="python") == []
+
+    assert client.get("/resources/questions", params={"level": "principal"}).status_code == 400
+    assert client.get("/resources/questions", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_pages_with_a_cursor(client, bank):
+    res = client.get("/resources/questions", params={"language": "python", "limit": 3})
+    assert [q["id"] for q in res.json()] == ["p1", "p2", "p3"]
+    assert res.headers["X-Total-Count"] == "4"
+
+    res = client.get("/resources/questions", params={"language": "python", "limit": 3,
+                                                     "cursor": res.headers["X-Next-Cursor"]})
+    assert [q["id"] for q in res.json()] == ["p4"]
+    assert "X-Next-Cursor" not in res.headers
+
+
+def test_reload_is_disabled_without_a_debug_token(client, bank, monkeypatch):
+    assert client.post("/resources/questions/reload").status_code == 404
+    monkeypatch.setattr(app.main, "DEBUG_TOKEN", "s3cret")
+    assert client.post("/resources/questions/reload").status_code == 404
+    assert client.post("/resources/questions/reload", headers={"X-Debug-Token": "wrong"}).status_code == 404
+
+
+def test_reload_picks_up_edited_files(client, bank, tmp_path, monkeypatch):
+    monkeypatch.setattr(app.main, "DEBUG_TOKEN", "s3cret")
+    client.headers["X-Debug-Token"] = "s3cret"
+    assert client.post("/resources/questions/reload").json() == {"reloaded": False, "questions": 5}
+
+    path = tmp_path / "python.json"
+    questions = json.loads(path.read_text())
+    questions.append(_question("p5", "LRU Cache", "hard", "Design"))
+    path.write_text(json.dumps(questions))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert client.post("/resources/questions/reload").json() == {"reloaded": True, "questions": 6}
+    res = client.get("/resources/questions", params={"category": "design"})
+    assert [q["id"] for q in res.json()] == ["p5"]
@@ -0,0 +1,180 @@
+import itertools
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select, update
+
+import app.main
+from app import models, replay
+from app.main import code_change, create_access_token, custom_question, execution_result, join_room, recorder, whiteboard_update
+from tests.conftest import INTERVIEWER_ID
+
+
+async def _create_session(test_db, session_id):
+    test_db.add(models.Session(
+        id=session_id,
+        candidate_name="Test",
+        candidate_email="test@example.com",
+        date="2024-01-01",
+        duration=0,
+        status="in-progress",
+        language="python",
+        code="",
+        start_time="2024-01-01T00:00:00+00:00",
+        interviewer_id=INTERVIEWER_ID,
+    ))
+    await test_db.commit()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # One millisecond per recorded row so every event has its own timestamp
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(replay, "now_ms", lambda: next(ticks))
+    monkeypatch.setattr(recorder, "keyframe_events", 3)
+
+
+async def _record_session(session_id):
+    with patch('app.main.sio.emit', new_callable=AsyncMock), \
+            patch('app.main.sio.enter_room', new_callable=AsyncMock):
+        await join_room("sid-1", {"roomId": session_id, "user": {"id": "u1", "name": "A"}})
+        for code in ["p", "pr", "print(1)", "print(12)", "print(123)"]:
+            await code_change("sid-1", {"roomId": session_id, "code": code, "language": "python"})
+        await whiteboard_update("sid-1", {"roomId": session_id, "changes": {"added": {"shape:1": {"id": "shape:1"}}}})
+        await custom_question("sid-1", {"roomId": session_id, "question": {"title": "Two Sum"}})
+        await execution_result("sid-1", {"roomId": session_id, "output": "123\n"})
+        await whiteboard_update("sid-1", {"roomId": session_id, "changes": {"removed": {"shape:1": {}}}})
+    await recorder.flush()
+
+
+@pytest.mark.asyncio
+async def test_state_can_be_rebuilt_at_any_point(test_db, clock):
+    session_id = "test-replay-seek"
+    await _create_session(test_db, session_id)
+    await _record_session(session_id)
+
+    events = [e async for e in replay.iter_events(app.main.SessionLocal, session_id)]
+    assert [e["type"] for e in events] == ["code"] * 5 + ["whiteboard", "question", "execution", "whiteboard"]
+    assert [e["seq"] for e in events] == list(range(1, 10))
+    # Code is stored as operations, not whole documents
+    assert events[4]["data"] == {"ops": [8, "3", 1]}
+
+    # Replaying every prefix of the log by hand must match seeking
+    expected = replay.empty_state()
+    expected.update(code="", language="python")
+    for event in events:
+        replay.apply_event(expected, event["type"], event["data"])
+        seek = await replay.state_at(test_db, session_id, event["ts"])
+        assert seek["seq"] == event["seq"]
+        assert seek["state"] == expected
+        # Never more work than the keyframe spacing
+        assert seek["applied"] < recorder.keyframe_events
+
+    final = (await replay.state_at(test_db, session_id, 10 ** 15))["state"]
+    assert final == {"code": "print(123)", "language": "python", "question": {"title": "Two Sum"},
+                     "output": "123\n", "whiteboard": {}}
+    # Before recording began the earliest keyframe is returned
+    assert (await replay.state_at(test_db, session_id, 0))["state"]["code"] == ""
+
+    timeline = await replay.timeline(test_db, session_id)
+    assert timeline["events"] == 9
+    assert [k["seq"] for k in timeline["keyframes"]] == [0, 3, 6, 9]
+
+
+@pytest.mark.asyncio
+async def test_seek_ignores_events_with_skewed_timestamps(test_db, clock):
+    session_id = "test-replay-skew"
+    await _create_session(test_db, session_id)
+    await _record_session(session_id)
+
+    events = [e async for e in replay.iter_events(app.main.SessionLocal, session_id)]
+    at = events[3]["ts"]
+    expected = (await replay.state_at(test_db, session_id, at))["state"]
+    # A later segment (after keyframe 6) and an event in this one written with a clock that ran behind
+    await test_db.execute(update(models.SessionEvent)
+                          .where(models.SessionEvent.session_id == session_id, models.SessionEvent.seq.in_([6, 7, 8]))
+                          .values(ts=at - 1))
+    await test_db.commit()
+
+    seek = await replay.state_at(test_db, session_id, at)
+    assert (seek["keyframe"], seek["seq"], seek["applied"]) == (3, 4, 1)
+    assert seek["state"] == expected
+    assert seek["state"]["question"] is None and seek["state"]["whiteboard"] == {}
+
+
+@pytest.mark.asyncio
+async def test_recording_resumes_numbering_after_idle(test_db, clock):
+    session_id = "test-replay-resume"
+    await _create_session(test_db, session_id)
+    await _record_session(session_id)
+
+    recorder.idle_timeout = 0
+    try:
+        await recorder.flush()
+        assert session_id not in recorder._recordings
+    finally:
+        recorder.idle_timeout = replay.REPLAY_IDLE_TIMEOUT
+
+    await app.main.rooms.stop()
+    with patch('app.main.sio.emit', new_callable=AsyncMock):
+        await code_change("sid-1", {"roomId": session_id, "code": "print(1234)", "language": "python"})
+    await recorder.flush()
+
+    events = [e async for e in replay.iter_events(app.main.SessionLocal, session_id)]
+    assert events[-1]["seq"] == 10
+    assert events[-1]["data"] == {"ops": [9, "4", 1]}
+
+
+@pytest.mark.asyncio
+async def test_replay_endpoints(test_db, clock, auth_headers):
+    session_id = "test-replay-api"
+    await _create_session(test_db, session_id)
+    await _record_session(session_id)
+
+    async with AsyncClient(transport=ASGITransport(app=app.main.fastapi_app), base_url="http://test",
+                           headers=auth_headers) as client:
+        res = await client.get(f"/sessions/{session_id}/replay")
+        assert res.status_code == 200
+        assert res.json()["events"] == 9
+
+        res = await client.get(f"/sessions/{session_id}/replay/events")
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in res.text.splitlines()]
+        assert len(events) == 9
+
+        start, end = events[2]["ts"], events[5]["ts"]
+        res = await client.get(f"/sessions/{session_id}/replay/events", params={"from": start, "to": end})
+        assert [json.loads(line)["seq"] for line in res.text.splitlines()] == [3, 4, 5, 6]
+
+        res = await client.get(f"/sessions/{session_id}/replay/state", params={"at": events[5]["ts"]})
+        assert res.json()["state"]["whiteboard"] == {"shape:1": {"id": "shape:1"}}
+
+        assert (await client.get("/sessions/missing/replay")).status_code == 404
+
+        assert (await client.delete(f"/sessions/{session_id}")).status_code == 200
+
+    count = (await test_db.execute(
+        select(func.count()).select_from(models.SessionEvent).where(models.SessionEvent.session_id == session_id)
+    )).scalar()
+    assert count == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_is_only_for_the_sessions_interviewer(test_db, clock, api):
+    session_id = "test-replay-owner"
+    await _create_session(test_db, session_id)
+    await _record_session(session_id)
+    test_db.add(models.User(id="interviewer-2", email="olga@example.com", password="pw", name="Olga",
+                            role="interviewer"))
+    await test_db.commit()
+    other = {"Authorization": f"Bearer {create_access_token({'sub': 'olga@example.com'})}"}
+
+    routes = [(f"/sessions/{session_id}/replay", {}),
+              (f"/sessions/{session_id}/replay/state", {"at": 10 ** 15}),
+              (f"/sessions/{session_id}/replay/events", {})]
+    for url, params in routes:
+        assert (await api.get(url, params=params)).status_code == 200
+        assert (await api.get(url, params=params, headers=other)).status_code == 404
+        assert (await api.get(url, params=params, headers={"Authorization": ""})).status_code == 401
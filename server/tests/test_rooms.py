@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.main import whiteboard_update, code_change, custom_question, write_buffer, rooms
+from app import models, whiteboard_store
+from app.rooms import RoomActor, check_room_affinity
+
+
+async def _create_session(test_db, session_id):
+    test_db.add(models.Session(
+        id=session_id,
+        candidate_name="Test",
+        candidate_email="test@example.com",
+        date="2024-01-01",
+        duration=0,
+        status="scheduled",
+        language="python"
+    ))
+    await test_db.commit()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_events_are_applied_in_order_with_one_load(test_db):
+    session_id = "test-room-actor"
+    await _create_session(test_db, session_id)
+
+    loads = 0
+    original_load = RoomActor._load
+
+    async def counting_load(self):
+        nonlocal loads
+        loads += 1
+        await original_load(self)
+
+    with patch('app.main.sio.emit', new_callable=AsyncMock), \
+            patch.object(RoomActor, '_load', counting_load):
+        await asyncio.gather(*[
+            whiteboard_update(f"sid{i}", {
+                "roomId": session_id,
+                "changes": {"added": {f"shape:{i}": {"id": f"shape:{i}"}}}
+            }) for i in range(20)
+        ], *[
+            code_change("sid", {"roomId": session_id, "code": f"v{i}", "language": "python"})
+            for i in range(20)
+        ])
+        await custom_question("sid", {"roomId": session_id, "question": {"title": "Q"}})
+
+    assert loads == 1
+    assert rooms.get(session_id).state.code == "v19"
+
+    await write_buffer.flush(session_id)
+    board = await whiteboard_store.snapshot(test_db, session_id)
+    # No update was lost to a concurrent read-modify-write
+    assert len(board) == 20
+
+
+@pytest.mark.asyncio
+async def test_idle_room_is_torn_down_and_flushed(test_db):
+    session_id = "test-room-idle"
+    await _create_session(test_db, session_id)
+
+    with patch.object(rooms, 'idle_timeout', 0.05), \
+            patch('app.main.sio.emit', new_callable=AsyncMock):
+        await code_change("sid", {"roomId": session_id, "code": "idle", "language": "python"})
+        actor = rooms.get(session_id)
+        await asyncio.wait_for(actor.task, timeout=2)
+
+    assert session_id not in rooms.active_rooms()
+    assert write_buffer.pending(session_id) is None
+
+
+def test_rooms_must_not_span_processes():
+    check_room_affinity(workers=1, shared=False, sticky=False)
+    with pytest.raises(RuntimeError, match="STICKY_ROOMS"):
+        check_room_affinity(workers=4, shared=False, sticky=False)
+    # A shared queue or presence store only makes sense with several processes
+    with pytest.raises(RuntimeError):
+        check_room_affinity(workers=1, shared=True, sticky=False)
+    check_room_affinity(workers=4, shared=True, sticky=True)
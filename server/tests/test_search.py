@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import migrations
+from app.main import write_buffer
+
+
+async def _create(api, name, email, language="python"):
+    res = await api.post("/sessions", json={"candidateName": name, "candidateEmail": email, "language": language})
+    return res.json()["id"]
+
+
+async def _search(api, **params):
+    res = await api.get("/sessions/search", params=params)
+    assert res.status_code == 200
+    return res
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_filters_and_pages(api):
+    ada = await _create(api, "Ada Lovelace", "ada@example.com")
+    grace = await _create(api, "Grace Hopper", "grace@example.com", language="javascript")
+    await api.put(f"/sessions/{ada}", json={"notes": "Strong on recursion, weak on graphs."})
+    await api.put(f"/sessions/{grace}", json={"notes": "Explained how Lovelace inspired her."})
+
+    # A name match outranks the same word in notes
+    hits = (await _search(api, q="lovelace")).json()
+    assert [h["id"] for h in hits] == [ada, grace]
+    assert hits[0]["candidateName"] == "Ada Lovelace" and hits[0]["relevance"] > hits[1]["relevance"]
+    assert "**Lovelace**" in hits[1]["snippet"]
+
+    # Every word must match; the last one as a prefix
+    assert [h["id"] for h in (await _search(api, q="recursion gra")).json()] == [ada]
+    assert [h["id"] for h in (await _search(api, q="lovelace", language="javascript")).json()] == [grace]
+
+    res = await _search(api, q="lovelace", limit=1)
+    assert [h["id"] for h in res.json()] == [ada]
+    res = await _search(api, q="lovelace", limit=1, cursor=res.headers["X-Next-Cursor"])
+    assert [h["id"] for h in res.json()] == [grace]
+    assert "X-Next-Cursor" not in res.headers
+
+    assert (await api.get("/sessions/search", params={"q": "?!"})).status_code == 400
+    assert (await api.get("/sessions/search", params={"q": "x", "cursor": "nope"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_index_follows_every_write_path(api):
+    session_id = await _create(api, "Linus", "linus@example.com")
+
+    await api.put(f"/sessions/{session_id}", json={"notes": "asked about memoization"})
+    assert (await _search(api, q="memoization")).json()[0]["id"] == session_id
+
+    await api.post(f"/sessions/{session_id}/save_code", json={"code": "def fibonacci(n): ..."})
+    assert (await _search(api, q="fibonacci")).json()[0]["id"] == session_id
+
+    # Room edits are indexed when the write-behind buffer flushes them
+    write_buffer.stage(session_id, code="def knapsack(items): ...")
+    assert (await _search(api, q="knapsack")).json() == []
+    await write_buffer.flush(session_id)
+    assert (await _search(api, q="knapsack")).json()[0]["id"] == session_id
+    assert (await _search(api, q="fibonacci")).json() == []
+
+    await api.delete(f"/sessions/{session_id}")
+    assert (await _search(api, q="memoization")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_upgrade_indexes_existing_sessions():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE sessions (id VARCHAR PRIMARY KEY, candidate_name VARCHAR, candidate_email VARCHAR, "
+            "date VARCHAR, duration INTEGER, score INTEGER, status VARCHAR, language VARCHAR, notes TEXT, "
+            "start_time VARCHAR, code TEXT, output TEXT, question JSON, server_time VARCHAR, whiteboard JSON)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO sessions (id, candidate_name, candidate_email, date, status, language, notes) "
+            "VALUES ('old', 'Edsger', 'e@example.com', '2020-01-01', 'completed', 'python', 'shortest paths')"
+        ))
+
+        await migrations.upgrade(conn)
+        await migrations.upgrade(conn)
+
+        rows = (await conn.execute(text(
+            "SELECT rowid FROM sessions_fts WHERE sessions_fts MATCH 'shortest'"
+        ))).all()
+    assert len(rows) == 1
+    await engine.dispose()
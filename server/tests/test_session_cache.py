@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import app.main
+from app import session_cache as cache_module
+from app.main import session_cache, write_buffer
+from app.session_cache import MemoryBackend, SessionCache
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_is_lru_with_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    backend = MemoryBackend(max_entries=2)
+    await backend.set("a", {"id": "a"}, ttl=10)
+    await backend.set("b", {"id": "b"}, ttl=10)
+    assert await backend.get("a") == {"id": "a"}
+    # "b" is now the least recently used
+    await backend.set("c", {"id": "c"}, ttl=10)
+    assert await backend.get("b") is None
+    assert len(backend) == 2
+
+    now[0] += 10
+    assert await backend.get("a") is None
+    assert await backend.get("c") is None
+
+
+@pytest.mark.asyncio
+async def test_reads_are_cached_and_writes_invalidate(api):
+    res = await api.post("/sessions", json={"candidateName": "C", "candidateEmail": "c@example.com",
+                                            "language": "python"})
+    session_id = res.json()["id"]
+
+    assert (await api.get(f"/sessions/{session_id}")).json()["score"] is None
+    misses = session_cache.misses
+    for _ in range(3):
+        await api.get(f"/sessions/{session_id}")
+    assert session_cache.misses == misses and session_cache.hits >= 3
+
+    # REST writes
+    await api.put(f"/sessions/{session_id}", json={"score": 5})
+    assert (await api.get(f"/sessions/{session_id}")).json()["score"] == 5
+    await api.post(f"/sessions/{session_id}/terminate")
+    assert (await api.get(f"/sessions/{session_id}")).json()["status"] == "completed"
+
+    # Flushed room edits
+    write_buffer.stage(session_id, code="x = 1")
+    await write_buffer.flush(session_id)
+    body = (await api.get(f"/sessions/{session_id}")).json()
+    assert body["code"] == "x = 1" and body["revision"] == 3
+
+    await api.delete(f"/sessions/{session_id}")
+    assert (await api.get(f"/sessions/{session_id}")).status_code == 404
+
+
+class _SlowDB:
+    """Holds a lookup open until released, to interleave it with a write."""
+
+    def __init__(self, db):
+        self.db = db
+        self.release = asyncio.Event()
+
+    async def execute(self, statement):
+        result = await self.db.execute(statement)
+        await self.release.wait()
+        return result
+
+
+@pytest.mark.asyncio
+async def test_lookup_overlapping_an_invalidation_is_not_cached(test_db):
+    test_db.add(app.main.models.Session(id="s1", candidate_name="A", candidate_email="a@example.com",
+                                        date="2024-01-01", duration=0, status="scheduled", language="python"))
+    await test_db.commit()
+    cache = SessionCache(MemoryBackend(max_entries=10), ttl=60)
+
+    slow = _SlowDB(test_db)
+    lookup = asyncio.create_task(cache.get(slow, "s1"))
+    await asyncio.sleep(0)
+    # A write commits and invalidates while the read still holds the old row
+    await cache.invalidate("s1")
+    slow.release.set()
+    assert (await lookup).candidate_name == "A"
+    assert len(cache) == 0
+
+    await cache.get(test_db, "s1")
+    assert len(cache) == 1
@@ -0,0 +1,83 @@
+import pytest
+
+from app.main import write_buffer
+
+
+async def _create(api):
+    res = await api.post("/sessions", json={"candidateName": "R", "candidateEmail": "r@example.com",
+                                            "language": "python"})
+    return res.json()["id"]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_session_is_not_modified(api):
+    session_id = await _create(api)
+
+    res = await api.get(f"/sessions/{session_id}")
+    etag = res.headers["ETag"]
+    assert res.json()["revision"] == 0
+    assert res.headers["X-Server-Time"]
+
+    res = await api.get(f"/sessions/{session_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+    # Timers still get a fresh clock on a 304
+    assert res.headers["X-Server-Time"]
+
+    await api.put(f"/sessions/{session_id}", json={"score": 4})
+    res = await api.get(f"/sessions/{session_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert res.json()["revision"] == 1
+    assert res.json()["score"] == 4
+
+
+@pytest.mark.asyncio
+async def test_since_returns_only_changed_fields(api):
+    session_id = await _create(api)
+
+    await api.post(f"/sessions/{session_id}/save_code", json={"code": "print(1)"})
+    res = await api.get(f"/sessions/{session_id}", params={"since": 0})
+    delta = res.json()
+    assert set(delta) == {"id", "revision", "serverTime", "code", "language"}
+    assert delta["code"] == "print(1)"
+    assert delta["revision"] == 1
+
+    write_buffer.stage_whiteboard(session_id, {"shape:1": {"id": "shape:1"}})
+    await write_buffer.flush(session_id)
+    delta = (await api.get(f"/sessions/{session_id}", params={"since": 1})).json()
+    assert set(delta) == {"id", "revision", "serverTime", "whiteboard"}
+    assert delta["whiteboard"] == {"shape:1": {"id": "shape:1"}}
+
+    await api.post(f"/sessions/{session_id}/terminate")
+    delta = (await api.get(f"/sessions/{session_id}", params={"since": 2})).json()
+    assert delta["status"] == "completed"
+    assert "code" not in delta and "whiteboard" not in delta
+
+    # Nothing new: just the identity and revision
+    delta = (await api.get(f"/sessions/{session_id}", params={"since": delta["revision"]})).json()
+    assert set(delta) == {"id", "revision", "serverTime"}
+
+    # A revision from the future (another database, a reset) gets the whole session
+    full = (await api.get(f"/sessions/{session_id}", params={"since": 999})).json()
+    assert full["code"] == "print(1)" and full["whiteboard"] and full["candidateName"] == "R"
+
+
+@pytest.mark.asyncio
+async def test_pending_edits_are_never_served_as_not_modified(api):
+    session_id = await _create(api)
+    etag = (await api.get(f"/sessions/{session_id}")).headers["ETag"]
+
+    write_buffer.stage(session_id, code="typing...")
+    res = await api.get(f"/sessions/{session_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert "ETag" not in res.headers
+    assert res.json()["code"] == "typing..."
+
+    delta = (await api.get(f"/sessions/{session_id}", params={"since": 0})).json()
+    assert delta["code"] == "typing..."
+
+    await write_buffer.flush(session_id)
+    res = await api.get(f"/sessions/{session_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["revision"] == 1
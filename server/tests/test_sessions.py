@@ -1,4 +1,13 @@
+import jwt
 import pytest
+from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+import app.main
+from app import models
+from app.main import ALGORITHM, SECRET_KEY, app as asgi_app, create_access_token, encode_cursor, sessions_query
 
 def test_create_session(client):
     response = client.post("/sessions", json={
@@ -46,3 +55,130 @@ def test_update_session(client):
     })
     assert response.status_code == 200
     assert response.json()["score"] == 85
+
+def _create(client, name, language="python"):
+    return client.post("/sessions", json={
+        "candidateName": name,
+        "candidateEmail": f"{name.lower()}@example.com",
+        "language": language
+    }).json()
+
+def test_list_sessions_summary_omits_heavy_fields(client):
+    _create(client, "Alice")
+
+    response = client.get("/sessions", params={"summary": True})
+    assert response.status_code == 200
+    item = response.json()[0]
+    assert item["candidateName"] == "Alice"
+    assert "code" not in item
+    assert "whiteboard" not in item
+
+def test_list_sessions_keyset_pagination_and_filters(client):
+    for i in range(5):
+        _create(client, f"Candidate{i}", language="python" if i % 2 == 0 else "go")
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"summary": True, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/sessions", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 5
+    assert len({s["id"] for s in seen}) == 5
+    dates = [s["date"] for s in seen]
+    assert dates == sorted(dates, reverse=True)
+
+    response = client.get("/sessions", params={"summary": True, "language": "go"})
+    assert {s["language"] for s in response.json()} == {"go"}
+    assert len(response.json()) == 2
+
+    response = client.get("/sessions", params={"status": "completed"})
+    assert response.json() == []
+
+@pytest.mark.asyncio
+async def test_list_sessions_is_paged_by_default(api, test_db):
+    for i in range(app.main.SESSIONS_PAGE_SIZE + 1):
+        test_db.add(models.Session(id=f"s{i:03}", candidate_name="C", candidate_email="c@example.com",
+                                   date=f"2024-01-01T00:00:{i % 60:02}+00:00", status="scheduled",
+                                   language="python", interviewer_id="interviewer-1"))
+    await test_db.commit()
+
+    response = await api.get("/sessions", params={"summary": True})
+    assert len(response.json()) == app.main.SESSIONS_PAGE_SIZE
+    assert "X-Next-Cursor" in response.headers
+    response = await api.get("/sessions", params={"limit": app.main.MAX_PAGE_SIZE + 1})
+    assert response.status_code == 422
+
+def test_list_sessions_rejects_bad_cursor(client):
+    response = client.get("/sessions", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_sessions_are_scoped_to_their_interviewer(client):
+    own = _create(client, "Alice")
+    token = client.post("/auth/signup", json={"email": "other@example.com", "password": "pw",
+                                              "name": "Other Interviewer"}).json()["token"]
+    other = {"Authorization": f"Bearer {token}"}
+
+    # Someone else's session is indistinguishable from a missing one
+    assert client.get("/sessions", headers=other).json() == []
+    assert client.get(f"/sessions/{own['id']}", headers=other).status_code == 404
+    assert client.put(f"/sessions/{own['id']}", json={"score": 1}, headers=other).status_code == 404
+    assert client.delete(f"/sessions/{own['id']}", headers=other).status_code == 404
+    assert client.post(f"/sessions/{own['id']}/terminate", headers=other).status_code == 404
+    assert client.post(f"/sessions/{own['id']}/save_code", json={"code": "x"}, headers=other).status_code == 404
+
+    listed = client.get("/sessions").json()
+    assert [s["id"] for s in listed] == [own["id"]]
+    assert listed[0]["interviewerId"] == own["interviewerId"] is not None
+    assert client.get("/sessions", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+
+    # Candidates open their session by link, without a token, but can't list or create any
+    anonymous = TestClient(asgi_app)
+    assert anonymous.get(f"/sessions/{own['id']}").status_code == 200
+    # An expired token doesn't lock anyone out of the room
+    expired = jwt.encode({"sub": "ivy@example.com", "exp": 0}, SECRET_KEY, algorithm=ALGORITHM)
+    assert anonymous.get(f"/sessions/{own['id']}", headers={"Authorization": f"Bearer {expired}"}).status_code == 200
+    assert anonymous.post(f"/sessions/{own['id']}/terminate").status_code == 401
+    # Saving code takes a connection in the room
+    assert anonymous.post(f"/sessions/{own['id']}/save_code", json={"code": "x"}).status_code == 403
+    app.main.sid_map["sid-in-room"] = (own["id"], "candidate")
+    try:
+        res = anonymous.post(f"/sessions/{own['id']}/save_code", json={"code": "x"},
+                             headers={"X-Socket-Id": "sid-in-room"})
+    finally:
+        del app.main.sid_map["sid-in-room"]
+    assert res.status_code == 200
+    assert anonymous.get("/sessions").status_code == 401
+    assert anonymous.post("/sessions", json={"candidateName": "X", "candidateEmail": "x@example.com",
+                                             "language": "python"}).status_code == 401
+
+@pytest.mark.asyncio
+async def test_only_interviewers_manage_sessions(test_db):
+    test_db.add(models.User(id="candidate-1", email="cand@example.com", password="pw", name="Cand",
+                            role="candidate"))
+    await test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'cand@example.com'})}"}
+    async with AsyncClient(transport=ASGITransport(app=app.main.fastapi_app), base_url="http://test",
+                           headers=headers) as api:
+        assert (await api.get("/sessions")).status_code == 403
+        assert (await api.post("/sessions", json={"candidateName": "X", "candidateEmail": "x@example.com",
+                                                  "language": "python"})).status_code == 403
+
+@pytest.mark.asyncio
+async def test_listing_is_served_by_the_interviewer_index(test_db):
+    # Filtered by owner and read in (date, id) order straight off the index: no scan, no sort
+    for options in ({}, {"language": "go"}, {"cursor": encode_cursor("2024-01-01T00:00:00", "abc")}):
+        stmt = sessions_query("interviewer-1", summary=True, limit=20, **options)
+        sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in (await test_db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all())
+        assert "ix_sessions_interviewer_date" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
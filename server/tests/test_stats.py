@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+from app import migrations, models, stats
+from app.main import write_buffer
+from tests.conftest import INTERVIEWER_ID
+
+
+async def _create(api, language="python"):
+    res = await api.post("/sessions", json={"candidateName": "S", "candidateEmail": "s@example.com",
+                                            "language": language})
+    return res.json()["id"]
+
+
+async def _stored(db):
+    # Incremental rows, without the zeroed ones a rebuild wouldn't produce
+    rows = (await db.execute(select(models.SessionStat))).scalars().all()
+    return {(r.dimension, r.key): [getattr(r, c) for c in stats.COUNTERS] for r in rows if r.sessions}
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_every_write(api, test_db):
+    today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    first = await _create(api)
+    second = await _create(api)
+    third = await _create(api, language="go")
+
+    await api.put(f"/sessions/{first}", json={"score": 80})
+    await api.put(f"/sessions/{second}", json={"score": 60, "notes": "ok"})
+    await api.post(f"/sessions/{first}/terminate")
+    await api.put(f"/sessions/{second}", json={"notes": "only notes"})
+    # Room edits change the language through the write-behind buffer
+    write_buffer.stage(second, code="fn main() {}", language="rust")
+    await write_buffer.flush(second)
+    await api.delete(f"/sessions/{third}")
+
+    body = (await api.get("/sessions/stats")).json()
+    assert body["total"]["sessions"] == 2
+    assert body["total"]["avgScore"] == 70
+    assert body["byStatus"]["completed"]["sessions"] == 1
+    assert body["byStatus"]["completed"]["avgScore"] == 80
+    assert body["byStatus"]["scheduled"]["sessions"] == 1
+    assert set(body["byLanguage"]) == {"python", "rust"}
+    assert body["byDay"][today]["sessions"] == 2
+    assert (await api.get("/sessions/stats", params={"to": "2000-01-01"})).json()["byDay"] == {}
+
+    incremental = await _stored(test_db)
+    await stats.rebuild(test_db)
+    assert await _stored(test_db) == incremental
+
+
+@pytest.mark.asyncio
+async def test_duration_histogram_and_rebuild(test_db):
+    for i, duration in enumerate((0, 10, 40, 120)):
+        test_db.add(models.Session(id=f"s{i}", candidate_name="D", candidate_email="d@example.com",
+                                   date="2024-05-01T10:00:00", duration=duration, status="completed",
+                                   language="python", interviewer_id=INTERVIEWER_ID))
+    await test_db.commit()
+    # Inserted behind the app's back: nothing counted until a rebuild
+    assert (await stats.read(test_db, INTERVIEWER_ID))["total"]["sessions"] == 0
+
+    await stats.rebuild(test_db)
+    body = await stats.read(test_db, INTERVIEWER_ID, "2024-05-01", "2024-05-01")
+    assert body["total"]["sessions"] == 4
+    assert body["total"]["timed"] == 3 and body["total"]["avgDuration"] == 56.7
+    assert body["total"]["durationHistogram"] == {"le15": 1, "le30": 0, "le45": 1, "le60": 0, "le90": 0, "over90": 1}
+    assert body["byDay"]["2024-05-01"]["sessions"] == 4
+
+
+@pytest.mark.asyncio
+async def test_upgrade_backfills_stats_for_existing_sessions():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE sessions (id VARCHAR PRIMARY KEY, candidate_name VARCHAR, candidate_email VARCHAR, "
+            "date VARCHAR, duration INTEGER, score INTEGER, status VARCHAR, language VARCHAR, notes TEXT, "
+            "start_time VARCHAR, code TEXT, output TEXT, question JSON, server_time VARCHAR, whiteboard JSON)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO sessions (id, date, duration, score, status, language) "
+            "VALUES ('a', '2023-01-01', 30, 90, 'completed', 'python'), ('b', '2023-01-02', 0, NULL, 'scheduled', 'go')"
+        ))
+
+        await migrations.upgrade(conn)
+        await migrations.upgrade(conn)
+
+        rows = (await conn.execute(text(
+            "SELECT dimension, key, sessions, score_sum FROM session_stats ORDER BY dimension, key"
+        ))).all()
+    assert [tuple(r) for r in rows] == [
+        ("all", "", 2, 90),
+        ("day", "2023-01-01", 1, 90), ("day", "2023-01-02", 1, 0),
+        ("language", "go", 1, 0), ("language", "python", 1, 90),
+        ("status", "completed", 1, 90), ("status", "scheduled", 1, 0),
+    ]
+    await engine.dispose()
@@ -5,10 +5,17 @@ import datetime
 from httpx import AsyncClient, ASGITransport
 from app.main import app
 
+
+async def _login(ac):
+    # Interviewer seeded on startup; sessions belong to whoever creates them
+    res = await ac.post("/auth/login", json={"email": "interviewer@example.com", "password": "password123"})
+    ac.headers["Authorization"] = f"Bearer {res.json()['token']}"
+
 @pytest.mark.asyncio
 async def test_sync_and_persistence(server):
     # 1. Create Session
     async with AsyncClient(base_url=server) as ac:
+        await _login(ac)
         res = await ac.post("/sessions", json={
             "candidateName": "Test Candidate",
             "candidateEmail": "test@example.com",
@@ -81,6 +88,7 @@ async def test_sync_and_persistence(server):
 async def test_user_presence(server):
     # 1. Create Session
     async with AsyncClient(base_url=server) as ac:
+        await _login(ac)
         res = await ac.post("/sessions", json={
             "candidateName": "Test Candidate",
             "candidateEmail": "test@example.com",
@@ -138,6 +146,7 @@ async def test_user_presence(server):
 async def test_whiteboard_sync(server):
     # 1. Create Session
     async with AsyncClient(base_url=server) as ac:
+        await _login(ac)
         res = await ac.post("/sessions", json={
             "candidateName": "Test Candidate",
             "candidateEmail": "test@example.com",
@@ -14,13 +14,15 @@ async def test_time_format(test_db):
     )
     
     # We call the route handler directly, injecting the db
-    session = await create_session(session_data, db=test_db)
+    interviewer = models.User(id="time-interviewer", email="time@interviewer.com", password="x",
+                              name="Time Interviewer", role="interviewer")
+    session = await create_session(session_data, user=interviewer, db=test_db)
     
     # Check date format
     assert session.date.endswith("+00:00") or session.date.endswith("Z")
     
     # Check serverTime format (injected in get_session)
-    retrieved_session = await get_session(session.id, db=test_db)
+    retrieved_session = await get_session(session.id, user=interviewer, db=test_db)
     assert retrieved_session.serverTime is not None
     assert retrieved_session.serverTime.endswith("+00:00") or retrieved_session.serverTime.endswith("Z")
     
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, patch
-from app.main import whiteboard_update, Session, create_session, SessionCreate
-from app import models
+from app.main import whiteboard_update, write_buffer, Session, create_session, SessionCreate
+from app import models, whiteboard_store
 from sqlalchemy import select
 from app.database import SessionLocal
 
@@ -46,14 +46,80 @@ async def test_whiteboard_persistence(test_db):
         with patch('app.main.SessionLocal', return_value=MockSessionContext(test_db)):
             # Act: Send whiteboard update
             await whiteboard_update(sid, data)
+            # Writes are batched by the write-behind buffer
+            await write_buffer.flush(session_id)
         
         # Assert: Check if data is persisted in DB
         result = await test_db.execute(select(models.Session).where(models.Session.id == session_id))
         session = result.scalars().first()
         assert session is not None
         
-        # We expect the whiteboard field to exist and contain the data
-        assert session.whiteboard is not None
-        # We store flattened records
+        # Records are stored one row per shape, flattened
+        board = await whiteboard_store.snapshot(test_db, session_id)
+        assert board is not None
         expected_record = data['changes']['added']['shape:1']
-        assert session.whiteboard['shape:1'] == expected_record
+        assert board['shape:1'] == expected_record
+
+
+class MockSessionContext:
+    def __init__(self, db):
+        self.db = db
+    async def __aenter__(self):
+        return self.db
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_whiteboard_incremental_updates_and_legacy_migration(test_db):
+    session_id = "test-session-wb-legacy"
+    # A board persisted by the old whole-blob code path
+    test_db.add(models.Session(
+        id=session_id,
+        candidate_name="Test",
+        candidate_email="test@example.com",
+        date="2024-01-01",
+        duration=0,
+        status="scheduled",
+        language="python",
+        whiteboard={"shape:1": {"id": "shape:1", "x": 0}, "shape:2": {"id": "shape:2", "x": 0}}
+    ))
+    await test_db.commit()
+
+    # The legacy column is still readable before anything is migrated
+    assert set(await whiteboard_store.snapshot(test_db, session_id)) == {"shape:1", "shape:2"}
+
+    data = {
+        "roomId": session_id,
+        "changes": {
+            "added": {"shape:3": {"id": "shape:3", "x": 3}},
+            "updated": {"shape:1": [{"id": "shape:1", "x": 0}, {"id": "shape:1", "x": 10}]},
+            "removed": {"shape:2": {"id": "shape:2", "x": 0}},
+        }
+    }
+    with patch('app.main.sio.emit', new_callable=AsyncMock), \
+            patch('app.main.SessionLocal', return_value=MockSessionContext(test_db)):
+        await whiteboard_update("test-sid", data)
+        await write_buffer.flush(session_id)
+
+    board = await whiteboard_store.snapshot(test_db, session_id)
+    assert board == {"shape:1": {"id": "shape:1", "x": 10}, "shape:3": {"id": "shape:3", "x": 3}}
+
+    # The blob has been moved into per-record rows
+    test_db.expire_all()
+    result = await test_db.execute(select(models.Session).where(models.Session.id == session_id))
+    assert result.scalars().first().whiteboard is None
+
+
+@pytest.mark.asyncio
+async def test_whiteboard_update_for_unknown_session_is_not_stored(test_db):
+    with patch('app.main.sio.emit', new_callable=AsyncMock), \
+            patch('app.main.SessionLocal', return_value=MockSessionContext(test_db)):
+        await whiteboard_update("test-sid", {
+            "roomId": "missing",
+            "changes": {"added": {"shape:1": {"id": "shape:1"}}}
+        })
+        await write_buffer.flush("missing")
+
+    result = await test_db.execute(select(models.WhiteboardRecord))
+    assert result.scalars().all() == []
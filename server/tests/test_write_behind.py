@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.main import code_change, get_session, terminate_session, write_buffer
+from app import models
+from sqlalchemy import select
+
+
+async def _create_session(test_db, session_id):
+    test_db.add(models.Session(
+        id=session_id,
+        interviewer_id="wb-interviewer",
+        candidate_name="Test",
+        candidate_email="test@example.com",
+        date="2024-01-01",
+        duration=0,
+        status="scheduled",
+        language="python",
+        code="original"
+    ))
+    await test_db.commit()
+
+
+@pytest.mark.asyncio
+async def test_code_change_is_buffered_until_flush(test_db):
+    session_id = "test-session-wb-code"
+    await _create_session(test_db, session_id)
+
+    with patch('app.main.sio.emit', new_callable=AsyncMock) as mock_emit:
+        for code in ["p", "pr", "print(1)"]:
+            await code_change("sid", {"roomId": session_id, "code": code, "language": "python"})
+
+    # Every keystroke is broadcast immediately ...
+    code_changes = [c for c in mock_emit.await_args_list if c.args[0] == 'code_change']
+    assert len(code_changes) == 3
+    # ... but nothing has been written yet
+    test_db.expire_all()
+    row = (await test_db.execute(select(models.Session).where(models.Session.id == session_id))).scalars().first()
+    assert row.code == "original"
+
+    # Readers see the in-memory state while it is fresher than the DB
+    session = await get_session(session_id, user=None, db=test_db)
+    assert session.code == "print(1)"
+
+    await write_buffer.flush(session_id)
+    assert write_buffer.pending(session_id) is None
+    test_db.expire_all()
+    row = (await test_db.execute(select(models.Session).where(models.Session.id == session_id))).scalars().first()
+    assert row.code == "print(1)"
+
+
+@pytest.mark.asyncio
+async def test_flush_due_respects_interval_and_max_age(test_db):
+    session_id = "test-session-wb-due"
+    await _create_session(test_db, session_id)
+
+    write_buffer.stage(session_id, code="a")
+    # Still inside the debounce window, nothing is due
+    await write_buffer.flush_due()
+    assert write_buffer.pending(session_id) == {"code": "a"}
+
+    # A room that keeps typing is flushed once it exceeds the max dirty age
+    entry = write_buffer._pending[session_id]
+    entry.first_dirty -= write_buffer.max_age
+    await write_buffer.flush_due()
+    assert write_buffer.pending(session_id) is None
+
+
+@pytest.mark.asyncio
+async def test_terminate_flushes_pending_code(test_db):
+    session_id = "test-session-wb-term"
+    await _create_session(test_db, session_id)
+    write_buffer.stage(session_id, code="final answer", language="python")
+
+    with patch('app.main.sio.emit', new_callable=AsyncMock):
+        owner = models.User(id="wb-interviewer", email="wb@example.com", role="interviewer")
+        await terminate_session(session_id, user=owner, db=test_db)
+
+    test_db.expire_all()
+    row = (await test_db.execute(select(models.Session).where(models.Session.id == session_id))).scalars().first()
+    assert row.code == "final answer"
+    assert row.status == "completed"
@@ -3,7 +3,8 @@ import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.database import Base, get_db
-from app.main import fastapi_app as app
+from app.main import fastapi_app as app, create_access_token
+from app import models
 import asyncio
 from httpx import AsyncClient, ASGITransport
 
@@ -47,6 +48,11 @@ async def override_dependency(test_db):
     app.dependency_overrides.clear()
 
 @pytest_asyncio.fixture
-async def client():
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+async def client(test_db):
+    # Signed in as an interviewer: sessions belong to whoever creates them
+    test_db.add(models.User(id="interviewer-1", email="ivy@example.com", password="password123",
+                            name="Ivy Interviewer", role="interviewer"))
+    await test_db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'ivy@example.com'})}"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test", headers=headers) as ac:
         yield ac
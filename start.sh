@@ -20,4 +20,7 @@ ps aux | grep nginx
 
 echo "--- Starting FastAPI Backend ---"
 cd /app/server
-exec uv run uvicorn app.main:app --host 0.0.0.0 --port 8000
+# Rooms live in one process: uvicorn's workers share a socket with no room affinity, so keep one per instance
+# (more refuse to start unless STICKY_ROOMS=1) and scale out behind a proxy that routes each room to one instance.
+# app.ws_protocol skips permessage-deflate for small Socket.IO frames (SOCKETIO_COMPRESSION_MIN_SIZE).
+exec uv run uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers ${UVICORN_WORKERS:-1} --ws app.ws_protocol:WSProtocol